@@ -0,0 +1,362 @@
+"""End-to-end BrowserEnv benchmark against a local synthetic-page server.
+
+Serves generated pages (see ``synthetic_site.py``) and drives a real
+BrowserEnv through fixed action scripts, with no network access. Each page
+profile runs in its own process, so start-up time and peak RSS are measured
+from scratch:
+
+    python benchmarks/browser_env_bench.py --steps 20 --output results.json
+    python benchmarks/browser_env_bench.py --output new.json --baseline results.json
+    python benchmarks/browser_env_bench.py --compare new.json --baseline results.json
+
+Reported per profile: BrowserEnv start-up time, peak RSS of the agent process
+and of the largest browser-side process, and the stage breakdown from
+``qa_browser.metrics``; per script: step latency percentiles, steps/sec and
+the bytes that crossed the pipe. With ``--baseline`` the run fails (exit
+status 1) if a metric regressed by more than ``--max-regression``.
+
+Needs Playwright's Chromium (``playwright install chromium``) and metrics
+recording (the default; IPC bytes read 0 with QA_BROWSER_METRICS=0).
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import time
+from dataclasses import asdict
+
+from synthetic_site import CONTROLS, PROFILES, PageProfile, SyntheticSite
+
+# run from a checkout too, without `pip install -e .`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCRIPTS = ('navigate', 'interact', 'batch', 'browse')
+
+# the interaction loop of the 'interact', 'batch' and 'browse' scripts; the
+# controls are filled in with their bids by resolve_controls()
+INTERACTIONS = (
+    "click('{button}')",
+    "fill('{input}', 'benchmark text {step}')",
+    'scroll(0, 600)',
+    'scroll(0, -600)',
+)
+
+# Compared metrics: name -> (higher is better, changes below this are noise)
+COMPARED = {
+    'startup_s': (False, 0.25),
+    'peak_rss_mib.agent': (False, 16),
+    'peak_rss_mib.browser': (False, 32),
+    'latency_ms_p50': (False, 2),
+    'latency_ms_p95': (False, 5),
+    'steps_per_sec': (True, 0.5),
+    'ipc_bytes_per_step': (False, 1024),
+}
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _peak_rss_mib(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _response_bytes() -> float:
+    from qa_browser import metrics
+
+    histogram = metrics.METRICS.snapshot()['payload_bytes'].get('response')
+    return histogram.total if histogram is not None else 0
+
+
+def resolve_controls(obs: dict) -> dict[str, str]:
+    """Control -> bid of the page header's controls, from ``obs``'s axtree."""
+    names = {name: control for control, name in CONTROLS.items()}
+    bids = {}
+    for node in obs.get('axtree_object', {}).get('nodes', []):
+        control = names.get(node.get('name', {}).get('value'))
+        if control is not None and node.get('browsergym_id') is not None:
+            bids.setdefault(control, node['browsergym_id'])
+    missing = sorted(set(CONTROLS) - set(bids))
+    if missing:
+        raise RuntimeError(f'controls not found in the accessibility tree: {missing}')
+    return bids
+
+
+def _interaction(step: int, controls: dict[str, str]) -> str:
+    return INTERACTIONS[step % len(INTERACTIONS)].format(step=step, **controls)
+
+
+def _run_script(env, script: str, url_for, steps: int) -> dict:
+    from qa_browser.browser.utils import browse
+    from qa_browser.events import BrowseInteractiveAction
+
+    if script != 'navigate':
+        controls = resolve_controls(env.step(f'goto("{url_for(0)}")'))
+
+    latencies = []
+    actions = 0
+    bytes_before = _response_bytes()
+    started = time.perf_counter()
+    if script == 'browse':
+
+        async def run_browse() -> None:
+            for step in range(steps):
+                action = BrowseInteractiveAction(browser_actions=_interaction(step, controls))
+                start = time.perf_counter()
+                await browse(action, env)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        asyncio.run(run_browse())
+        actions = steps
+    else:
+        for step in range(steps):
+            start = time.perf_counter()
+            if script == 'navigate':
+                # a new seed per step, so nothing is served from a cache
+                env.step(f'goto("{url_for(step + 1)}")')
+                actions += 1
+            elif script == 'interact':
+                env.step(_interaction(step, controls))
+                actions += 1
+            else:
+                first = step * len(INTERACTIONS)
+                batch = [_interaction(first + i, controls) for i in range(len(INTERACTIONS))]
+                env.step_many(batch)
+                actions += len(batch)
+            latencies.append((time.perf_counter() - start) * 1000)
+    elapsed = time.perf_counter() - started
+    ipc_bytes = _response_bytes() - bytes_before
+
+    return {
+        'steps': actions,
+        'round_trips': len(latencies),
+        'latency_ms_mean': statistics.fmean(latencies),
+        'latency_ms_p50': _percentile(latencies, 0.50),
+        'latency_ms_p95': _percentile(latencies, 0.95),
+        'latency_ms_p99': _percentile(latencies, 0.99),
+        'steps_per_sec': actions / elapsed,
+        'ipc_bytes': ipc_bytes,
+        'ipc_bytes_per_step': ipc_bytes / actions,
+    }
+
+
+def run_profile(
+    base_url: str, profile: PageProfile, scripts: list[str], steps: int, env_kwargs: dict
+) -> dict:
+    """Start a BrowserEnv, run the scripts on ``profile`` pages and close it."""
+    from qa_browser import metrics
+    from qa_browser.browser.base64 import ImageCodec
+    from qa_browser.browser.browser_env import BrowserEnv
+
+    def url_for(seed: int) -> str:
+        return f'{base_url}/page?{profile.query(seed)}'
+
+    kwargs = dict(env_kwargs)
+    if kwargs.get('codec'):
+        kwargs['codec'] = ImageCodec(format=kwargs['codec'])
+    start = time.perf_counter()
+    env = BrowserEnv(**kwargs)
+    startup_s = time.perf_counter() - start
+    try:
+        results = {script: _run_script(env, script, url_for, steps) for script in scripts}
+        stages = metrics.summarize(metrics.collect())
+    finally:
+        env.close()
+
+    return {
+        'startup_s': startup_s,
+        'peak_rss_mib': {
+            'agent': _peak_rss_mib(resource.RUSAGE_SELF),
+            # the largest reaped descendant: browser process, driver or Chromium
+            'browser': _peak_rss_mib(resource.RUSAGE_CHILDREN),
+        },
+        'scripts': results,
+        'stages': stages,
+    }
+
+
+def _profile_worker(conn, *args) -> None:
+    try:
+        conn.send(('ok', run_profile(*args)))
+    except Exception as e:
+        conn.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        conn.close()
+
+
+def run_isolated(*args) -> dict:
+    """run_profile() in a fresh process, so RSS and start-up are its own."""
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_profile_worker, args=(child, *args))
+    process.start()
+    child.close()
+    try:
+        status, result = parent.recv()
+    except EOFError:
+        status, result = 'error', f'benchmark process exited with code {process.exitcode}'
+    process.join()
+    if status != 'ok':
+        raise RuntimeError(result)
+    return result
+
+
+def flatten(results: dict) -> dict[str, float]:
+    """``profile.script.metric`` -> value for every compared metric."""
+    flat = {}
+    for profile, result in results['profiles'].items():
+        flat[f'{profile}.startup_s'] = result['startup_s']
+        for who, value in result['peak_rss_mib'].items():
+            flat[f'{profile}.peak_rss_mib.{who}'] = value
+        for script, values in result['scripts'].items():
+            for name, value in values.items():
+                if name in COMPARED:
+                    flat[f'{profile}.{script}.{name}'] = value
+    return flat
+
+
+def _compared(key: str) -> tuple[bool, float]:
+    for name, spec in COMPARED.items():
+        if key.endswith(f'.{name}'):
+            return spec
+    raise KeyError(key)
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[dict]:
+    """Metrics present in both runs, each flagged if it regressed."""
+    if results['config'] != baseline['config']:
+        print('warning: the baseline was run with a different configuration', file=sys.stderr)
+    current, previous = flatten(results), flatten(baseline)
+    rows = []
+    for key in sorted(current.keys() & previous.keys()):
+        higher_is_better, noise = _compared(key)
+        new, old = current[key], previous[key]
+        change = (new - old) / old if old else 0.0
+        worse = old - new if higher_is_better else new - old
+        rows.append(
+            {
+                'metric': key,
+                'baseline': old,
+                'current': new,
+                'change': change,
+                'regressed': worse > noise and worse > max_regression * abs(old),
+            }
+        )
+    return rows
+
+
+def print_results(results: dict) -> None:
+    for profile, result in results['profiles'].items():
+        rss = result['peak_rss_mib']
+        print(
+            f'{profile}: start-up {result["startup_s"]:.2f} s, peak RSS agent '
+            f'{rss["agent"]:.0f} MiB, browser {rss["browser"]:.0f} MiB'
+        )
+        print(
+            f'  {"script":<9} {"steps":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+            f'{"steps/s":>8} {"KiB/step":>9}'
+        )
+        for script, r in result['scripts'].items():
+            print(
+                f'  {script:<9} {r["steps"]:>6} {r["latency_ms_p50"]:>9.1f} '
+                f'{r["latency_ms_p95"]:>9.1f} {r["latency_ms_p99"]:>9.1f} '
+                f'{r["steps_per_sec"]:>8.2f} {r["ipc_bytes_per_step"] / 1024:>9.1f}'
+            )
+
+
+def print_comparison(rows: list[dict]) -> None:
+    print(f'{"metric":<40} {"baseline":>12} {"current":>12} {"change":>8}')
+    for row in rows:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        print(
+            f'{row["metric"]:<40} {row["baseline"]:>12.2f} {row["current"]:>12.2f} '
+            f'{row["change"]:>+8.1%}{flag}'
+        )
+
+
+def _parse_profile(spec: str) -> PageProfile:
+    """A PageProfile from 'nodes=5000,depth=20,...'."""
+    values = dict(item.split('=', 1) for item in spec.split(',') if item)
+    return PageProfile(**{key: int(value) for key, value in values.items()})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument(
+        '--custom', metavar='SPEC', help="extra page profile, e.g. 'nodes=5000,depth=20,images=2'"
+    )
+    parser.add_argument('--scripts', nargs='+', choices=SCRIPTS, default=list(SCRIPTS))
+    parser.add_argument('--steps', type=int, default=20, help='round trips per script')
+    parser.add_argument('--transport', choices=('inline', 'shm'), default='inline')
+    parser.add_argument('--codec', choices=('png', 'webp', 'jpeg', 'raw'), default=None)
+    parser.add_argument('--delta', action='store_true', help='use delta observations')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--compare', help='compare these JSON results instead of running')
+    parser.add_argument(
+        '--max-regression', type=float, default=0.2, help='tolerated relative regression'
+    )
+    parser.add_argument('--json', action='store_true', help='print raw JSON results')
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error('--compare needs --baseline')
+        with open(args.compare) as f:
+            results = json.load(f)
+    else:
+        profiles = {name: PROFILES[name] for name in args.profiles}
+        if args.custom:
+            profiles['custom'] = _parse_profile(args.custom)
+        env_kwargs = {
+            'screenshot_transport': args.transport,
+            'codec': args.codec,
+            'delta_observations': args.delta,
+        }
+        multiprocessing.set_start_method('spawn', force=True)
+        results = {
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'config': {'steps': args.steps, 'scripts': args.scripts, 'env': env_kwargs},
+            'page_profiles': {name: asdict(profile) for name, profile in profiles.items()},
+            'profiles': {},
+        }
+        with SyntheticSite() as site:
+            for name, profile in profiles.items():
+                results['profiles'][name] = run_isolated(
+                    site.base_url, profile, args.scripts, args.steps, env_kwargs
+                )
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    rows = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f), args.max_regression)
+
+    if args.json:
+        print(json.dumps({'results': results, 'comparison': rows}, indent=2))
+    else:
+        if not args.compare:
+            print_results(results)
+        if rows is not None:
+            print()
+            print_comparison(rows)
+
+    if rows and any(row['regressed'] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
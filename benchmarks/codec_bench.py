@@ -0,0 +1,110 @@
+"""Screenshot codec micro-benchmark over realistic viewport sizes.
+
+Encodes synthetic UI-like frames (flat backgrounds, panels, text-like
+strokes and a photo-like region) with each ImageCodec configuration and
+reports encode time and base64 payload size:
+
+    python benchmarks/codec_bench.py --repeat 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+# run from a checkout too, without `pip install -e .`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qa_browser.browser.base64 import ImageCodec, image_to_png_base64_url
+
+VIEWPORTS = [(1280, 720), (1920, 1080), (2560, 1440)]
+
+CODECS = {
+    'png (legacy)': None,
+    'png level 1': ImageCodec(format='png', png_compress_level=1),
+    'png level 6': ImageCodec(format='png', png_compress_level=6),
+    'png level 1 @0.5x': ImageCodec(format='png', png_compress_level=1, scale=0.5),
+    'webp q80 m0': ImageCodec(format='webp', quality=80, webp_method=0),
+    'webp q80 m4': ImageCodec(format='webp', quality=80, webp_method=4),
+    'jpeg q85': ImageCodec(format='jpeg', quality=85),
+    'jpeg q70 @0.5x': ImageCodec(format='jpeg', quality=70, scale=0.5),
+    'raw': ImageCodec(format='raw'),
+}
+
+
+def synthetic_frame(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """A page-like frame: mostly flat, some text strokes and one noisy image."""
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 250, dtype=np.uint8)
+    # header bar and side panel
+    frame[: height // 12] = (33, 37, 41)
+    frame[:, : width // 6] = (240, 242, 245)
+    # text-like strokes
+    for row in range(height // 8, height - 20, 22):
+        length = int(rng.integers(width // 5, width // 2))
+        start = width // 5
+        mask = rng.random(length) > 0.35
+        frame[row : row + 10, start : start + length][:, mask] = (60, 60, 60)
+    # photo-like region
+    h0, w0 = height // 3, width // 2
+    frame[h0 : h0 + height // 4, w0 : w0 + width // 4] = rng.integers(
+        0, 255, (height // 4, width // 4, 3), dtype=np.uint8
+    )
+    return frame
+
+
+def bench(codec: ImageCodec | None, frame: np.ndarray, repeat: int) -> tuple[float, int]:
+    timings = []
+    payload = ''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if codec is None:
+            payload = image_to_png_base64_url(frame, add_data_prefix=True)
+        elif codec.is_raw:
+            # raw frames cross the pipe unencoded
+            payload = frame
+        else:
+            payload = codec.to_base64_url(frame)
+        timings.append((time.perf_counter() - start) * 1000)
+    size = payload.nbytes if isinstance(payload, np.ndarray) else len(payload)
+    return statistics.median(timings), size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true', help='print raw JSON results')
+    args = parser.parse_args()
+
+    results = []
+    for width, height in VIEWPORTS:
+        frame = synthetic_frame(width, height)
+        for name, codec in CODECS.items():
+            encode_ms, size = bench(codec, frame, args.repeat)
+            results.append(
+                {
+                    'viewport': f'{width}x{height}',
+                    'codec': name,
+                    'encode_ms': encode_ms,
+                    'bytes': size,
+                }
+            )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"viewport":<10} {"codec":<20} {"encode ms":>10} {"KiB":>10}')
+    for r in results:
+        print(
+            f'{r["viewport"]:<10} {r["codec"]:<20} {r["encode_ms"]:>10.1f} '
+            f'{r["bytes"] / 1024:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
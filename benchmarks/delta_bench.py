@@ -0,0 +1,123 @@
+"""Pickled observation size and time: full trees vs delta observations.
+
+Builds a synthetic accessibility tree and element properties, changes a few
+nodes per step (as a click or a typed character would) and compares what
+``BrowserEnv.step`` would pickle across the pipe with and without delta
+observations:
+
+    python benchmarks/delta_bench.py --nodes 20000 --steps 50 --changes 3
+"""
+
+import argparse
+import json
+import os
+import pickle
+import random
+import statistics
+import sys
+import time
+
+# run from a checkout too, without `pip install -e .`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from qa_browser.browser.delta import DeltaDecoder, DeltaEncoder
+
+FIELDS = ('axtree_object', 'extra_element_properties')
+
+
+def synthetic_page(num_nodes: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    nodes = [{'nodeId': '0', 'role': {'value': 'RootWebArea'}, 'name': {'value': 'Page'}, 'childIds': []}]
+    extra = {}
+    for idx in range(1, num_nodes):
+        parent = nodes[rng.randrange(max(0, idx - 50), idx)]
+        bid = f'b{idx}'
+        nodes.append(
+            {
+                'nodeId': str(idx),
+                'role': {'value': rng.choice(['button', 'link', 'StaticText', 'generic', 'textbox'])},
+                'name': {'value': f'element {idx}'},
+                'browsergym_id': bid,
+                'childIds': [],
+                'properties': [{'name': 'focused', 'value': {'value': False}}],
+            }
+        )
+        parent['childIds'].append(str(idx))
+        extra[bid] = {
+            'visibility': 1.0,
+            'bbox': [rng.random() * 1000, rng.random() * 1000, 80.0, 20.0],
+            'clickable': rng.random() < 0.3,
+            'set_of_marks': 1,
+        }
+    return {'axtree_object': {'nodes': nodes}, 'extra_element_properties': extra}
+
+
+def mutate(page: dict, changes: int, rng: random.Random) -> dict:
+    """A new observation with ``changes`` nodes edited, sharing everything else."""
+    nodes = list(page['axtree_object']['nodes'])
+    extra = dict(page['extra_element_properties'])
+    for _ in range(changes):
+        idx = rng.randrange(1, len(nodes))
+        node = dict(nodes[idx])
+        node['value'] = {'value': str(rng.random())}
+        nodes[idx] = node
+        bid = node['browsergym_id']
+        extra[bid] = {**extra[bid], 'visibility': rng.random()}
+    return {'axtree_object': {'nodes': nodes}, 'extra_element_properties': extra}
+
+
+def run(num_nodes: int, steps: int, changes: int, delta: bool) -> dict:
+    rng = random.Random(1)
+    page = synthetic_page(num_nodes)
+    encoder = DeltaEncoder(full_snapshot_interval=steps + 1)
+    decoder = DeltaDecoder()
+    sizes, encode_ms, decode_ms = [], [], []
+    for _ in range(steps):
+        page = mutate(page, changes, rng)
+        start = time.perf_counter()
+        if delta:
+            bases = decoder.bases()
+            message = {field: encoder.encode(field, page[field], bases.get(field)) for field in FIELDS}
+        else:
+            message = page
+        data = pickle.dumps(message)
+        encode_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        received = pickle.loads(data)
+        if delta:
+            received = {field: decoder.decode(field, received[field]) for field in FIELDS}
+        decode_ms.append((time.perf_counter() - start) * 1000)
+        assert received == page
+        sizes.append(len(data))
+    return {
+        'mode': 'delta' if delta else 'full',
+        'median_bytes': statistics.median(sizes),
+        'median_encode_ms': statistics.median(encode_ms),
+        'median_decode_ms': statistics.median(decode_ms),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=20000)
+    parser.add_argument('--steps', type=int, default=50)
+    parser.add_argument('--changes', type=int, default=3)
+    parser.add_argument('--json', action='store_true', help='print raw JSON results')
+    args = parser.parse_args()
+
+    results = [run(args.nodes, args.steps, args.changes, delta) for delta in (False, True)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f'{"mode":<6} {"KiB/step":>10} {"encode ms":>10} {"decode ms":>10}')
+    for r in results:
+        print(
+            f'{r["mode"]:<6} {r["median_bytes"] / 1024:>10.1f} '
+            f'{r["median_encode_ms"]:>10.1f} {r["median_decode_ms"]:>10.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Cold-start import time of qa_browser entry points, with a regression budget.
+
+Every import runs in a fresh interpreter. Wall time and RSS growth are the
+median over ``--repeat`` runs; one extra ``python -X importtime`` run lists
+the modules the import loads, so the heaviest ones can be reported and
+modules that must stay out of an entry point are caught:
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --check   # exit 1 if a budget is exceeded
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Heavy dependencies that only the browser process (or the server) may load
+BROWSER_STACK = ('browsergym', 'gymnasium', 'playwright', 'html2text')
+SERVER_STACK = ('fastapi', 'starlette', 'uvicorn')
+
+# entry point -> (wall time budget in ms, top-level modules it must not import)
+BUDGETS = {
+    'qa_browser': (300, BROWSER_STACK + SERVER_STACK + ('numpy', 'PIL')),
+    'qa_browser.events': (300, BROWSER_STACK + SERVER_STACK + ('numpy', 'PIL')),
+    'qa_browser.browser.browser_env': (1000, BROWSER_STACK + SERVER_STACK),
+}
+
+_MARKER = '--qa-browser-import--'
+
+_TIMING_SCRIPT = """
+import resource, sys, time
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import {target}
+elapsed = time.perf_counter() - start
+print(elapsed * 1000, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss)
+"""
+
+
+def _run(args: list[str]) -> subprocess.CompletedProcess:
+    # the checkout must win over an installed copy
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    return subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def loaded_modules(target: str) -> list[tuple[str, int]]:
+    """(module, self time in µs) of every module ``import target`` loads, in load order."""
+    script = f'import sys; sys.stderr.write({_MARKER!r} + "\\n"); import {target}'
+    stderr = _run(['-X', 'importtime', '-c', script]).stderr
+    modules = []
+    for line in stderr.split(_MARKER, 1)[-1].splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:') :].split('|')
+        modules.append((name.strip(), int(self_us)))
+    return modules
+
+
+def measure(target: str, repeat: int, top: int) -> dict:
+    wall_ms, rss_kib = [], []
+    for _ in range(repeat):
+        elapsed, rss = _run(['-c', _TIMING_SCRIPT.format(target=target)]).stdout.split()
+        wall_ms.append(float(elapsed))
+        rss_kib.append(int(rss))
+
+    modules = loaded_modules(target)
+    heaviest = sorted(modules, key=lambda module: module[1], reverse=True)[:top]
+    budget_ms, forbidden = BUDGETS.get(target, (None, ()))
+    roots = {name.split('.')[0] for name, _ in modules}
+    return {
+        'target': target,
+        'median_ms': statistics.median(wall_ms),
+        'median_rss_kib': statistics.median(rss_kib),
+        'num_modules': len(modules),
+        'heaviest': [{'module': name, 'self_ms': us / 1000} for name, us in heaviest],
+        'budget_ms': budget_ms,
+        'forbidden_loaded': sorted(roots.intersection(forbidden)),
+    }
+
+
+def violations(result: dict) -> list[str]:
+    problems = []
+    if result['budget_ms'] is not None and result['median_ms'] > result['budget_ms']:
+        problems.append(
+            f'{result["target"]}: {result["median_ms"]:.0f} ms > budget {result["budget_ms"]} ms'
+        )
+    if result['forbidden_loaded']:
+        problems.append(
+            f'{result["target"]}: imports {", ".join(result["forbidden_loaded"])}'
+        )
+    return problems
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        'targets', nargs='*', default=list(BUDGETS), help='modules to import (default: all budgeted)'
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help='heaviest modules to list')
+    parser.add_argument('--check', action='store_true', help='exit 1 if a budget is exceeded')
+    parser.add_argument('--json', action='store_true', help='print raw JSON results')
+    args = parser.parse_args()
+
+    results = [measure(target, args.repeat, args.top) for target in args.targets]
+    problems = [problem for result in results for problem in violations(result)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f'{"target":<32} {"ms":>8} {"budget":>8} {"RSS KiB":>9} {"modules":>8}')
+        for r in results:
+            budget = '-' if r['budget_ms'] is None else str(r['budget_ms'])
+            print(
+                f'{r["target"]:<32} {r["median_ms"]:>8.1f} {budget:>8} '
+                f'{r["median_rss_kib"]:>9.0f} {r["num_modules"]:>8}'
+            )
+            heaviest = ', '.join(f'{m["module"]} {m["self_ms"]:.1f}' for m in r['heaviest'])
+            print(f'    heaviest (self ms): {heaviest}')
+        for problem in problems:
+            print(f'OVER BUDGET {problem}')
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Pipe round-trip latency and idle CPU: 10 ms poll loops vs blocking waits.
+
+Reproduces the request/response loop used between ``BrowserEnv`` and its
+``browser_process`` with an echo child instead of a browser, so it runs
+without Playwright:
+
+    python benchmarks/ipc_latency.py --round-trips 2000 --idle 3
+
+``poll`` is the previous transport (``conn.poll(timeout=0.01)`` in a
+``while True`` on both sides), ``wait`` is the current one
+(``multiprocessing.connection.wait`` with a deadline).
+"""
+
+import argparse
+import json
+import multiprocessing
+import multiprocessing.connection
+import statistics
+import time
+
+POLL_INTERVAL = 0.01
+WAIT_INTERVAL = 1.0
+
+
+def _next_request(conn, mode: str):
+    while True:
+        if mode == 'poll':
+            if conn.poll(timeout=POLL_INTERVAL):
+                return conn.recv()
+        elif multiprocessing.connection.wait([conn], timeout=WAIT_INTERVAL):
+            return conn.recv()
+
+
+def _echo_server(conn, mode: str) -> None:
+    idle_started = None
+    while True:
+        request_id, payload = _next_request(conn, mode)
+        if request_id == 'SHUTDOWN':
+            return
+        if request_id == 'IDLE_START':
+            idle_started = time.process_time()
+            continue
+        if request_id == 'IDLE_STOP':
+            conn.send((request_id, time.process_time() - idle_started))
+            continue
+        if request_id == 'SLOW':
+            time.sleep(payload)
+        conn.send((request_id, payload))
+
+
+def _round_trip(conn, mode: str, request_id: str, payload, timeout: float = 60):
+    conn.send((request_id, payload))
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError('echo server took too long to respond')
+        if mode == 'poll':
+            ready = conn.poll(timeout=POLL_INTERVAL)
+        else:
+            ready = multiprocessing.connection.wait(
+                [conn], timeout=min(remaining, WAIT_INTERVAL)
+            )
+        if ready:
+            response_id, response = conn.recv()
+            if response_id == request_id:
+                return response
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def run_mode(mode: str, round_trips: int, payload_bytes: int, idle: float) -> dict:
+    agent_side, browser_side = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_echo_server, args=(browser_side, mode))
+    process.start()
+    payload = b'x' * payload_bytes
+    try:
+        # warm up
+        for i in range(50):
+            _round_trip(agent_side, mode, f'warmup-{i}', payload)
+
+        latencies = []
+        for i in range(round_trips):
+            start = time.perf_counter()
+            _round_trip(agent_side, mode, f'req-{i}', payload)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        # CPU burnt by the browser side while nobody sends anything
+        agent_side.send(('IDLE_START', None))
+        time.sleep(idle)
+        browser_idle_cpu = _round_trip(agent_side, mode, 'IDLE_STOP', None)
+
+        # CPU burnt by the agent side while it waits for a slow action
+        cpu_before = time.process_time()
+        _round_trip(agent_side, mode, 'SLOW', idle)
+        agent_wait_cpu = time.process_time() - cpu_before
+    finally:
+        agent_side.send(('SHUTDOWN', None))
+        process.join(5)
+
+    return {
+        'mode': mode,
+        'round_trips': round_trips,
+        'payload_bytes': payload_bytes,
+        'latency_ms_mean': statistics.fmean(latencies),
+        'latency_ms_p50': _percentile(latencies, 0.50),
+        'latency_ms_p95': _percentile(latencies, 0.95),
+        'latency_ms_p99': _percentile(latencies, 0.99),
+        'browser_idle_cpu_pct': 100 * browser_idle_cpu / idle,
+        'agent_wait_cpu_pct': 100 * agent_wait_cpu / idle,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--round-trips', type=int, default=2000)
+    parser.add_argument('--payload-bytes', type=int, default=256)
+    parser.add_argument('--idle', type=float, default=3.0, help='idle window in seconds')
+    parser.add_argument('--json', action='store_true', help='print raw JSON results')
+    args = parser.parse_args()
+
+    multiprocessing.set_start_method('spawn', force=True)
+    results = [
+        run_mode(mode, args.round_trips, args.payload_bytes, args.idle)
+        for mode in ('poll', 'wait')
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f'{"mode":<6} {"mean ms":>9} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} '
+        f'{"idle CPU %":>11} {"wait CPU %":>11}'
+    )
+    for r in results:
+        print(
+            f'{r["mode"]:<6} {r["latency_ms_mean"]:>9.3f} {r["latency_ms_p50"]:>9.3f} '
+            f'{r["latency_ms_p95"]:>9.3f} {r["latency_ms_p99"]:>9.3f} '
+            f'{r["browser_idle_cpu_pct"]:>11.3f} {r["agent_wait_cpu_pct"]:>11.3f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Local HTTP server of generated pages for offline browser benchmarks.
+
+Pages are built from a PageProfile (DOM size, nesting depth, image count and
+weight, JS mutation rate) passed in the query string, so benchmarks never
+depend on the network:
+
+    python benchmarks/synthetic_site.py --port 8765
+    # http://127.0.0.1:8765/page?nodes=2000&depth=12&images=4&image_kb=200&churn_ms=50
+
+Every page has the same controls, with fixed ids and the accessible names in
+CONTROLS. BrowserGym assigns its own ids (``bid``) when it marks the page, so
+action scripts look the controls up by name in an observation's accessibility
+tree (see ``browser_env_bench.resolve_controls``).
+"""
+
+import argparse
+import functools
+import html
+import io
+import random
+import threading
+from dataclasses import asdict, dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+import numpy as np
+from PIL import Image
+
+LEAF_TAGS = ('p', 'span', 'a', 'li', 'button', 'label')
+
+# control -> accessible name of the control in every page's header
+CONTROLS = {
+    'input': 'Bench input',
+    'button': 'Bench button',
+    'link': 'Next page',
+}
+
+
+@dataclass(frozen=True)
+class PageProfile:
+    # elements in the generated tree
+    nodes: int = 500
+    # nesting depth of the deepest branch, which drives the axtree depth
+    depth: int = 8
+    images: int = 0
+    # approximate size of each (incompressible) PNG
+    image_kb: int = 100
+    # interval of the JS timer that rewrites text nodes; 0 disables it
+    churn_ms: int = 0
+    # text nodes rewritten per timer tick
+    churn_nodes: int = 20
+
+    def query(self, seed: int = 0) -> str:
+        return urlencode({**asdict(self), 'seed': seed})
+
+
+PROFILES = {
+    'small': PageProfile(nodes=200, depth=4),
+    'medium': PageProfile(nodes=2000, depth=12, images=4, image_kb=200),
+    'large': PageProfile(nodes=10000, depth=24, images=8, image_kb=500, churn_ms=50),
+}
+
+
+def _int_params(query: str) -> dict[str, int]:
+    return {key: int(values[-1]) for key, values in parse_qs(query).items() if values[-1].isdigit()}
+
+
+def render_page(profile: PageProfile, seed: int = 0) -> str:
+    """HTML of a page with ``profile.nodes`` elements, deterministic per seed."""
+    rng = random.Random(seed)
+    depth = max(1, profile.depth)
+    # one spine of nested sections gives the page its depth; the remaining
+    # elements hang off random levels of it
+    per_level: list[list[str]] = [[] for _ in range(depth)]
+    for index in range(max(0, profile.nodes - depth)):
+        tag = rng.choice(LEAF_TAGS)
+        text = f'item {index} {rng.randrange(10**6)}'
+        attrs = ' href="#"' if tag == 'a' else ''
+        per_level[rng.randrange(depth)].append(f'<{tag}{attrs} class="leaf">{text}</{tag}>')
+
+    body = ''
+    for level in reversed(range(depth)):
+        body = f'<section data-level="{level}">{"".join(per_level[level])}{body}</section>'
+
+    images = ''.join(
+        f'<img src="/image/{index}.png?kb={profile.image_kb}&seed={seed}" alt="image {index}">'
+        for index in range(profile.images)
+    )
+    next_query = html.escape(profile.query(seed + 1))
+    churn = ''
+    if profile.churn_ms > 0:
+        churn = f"""<script>
+const leaves = document.getElementsByClassName('leaf');
+let tick = 0;
+setInterval(() => {{
+  tick++;
+  for (let i = 0; i < {profile.churn_nodes} && leaves.length; i++) {{
+    leaves[(tick * {profile.churn_nodes} + i) % leaves.length].textContent = 'churn ' + tick + ' ' + i;
+  }}
+}}, {profile.churn_ms});
+</script>"""
+
+    return f"""<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>Synthetic page {seed}</title></head>
+<body>
+<header>
+  <input id="bench-input" type="text" aria-label="{CONTROLS['input']}">
+  <button id="bench-button" onclick="this.dataset.clicks = (+this.dataset.clicks || 0) + 1">{CONTROLS['button']}</button>
+  <a id="bench-link" href="/page?{next_query}">{CONTROLS['link']}</a>
+</header>
+<main>{images}{body}</main>
+{churn}
+</body>
+</html>"""
+
+
+@functools.lru_cache(maxsize=64)
+def render_image(kb: int, seed: int = 0) -> bytes:
+    """PNG of random pixels, about ``kb`` KiB as noise doesn't compress."""
+    side = max(1, int((kb * 1024 / 3) ** 0.5))
+    pixels = np.random.default_rng(seed).integers(0, 255, (side, side, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        params = _int_params(url.query)
+        if url.path == '/page':
+            seed = params.pop('seed', 0)
+            fields = PageProfile.__dataclass_fields__
+            profile = PageProfile(**{key: value for key, value in params.items() if key in fields})
+            self._reply(200, 'text/html; charset=utf-8', render_page(profile, seed).encode())
+        elif url.path.startswith('/image/'):
+            index = url.path.rsplit('/', 1)[-1].split('.')[0]
+            seed = params.get('seed', 0) * 1000 + (int(index) if index.isdigit() else 0)
+            self._reply(200, 'image/png', render_image(params.get('kb', 100), seed))
+        else:
+            self._reply(404, 'text/plain', b'not found')
+
+    def _reply(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class SyntheticSite:
+    """Serves generated pages from a background thread.
+
+    Args:
+        host: Interface to bind
+        port: Port to bind; 0 picks a free one
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def page_url(self, profile: PageProfile, seed: int = 0) -> str:
+        return f'{self.base_url}/page?{profile.query(seed)}'
+
+    def start(self) -> 'SyntheticSite':
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name='synthetic-site', daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> 'SyntheticSite':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    site = SyntheticSite(args.host, args.port)
+    for name, profile in PROFILES.items():
+        print(f'{name:<8} {site.page_url(profile)}')
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -74,10 +74,14 @@ async def start_server_and_test():
     print("📡 WebSocket endpoint: ws://localhost:8000/ws/{test_id}")
     print("💚 Health check: http://localhost:8000/health")
     print("\n🔌 Connect a WebSocket client to see real-time updates!")
-    print("   Example: wscat -c ws://localhost:8000/ws/demo-test-123\n")
+    print("   Example: wscat -c ws://localhost:8000/ws/demo-test-123")
+    print("   Binary screenshots: ws://localhost:8000/ws/demo-test-123?protocol=binary\n")
 
     # Start server in background
-    config = uvicorn.Config(server.app, host="0.0.0.0", port=8000, log_level="info")
+    # permessage-deflate compresses the JSON events for clients that support it
+    config = uvicorn.Config(
+        server.app, host="0.0.0.0", port=8000, log_level="info", ws_per_message_deflate=True
+    )
     server_instance = uvicorn.Server(config)
 
     # Run server in background task
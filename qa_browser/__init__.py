@@ -4,22 +4,19 @@ QA Browser - Standalone Browser Automation Module
 
 __version__ = '0.1.0'
 
-from qa_browser.browser import (
-    BrowserEnv,
-    browse,
-    get_agent_obs_text,
-    get_axtree_str,
-    image_to_png_base64_url,
-    png_base64_url_to_image,
-)
+import importlib
+from typing import TYPE_CHECKING, Any
 
 from qa_browser.events import (
     ActionType,
     ObservationType,
+    ObservationField,
     EventSource,
     ActionSecurityRisk,
     BrowseURLAction,
     BrowseInteractiveAction,
+    BrowseBatchAction,
+    BatchObserveMode,
     BrowserOutputObservation,
 )
 
@@ -28,31 +25,98 @@ from qa_browser.exceptions import (
     BrowserInitException,
     BrowserUnavailableException,
     BrowserTimeoutException,
+    BrowserSessionNotFoundException,
+    BrowserObservationOutOfSyncException,
 )
 
-from qa_browser.server import QABrowserServer
+if TYPE_CHECKING:
+    from qa_browser.browser import (
+        AsyncBrowserEnv,
+        BrowserEnv,
+        BrowserPool,
+        BrowserSession,
+        browse,
+        EvalTaskQueue,
+        EvalTaskResult,
+        get_agent_obs_text,
+        get_axtree_str,
+        ImageCodec,
+        image_to_png_base64_url,
+        png_base64_url_to_image,
+        ScreenshotWriter,
+        serialize_axtree,
+    )
+    from qa_browser.server import QABrowserServer
+
+# Events and exceptions are plain Python and load eagerly. The browser stack
+# (browsergym, gymnasium, numpy, PIL) and the server (fastapi) are imported on
+# first access to one of their names.
+_LAZY_IMPORTS = {
+    'AsyncBrowserEnv': 'qa_browser.browser',
+    'BrowserEnv': 'qa_browser.browser',
+    'BrowserPool': 'qa_browser.browser',
+    'BrowserSession': 'qa_browser.browser',
+    'browse': 'qa_browser.browser',
+    'EvalTaskQueue': 'qa_browser.browser',
+    'EvalTaskResult': 'qa_browser.browser',
+    'get_agent_obs_text': 'qa_browser.browser',
+    'get_axtree_str': 'qa_browser.browser',
+    'ImageCodec': 'qa_browser.browser',
+    'image_to_png_base64_url': 'qa_browser.browser',
+    'png_base64_url_to_image': 'qa_browser.browser',
+    'ScreenshotWriter': 'qa_browser.browser',
+    'serialize_axtree': 'qa_browser.browser',
+    'QABrowserServer': 'qa_browser.server',
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
+
 
 __all__ = [
     # Browser
+    'AsyncBrowserEnv',
     'BrowserEnv',
+    'BrowserPool',
+    'BrowserSession',
     'browse',
+    'EvalTaskQueue',
+    'EvalTaskResult',
     'get_agent_obs_text',
     'get_axtree_str',
+    'ImageCodec',
     'image_to_png_base64_url',
     'png_base64_url_to_image',
+    'ScreenshotWriter',
+    'serialize_axtree',
     # Events
     'ActionType',
     'ObservationType',
+    'ObservationField',
     'EventSource',
     'ActionSecurityRisk',
     'BrowseURLAction',
     'BrowseInteractiveAction',
+    'BrowseBatchAction',
+    'BatchObserveMode',
     'BrowserOutputObservation',
     # Exceptions
     'BrowserError',
     'BrowserInitException',
     'BrowserUnavailableException',
     'BrowserTimeoutException',
+    'BrowserSessionNotFoundException',
+    'BrowserObservationOutOfSyncException',
     # Server
     'QABrowserServer',
 ]
@@ -1,15 +1,79 @@
 """QA Browser - Browser automation module"""
 
-from qa_browser.browser.browser_env import BrowserEnv
-from qa_browser.browser.utils import browse, get_agent_obs_text, get_axtree_str
-from qa_browser.browser.base64 import image_to_png_base64_url, png_base64_url_to_image
+import importlib
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from qa_browser.browser.async_browser_env import AsyncBrowserEnv
+    from qa_browser.browser.axtree import AXTreeChunk, AXTreeCursor, serialize_axtree
+    from qa_browser.browser.browser_env import BrowserEnv
+    from qa_browser.browser.pool import (
+        BrowserLease,
+        BrowserPool,
+        EvalTaskQueue,
+        EvalTaskResult,
+    )
+    from qa_browser.browser.screenshots import ScreenshotWriter
+    from qa_browser.browser.sessions import BrowserSession
+    from qa_browser.browser.utils import browse, get_agent_obs_text, get_axtree_str
+    from qa_browser.browser.base64 import (
+        ImageCodec,
+        image_to_png_base64_url,
+        png_base64_url_to_image,
+    )
+
+# Public names and the modules that define them. They are imported on first
+# access, so importing a single submodule doesn't load the whole browser stack.
+_LAZY_IMPORTS = {
+    'AsyncBrowserEnv': 'qa_browser.browser.async_browser_env',
+    'AXTreeChunk': 'qa_browser.browser.axtree',
+    'AXTreeCursor': 'qa_browser.browser.axtree',
+    'BrowserEnv': 'qa_browser.browser.browser_env',
+    'BrowserLease': 'qa_browser.browser.pool',
+    'BrowserPool': 'qa_browser.browser.pool',
+    'BrowserSession': 'qa_browser.browser.sessions',
+    'EvalTaskQueue': 'qa_browser.browser.pool',
+    'EvalTaskResult': 'qa_browser.browser.pool',
+    'browse': 'qa_browser.browser.utils',
+    'get_agent_obs_text': 'qa_browser.browser.utils',
+    'get_axtree_str': 'qa_browser.browser.utils',
+    'ImageCodec': 'qa_browser.browser.base64',
+    'image_to_png_base64_url': 'qa_browser.browser.base64',
+    'png_base64_url_to_image': 'qa_browser.browser.base64',
+    'ScreenshotWriter': 'qa_browser.browser.screenshots',
+    'serialize_axtree': 'qa_browser.browser.axtree',
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _LAZY_IMPORTS.get(name)
+    if module is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
+
 
 __all__ = [
+    'AsyncBrowserEnv',
+    'AXTreeChunk',
+    'AXTreeCursor',
     'BrowserEnv',
+    'BrowserLease',
+    'BrowserPool',
+    'BrowserSession',
     'browse',
+    'EvalTaskQueue',
+    'EvalTaskResult',
     'get_agent_obs_text',
     'get_axtree_str',
+    'ImageCodec',
     'image_to_png_base64_url',
     'png_base64_url_to_image',
+    'ScreenshotWriter',
+    'serialize_axtree',
 ]
-
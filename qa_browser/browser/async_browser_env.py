@@ -0,0 +1,120 @@
+"""Asyncio-native browser environment"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Iterable, Sequence
+
+from qa_browser import metrics
+from qa_browser.browser.browser_env import (
+    BROWSER_GET_CACHE_STATS_ACTION,
+    BROWSER_GET_SOM_ACTION,
+    CONTROL_ACTIONS,
+    BrowserEnv,
+    eval_env_id,
+)
+from qa_browser.browser.sessions import DEFAULT_SESSION
+from qa_browser.events import BatchObserveMode
+from qa_browser.exceptions import BrowserError
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBrowserEnv(BrowserEnv):
+    """BrowserEnv that is driven from an asyncio event loop.
+
+    Every request awaits the dispatcher future for its request id, so no
+    executor thread is tied up per step and any number of requests can be in
+    flight. The synchronous API inherited from BrowserEnv keeps working and
+    can be mixed freely with the async one.
+    """
+
+    async def astep(
+        self,
+        action_str: str,
+        timeout: float = 120,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Execute an action in the browser environment and return the observation."""
+        obs = await self._arequest(
+            self._action_data(action_str, fields, session_id), timeout=timeout
+        )
+        return self._finalize_obs(obs, session_id)
+
+    async def astep_many(
+        self,
+        actions: Sequence[str],
+        observe: str = BatchObserveMode.LAST.value,
+        timeout: float = 600,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Async variant of :meth:`BrowserEnv.step_many`."""
+        result = await self._arequest(
+            self._batch_data(actions, observe, fields, session_id), timeout=timeout
+        )
+        return self._finalize_batch(result, session_id)
+
+    async def aget_set_of_marks(
+        self, step: int | None = None, timeout: float = 60, session_id: str = DEFAULT_SESSION
+    ) -> str:
+        """Async variant of :meth:`BrowserEnv.get_set_of_marks`."""
+        response = await self._arequest(
+            self._query_data(BROWSER_GET_SOM_ACTION, session_id, step=step), timeout=timeout
+        )
+        return response['set_of_marks']
+
+    async def areset(
+        self,
+        start_url: str = 'about:blank',
+        timeout: float = 60,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Async variant of :meth:`BrowserEnv.reset`."""
+        obs = await self._arequest(
+            self._reset_data(start_url, fields, session_id), timeout=timeout
+        )
+        return self._finalize_obs(obs, session_id)
+
+    async def aload_eval_task(
+        self,
+        task_id: str,
+        seed: int | None = None,
+        timeout: float = 300,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Async variant of :meth:`BrowserEnv.load_eval_task`."""
+        obs = await self._arequest(
+            self._load_task_data(task_id, seed, fields, session_id), timeout=timeout
+        )
+        if session_id == DEFAULT_SESSION:
+            self.browsergym_eval_env = eval_env_id(task_id)
+        return self._finalize_obs(obs, session_id)
+
+    async def aget_cache_stats(self, timeout: float = 60) -> dict[str, dict[str, int]]:
+        """Async variant of :meth:`BrowserEnv.get_cache_stats`."""
+        return await self._arequest({'action': BROWSER_GET_CACHE_STATS_ACTION}, timeout=timeout)
+
+    async def _arequest(self, action_data: dict, timeout: float) -> Any:
+        unique_request_id = str(uuid.uuid4())
+        record = action_data['action'] not in CONTROL_ACTIONS
+        start = time.perf_counter()
+        future = self._dispatcher.submit(
+            unique_request_id, (unique_request_id, action_data), record=record
+        )
+        try:
+            response = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError('Browser environment took too long to respond.') from None
+        finally:
+            # a reply that arrives after a timeout or cancellation is dropped
+            self._dispatcher.discard(unique_request_id)
+        if record:
+            metrics.METRICS.observe_stage('round_trip', time.perf_counter() - start)
+        if isinstance(response, BrowserError):
+            raise response
+        return response
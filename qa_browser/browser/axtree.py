@@ -0,0 +1,251 @@
+"""Streaming, size-budgeted accessibility tree serialization"""
+
+from dataclasses import dataclass
+from typing import Any, Collection, Iterator
+
+# Default character budget for the accessibility tree shown to the agent
+AXTREE_CHAR_BUDGET = 100_000
+
+# Walk phases. When a tree does not fit its budget, visible or clickable nodes
+# are listed first ('priority') and everything else afterwards ('deferred').
+PHASE_ALL = 'all'
+PHASE_PRIORITY = 'priority'
+PHASE_DEFERRED = 'deferred'
+
+# (node index, depth, parent filtered, parent name)
+_Frame = tuple[int, int, bool, str]
+
+
+@dataclass(frozen=True)
+class AXTreeCursor:
+    """Where a truncated serialization stopped; only valid for the same tree."""
+
+    phase: str
+    stack: tuple[_Frame, ...]
+    num_nodes: int
+
+
+@dataclass(frozen=True)
+class AXTreeChunk:
+    """One budgeted piece of a serialized accessibility tree.
+
+    Attributes:
+        text: Serialized lines, in flatten_axtree_to_str format
+        num_nodes: Number of nodes (lines) in ``text``
+        truncated: Whether nodes were left out because of the budget
+        cursor: Pass to the next serialize() call to get the following chunk
+    """
+
+    text: str
+    num_nodes: int
+    truncated: bool
+    cursor: AXTreeCursor | None = None
+
+
+class AXTreeSerializer:
+    """Serializes a BrowserGym accessibility tree line by line.
+
+    Produces the same text as ``flatten_axtree_to_str(..., with_clickable=True,
+    skip_generic=False)`` when everything fits, but walks the tree iteratively
+    and stops as soon as the character or node budget is spent, so huge pages
+    never build their full string. ``ignored_roles`` and ``ignored_properties``
+    default to browsergym's.
+    """
+
+    def __init__(
+        self,
+        axtree_object: dict[str, Any],
+        extra_element_properties: dict[str, Any] | None = None,
+        filter_visible_only: bool = False,
+        ignored_roles: Collection[str] | None = None,
+        ignored_properties: Collection[str] | None = None,
+    ):
+        if ignored_roles is None or ignored_properties is None:
+            # browsergym.utils.obs pulls in playwright; only load it once a tree is serialized
+            from browsergym.utils.obs import IGNORED_AXTREE_PROPERTIES, IGNORED_AXTREE_ROLES
+
+            ignored_roles = IGNORED_AXTREE_ROLES if ignored_roles is None else ignored_roles
+            if ignored_properties is None:
+                ignored_properties = IGNORED_AXTREE_PROPERTIES
+        self.ignored_roles = ignored_roles
+        self.ignored_properties = ignored_properties
+        self.nodes: list[dict[str, Any]] = axtree_object.get('nodes', [])
+        self.extra_element_properties = extra_element_properties or {}
+        self.filter_visible_only = filter_visible_only
+        self.node_id_to_idx = {node['nodeId']: idx for idx, node in enumerate(self.nodes)}
+
+    def serialize(
+        self,
+        max_chars: int | None = None,
+        max_nodes: int | None = None,
+        cursor: AXTreeCursor | None = None,
+        prioritize: bool = True,
+    ) -> AXTreeChunk:
+        """Serialize up to ``max_chars`` characters / ``max_nodes`` nodes.
+
+        Starts from ``cursor`` if given. With ``prioritize``, a tree that does not
+        fit is serialized visible and clickable nodes first. A chunk always makes
+        progress: a first line longer than ``max_chars`` is clipped.
+        """
+        for name, budget in (('max_chars', max_chars), ('max_nodes', max_nodes)):
+            if budget is not None and budget < 1:
+                raise ValueError(f'{name} must be at least 1, got {budget}')
+        if cursor is None:
+            cursor = AXTreeCursor(PHASE_ALL, self._root_stack(), 0)
+            chunk = self._take(cursor, max_chars, max_nodes)
+            if not (chunk.truncated and prioritize):
+                return chunk
+            cursor = AXTreeCursor(PHASE_PRIORITY, self._root_stack(), 0)
+        return self._take(cursor, max_chars, max_nodes)
+
+    def iter_lines(self, phase: str = PHASE_ALL) -> Iterator[str]:
+        """All serialized lines of ``phase``, in document order."""
+        stack = list(self._root_stack())
+        while stack:
+            line, children = self._visit(stack.pop(), phase)
+            stack.extend(reversed(children))
+            if line is not None:
+                yield line
+
+    def _root_stack(self) -> tuple[_Frame, ...]:
+        return ((0, 0, False, ''),) if self.nodes else ()
+
+    def _take(
+        self, cursor: AXTreeCursor, max_chars: int | None, max_nodes: int | None
+    ) -> AXTreeChunk:
+        phase = cursor.phase
+        stack = list(cursor.stack)
+        lines: list[str] = []
+        size = 0
+        while True:
+            if not stack:
+                if phase != PHASE_PRIORITY:
+                    break
+                phase, stack = PHASE_DEFERRED, list(self._root_stack())
+                continue
+
+            line, children = self._visit(stack[-1], phase)
+            if line is not None:
+                line_size = len(line) + (1 if lines else 0)
+                if not lines and max_chars is not None and line_size > max_chars:
+                    # too long for any chunk: clip it rather than never emit it
+                    line = line[:max_chars]
+                    line_size = max_chars
+                if (max_chars is not None and size + line_size > max_chars) or (
+                    max_nodes is not None and len(lines) >= max_nodes
+                ):
+                    # the node stays on the stack so the next chunk starts with it
+                    next_cursor = AXTreeCursor(phase, tuple(stack), cursor.num_nodes + len(lines))
+                    return AXTreeChunk('\n'.join(lines), len(lines), True, next_cursor)
+                lines.append(line)
+                size += line_size
+            stack.pop()
+            stack.extend(reversed(children))
+
+        return AXTreeChunk('\n'.join(lines), len(lines), False)
+
+    def _visit(self, frame: _Frame, phase: str) -> tuple[str | None, list[_Frame]]:
+        """Line of a node in ``phase`` (None if it isn't printed) and its child frames."""
+        node_idx, depth, parent_filtered, parent_name = frame
+        node = self.nodes[node_idx]
+        line, skip_node, filter_node, node_name = self._format_node(
+            node, depth, parent_filtered, parent_name
+        )
+
+        child_depth = depth if skip_node else depth + 1
+        children = [
+            (self.node_id_to_idx[child_id], child_depth, filter_node, node_name)
+            for child_id in node.get('childIds', [])
+            if child_id in self.node_id_to_idx and child_id != node['nodeId']
+        ]
+        if line is not None and phase != PHASE_ALL:
+            if (phase == PHASE_PRIORITY) != self._is_priority(node):
+                line = None
+        return line, children
+
+    def _is_priority(self, node: dict[str, Any]) -> bool:
+        properties = self.extra_element_properties.get(node.get('browsergym_id'))
+        if properties is None:
+            # nodes without browsergym marks count as visible, as in browsergym
+            return True
+        return properties.get('visibility', 0) >= 0.5 or bool(properties.get('clickable'))
+
+    def _format_node(
+        self, node: dict[str, Any], depth: int, parent_filtered: bool, parent_name: str
+    ) -> tuple[str | None, bool, bool, str]:
+        """Returns (line or None, skip_node, filter_node, node_name)."""
+        node_role = node['role']['value']
+        if node_role in self.ignored_roles or 'name' not in node:
+            return None, True, False, ''
+
+        node_name = node['name']['value']
+        bid = node.get('browsergym_id')
+
+        attributes = []
+        for prop in node.get('properties', []):
+            if 'value' not in prop or 'value' not in prop['value']:
+                continue
+            prop_name = prop['name']
+            prop_value = prop['value']['value']
+            if prop_name in self.ignored_properties:
+                continue
+            elif prop_name in ('required', 'focused', 'atomic'):
+                if prop_value:
+                    attributes.append(prop_name)
+            else:
+                attributes.append(f'{prop_name}={prop_value!r}')
+
+        skip_node = False
+        filter_node = False
+        if node_role == 'StaticText':
+            skip_node = parent_filtered or node_name in parent_name
+        elif bid is not None and bid in self.extra_element_properties:
+            properties = self.extra_element_properties[bid]
+            if self.filter_visible_only and properties['visibility'] < 0.5:
+                filter_node = skip_node = True
+            if properties['clickable']:
+                attributes.insert(0, 'clickable')
+
+        if skip_node:
+            return None, True, filter_node, node_name
+
+        if node_role == 'generic' and not node_name:
+            node_str = node_role
+        else:
+            node_str = f'{node_role} {node_name.strip()!r}'
+        if bid is not None:
+            node_str = f'[{bid}] {node_str}'
+        if 'value' in node and 'value' in node['value']:
+            node_str += f' value={node["value"]["value"]!r}'
+        if attributes:
+            node_str += ', '.join([''] + attributes)
+        return '\t' * depth + node_str, False, filter_node, node_name
+
+
+def serialize_axtree(
+    axtree_object: dict[str, Any],
+    extra_element_properties: dict[str, Any] | None = None,
+    filter_visible_only: bool = False,
+    max_chars: int | None = AXTREE_CHAR_BUDGET,
+    max_nodes: int | None = None,
+    cursor: AXTreeCursor | None = None,
+    prioritize: bool = True,
+) -> AXTreeChunk:
+    """Serialize an accessibility tree within a character / node budget.
+
+    Args:
+        axtree_object: BrowserGym accessibility tree
+        extra_element_properties: BrowserGym extra element properties, by bid
+        filter_visible_only: Leave out nodes that are not visible
+        max_chars: Character budget (None for no limit)
+        max_nodes: Node budget (None for no limit)
+        cursor: Continue after the chunk that returned this cursor
+        prioritize: List visible and clickable nodes first if the tree doesn't fit
+
+    Returns:
+        The serialized chunk, with a cursor if it was truncated
+    """
+    serializer = AXTreeSerializer(axtree_object, extra_element_properties, filter_visible_only)
+    return serializer.serialize(
+        max_chars=max_chars, max_nodes=max_nodes, cursor=cursor, prioritize=prioritize
+    )
@@ -2,9 +2,160 @@
 
 import base64
 import io
+from dataclasses import dataclass
+
 import numpy as np
 from PIL import Image
 
+from qa_browser import metrics
+
+# Screenshot formats an ImageCodec can produce. 'raw' frames are shipped
+# unencoded and only PNG-encoded on the agent side when someone asks for them.
+IMAGE_FORMATS = ('png', 'webp', 'jpeg', 'raw')
+
+MIME_TYPES = {
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'jpeg': 'image/jpeg',
+    'raw': 'image/png',
+}
+
+FILE_EXTENSIONS = {
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/jpeg': 'jpg',
+}
+
+
+def _to_pil_image(image: np.ndarray | Image.Image) -> Image.Image:
+    if isinstance(image, np.ndarray):
+        # avoid the astype() copy for frames that are already uint8
+        if image.dtype != np.uint8:
+            image = image.astype('uint8')
+        image = Image.fromarray(image, 'RGB')
+    return image
+
+
+@dataclass(frozen=True)
+class ImageCodec:
+    """How screenshots are encoded before they leave the browser process.
+
+    Args:
+        format: One of IMAGE_FORMATS
+        png_compress_level: zlib level for PNG, 0 (fastest) to 9 (smallest)
+        quality: Quality for WebP/JPEG, 1 to 100
+        webp_method: WebP effort, 0 (fastest) to 6 (smallest)
+        scale: Downscale factor applied before encoding, in (0, 1]
+    """
+
+    format: str = 'png'
+    png_compress_level: int = 6
+    quality: int = 80
+    webp_method: int = 4
+    scale: float = 1.0
+
+    def __post_init__(self) -> None:
+        if self.format not in IMAGE_FORMATS:
+            raise ValueError(f'Unsupported image format: {self.format}')
+        if not 0 <= self.png_compress_level <= 9:
+            raise ValueError(f'png_compress_level must be in [0, 9], got {self.png_compress_level}')
+        if not 1 <= self.quality <= 100:
+            raise ValueError(f'quality must be in [1, 100], got {self.quality}')
+        if not 0 < self.scale <= 1:
+            raise ValueError(f'scale must be in (0, 1], got {self.scale}')
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    @property
+    def is_raw(self) -> bool:
+        return self.format == 'raw'
+
+    def encode(self, image: np.ndarray | Image.Image) -> bytes:
+        """Encode an image; 'raw' codecs fall back to PNG."""
+        image = _to_pil_image(image)
+        if self.scale != 1:
+            width, height = image.size
+            image = image.resize(
+                (max(1, round(width * self.scale)), max(1, round(height * self.scale))),
+                Image.Resampling.BILINEAR,
+            )
+
+        buffered = io.BytesIO()
+        if self.format == 'jpeg':
+            image.convert('RGB').save(buffered, format='JPEG', quality=self.quality)
+        elif self.format == 'webp':
+            image.save(buffered, format='WEBP', quality=self.quality, method=self.webp_method)
+        else:
+            image.save(buffered, format='PNG', compress_level=self.png_compress_level)
+        return buffered.getvalue()
+
+    def to_base64_url(
+        self, image: np.ndarray | Image.Image, add_data_prefix: bool = True
+    ) -> str:
+        """Encode an image as a base64 string (data URL by default)."""
+        with metrics.stage('image_encode'):
+            encoded = self.encode(image)
+        with metrics.stage('base64'):
+            return bytes_to_base64_url(encoded, self.mime_type, add_data_prefix)
+
+
+def bytes_to_base64_url(
+    image_bytes: bytes, mime_type: str = 'image/png', add_data_prefix: bool = False
+) -> str:
+    """Base64-encode encoded image bytes.
+
+    Args:
+        image_bytes: Encoded image (PNG, WebP, JPEG)
+        mime_type: MIME type used for the data URL prefix
+        add_data_prefix: Whether to add a 'data:<mime_type>;base64,' prefix
+
+    Returns:
+        Base64-encoded image string
+    """
+    img_str = base64.b64encode(image_bytes).decode()
+
+    if add_data_prefix:
+        return f'data:{mime_type};base64,{img_str}'
+    return img_str
+
+
+def data_url_mime_type(data_url: str, default: str = 'image/png') -> str:
+    """Return the MIME type of a 'data:' URL, or ``default`` if it has no prefix."""
+    if data_url.startswith('data:') and ';' in data_url:
+        return data_url[5 : data_url.index(';')]
+    return default
+
+
+def image_to_png_bytes(image: np.ndarray | Image.Image) -> bytes:
+    """Encode an image as PNG.
+
+    Args:
+        image: NumPy array or PIL Image
+
+    Returns:
+        PNG file contents
+    """
+    image = _to_pil_image(image)
+
+    buffered = io.BytesIO()
+    image.save(buffered, format='PNG')
+    return buffered.getvalue()
+
+
+def png_bytes_to_base64_url(png_bytes: bytes, add_data_prefix: bool = False) -> str:
+    """Base64-encode PNG file contents.
+
+    Args:
+        png_bytes: PNG file contents
+        add_data_prefix: Whether to add 'data:image/png;base64,' prefix
+
+    Returns:
+        Base64-encoded PNG string
+    """
+    return bytes_to_base64_url(png_bytes, 'image/png', add_data_prefix)
+
 
 def image_to_png_base64_url(
     image: np.ndarray | Image.Image, add_data_prefix: bool = False
@@ -18,16 +169,7 @@ def image_to_png_base64_url(
     Returns:
         Base64-encoded PNG string
     """
-    if isinstance(image, np.ndarray):
-        image = Image.fromarray(image.astype('uint8'), 'RGB')
-
-    buffered = io.BytesIO()
-    image.save(buffered, format='PNG')
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-
-    if add_data_prefix:
-        return f'data:image/png;base64,{img_str}'
-    return img_str
+    return png_bytes_to_base64_url(image_to_png_bytes(image), add_data_prefix)
 
 
 def png_base64_url_to_image(png_base64_url: str) -> Image.Image:
@@ -48,4 +190,3 @@ def png_base64_url_to_image(png_base64_url: str) -> Image.Image:
 
     # Convert to PIL Image
     return Image.open(io.BytesIO(img_data))
-
@@ -1,20 +1,55 @@
 import atexit
+import concurrent.futures
 import json
 import multiprocessing
+import queue
+import threading
 import time
 import uuid
 import os
+from dataclasses import dataclass, field
+from multiprocessing.reduction import ForkingPickler
+from typing import TYPE_CHECKING, Any, Iterable, Sequence
 
-import browsergym.core  # noqa F401 (we register the openended task as a gym environment)
-import gymnasium as gym
-import html2text
+import numpy as np
 import tenacity
-from browsergym.utils.obs import flatten_dom_to_str, overlay_som
 
-from qa_browser.exceptions import BrowserInitException
-from qa_browser.browser.base64 import image_to_png_base64_url
+from qa_browser import metrics
+from qa_browser.events import BatchObserveMode, ObservationField
+from qa_browser.exceptions import (
+    BrowserError,
+    BrowserInitException,
+    BrowserSessionNotFoundException,
+    BrowserUnavailableException,
+)
+from qa_browser.browser.base64 import ImageCodec
+from qa_browser.browser.dispatcher import ResponseDispatcher
+from qa_browser.browser.frame_dedup import FrameDeduplicator, FrameRef
+from qa_browser.browser.delta import DELTA_FIELDS, Delta, DeltaDecoder, DeltaEncoder, FullSnapshot
+from qa_browser.browser.page_text import PageTextCache
+from qa_browser.browser.sessions import (
+    DEFAULT_SESSION,
+    BrowserSession,
+    OriginTracker,
+    RoundRobinScheduler,
+    SharedChromium,
+    clear_browser_context,
+    observe,
+)
+from qa_browser.browser.som import RemoteSetOfMarks, SetOfMarksRef, SetOfMarksRenderer
+from qa_browser.browser.frames import (
+    DEFAULT_MAX_FRAME_BYTES,
+    FrameDescriptor,
+    FrameRing,
+    LazyImage,
+)
 import logging
 
+if TYPE_CHECKING:
+    # browsergym, gymnasium and html2text are imported in the browser process only
+    import gymnasium as gym
+    import html2text
+
 logger = logging.getLogger(__name__)
 
 # Shutdown listeners (simplified for standalone module)
@@ -34,11 +69,126 @@ def stop_if_should_exit():
 
 BROWSER_EVAL_GET_GOAL_ACTION = 'GET_EVAL_GOAL'
 BROWSER_EVAL_GET_REWARDS_ACTION = 'GET_EVAL_REWARDS'
+BROWSER_GET_SOM_ACTION = 'GET_SET_OF_MARKS'
+BROWSER_GET_CACHE_STATS_ACTION = 'GET_CACHE_STATS'
+BROWSER_GET_METRICS_ACTION = 'GET_METRICS'
+BROWSER_STEP_MANY_ACTION = 'STEP_MANY'
+BROWSER_OPEN_SESSION_ACTION = 'OPEN_SESSION'
+BROWSER_CLOSE_SESSION_ACTION = 'CLOSE_SESSION'
+BROWSER_LOAD_EVAL_TASK_ACTION = 'LOAD_EVAL_TASK'
+BROWSER_RESET_ACTION = 'RESET'
+
+# Answered by the browser process reader thread, without waiting behind actions
+READ_ONLY_ACTIONS = (
+    BROWSER_EVAL_GET_GOAL_ACTION,
+    BROWSER_EVAL_GET_REWARDS_ACTION,
+    BROWSER_GET_SOM_ACTION,
+    BROWSER_GET_CACHE_STATS_ACTION,
+    BROWSER_GET_METRICS_ACTION,
+)
+
+# Monitoring requests; their pickling, round trip and response size are not
+# recorded, so that polling /metrics doesn't show up in the histograms it reads
+CONTROL_ACTIONS = (
+    BROWSER_GET_CACHE_STATS_ACTION,
+    BROWSER_GET_METRICS_ACTION,
+)
+
+# Waits on the pipe block; this only bounds how long a blocked wait can go
+# without re-checking the shutdown listeners, deadlines and process liveness.
+SHUTDOWN_CHECK_INTERVAL = 1.0
+
+
+SCREENSHOT_TRANSPORTS = ('inline', 'shm')
+
+
+@dataclass
+class _Session:
+    """Browser-process state of one session (a BrowserGym env on its own context)."""
+
+    session_id: str
+    env: 'gym.Env'
+    som_renderer: SetOfMarksRenderer
+    delta_encoder: DeltaEncoder | None = None
+    frame_dedup: FrameDeduplicator | None = None
+    step_count: int = 0
+    # set after every env.reset(), for in-place resets of the context
+    origins: OriginTracker | None = None
+    initial_chat_len: int = 0
+    # EVAL ONLY
+    eval_goal: str | None = None
+    goal_image_urls: list[str] = field(default_factory=list)
+    eval_rewards: list[float] = field(default_factory=list)
+
+
+def eval_env_id(name: str) -> str:
+    """Gym id of a BrowserGym benchmark task, e.g. 'webarena.310'."""
+    return name if name.startswith('browsergym/') else 'browsergym/' + name
+
+
+def register_eval_envs(env_id: str) -> None:
+    """Import the benchmark package that registers ``env_id`` as a gym environment.
+
+    Imports are cached by the interpreter, so this is free once a worker has
+    loaded a task of the same benchmark.
+    """
+    if 'visualwebarena' in env_id:
+        import browsergym.visualwebarena  # noqa F401 register visualwebarena tasks as gym environments
+
+        ensure_nltk_data('tokenizers/punkt_tab', 'punkt_tab')
+    elif 'webarena' in env_id:
+        import browsergym.webarena  # noqa F401 register webarena tasks as gym environments
+    elif 'miniwob' in env_id:
+        import browsergym.miniwob  # noqa F401 register miniwob tasks as gym environments
+    else:
+        raise ValueError(f'Unsupported browsergym eval env: {env_id}')
+
+
+def ensure_nltk_data(resource: str, package: str) -> None:
+    """Download an NLTK package only if ``resource`` isn't found locally.
+
+    Uses the data under NLTK_DATA (or NLTK's default paths) when present, so
+    workers start offline and don't hit the network on every launch.
+    """
+    import nltk
+
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        logger.info(f'Downloading NLTK package {package}')
+        nltk.download(package, quiet=True)
+
+
+def _overlay_som(frame: np.ndarray, extra_element_properties: dict) -> np.ndarray:
+    from browsergym.utils.obs import overlay_som
+
+    with metrics.stage('overlay_som'):
+        return overlay_som(frame, extra_element_properties)
+
+
+def _sum_stats(stats: Iterable[dict[str, int]]) -> dict[str, int]:
+    total: dict[str, int] = {}
+    for entry in stats:
+        for key, value in entry.items():
+            total[key] = total.get(key, 0) + value
+    return total
 
 
 class BrowserEnv:
-    def __init__(self, browsergym_eval_env: str | None = None):
-        self.html_text_converter = self.get_html_text_converter()
+    def __init__(
+        self,
+        browsergym_eval_env: str | None = None,
+        screenshot_transport: str = 'inline',
+        frame_slots: int = 3,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+        codec: ImageCodec | None = None,
+        som_cache_size: int = 16,
+        text_cache_size: int = 32,
+        delta_observations: bool = False,
+        full_snapshot_interval: int = 20,
+        dedup_frames: bool = False,
+        frame_diff_threshold: float | None = None,
+    ):
         self.eval_mode = False
         self.eval_dir = ''
 
@@ -46,14 +196,55 @@ class BrowserEnv:
         self.browsergym_eval_env = browsergym_eval_env
         self.eval_mode = bool(browsergym_eval_env)
 
+        # 'inline' ships PNG/base64 screenshots through the pipe; 'shm' passes raw
+        # frames through a shared-memory ring and encodes lazily on the agent side
+        if screenshot_transport not in SCREENSHOT_TRANSPORTS:
+            raise ValueError(f'Unsupported screenshot transport: {screenshot_transport}')
+        self.screenshot_transport = screenshot_transport
+        self.frame_slots = frame_slots
+        self.max_frame_bytes = max_frame_bytes
+        # created by each init_browser() attempt, as close() releases it
+        self.frame_ring: FrameRing | None = None
+
+        # screenshot/Set-of-Marks encoding; lets deployments trade fidelity for latency
+        self.codec = codec or ImageCodec()
+        # Set-of-Marks overlays are rendered on demand and memoized in the browser process
+        self.som_cache_size = som_cache_size
+        # page text is memoized by DOM fingerprint in the browser process
+        self.text_cache_size = text_cache_size
+
+        # ship axtree/DOM/element properties as diffs against the previous step;
+        # the agent side mirrors them and a full snapshot is sent periodically
+        self.delta_observations = delta_observations
+        self.full_snapshot_interval = full_snapshot_interval
+        # agent-side delta mirrors, one per session
+        self.delta_decoders: dict[str, DeltaDecoder] = {}
+
+        # ship a FrameRef instead of a screenshot that repeats the previous one;
+        # with a threshold, nearly identical frames (mean thumbnail difference
+        # in [0, 1]) count as repeats too
+        self.dedup_frames = dedup_frames
+        self.frame_diff_threshold = frame_diff_threshold
+        # agent side: session id -> (step, screenshot) of the last frame received
+        self.last_frames: dict[str, tuple[int, Any]] = {}
+
         # Initialize browser environment process
         multiprocessing.set_start_method('spawn', force=True)
-        self.browser_side, self.agent_side = multiprocessing.Pipe()
-
         self.init_browser()
         atexit.register(self.close)
+        # browser process stages show up in metrics.collect() and /metrics
+        metrics.add_collector(self, self._collect_metrics)
+
+    def __getstate__(self) -> dict:
+        # the spawned browser process gets a pickled copy of the env; the
+        # agent-side dispatcher (threads, locks, futures) stays behind
+        state = self.__dict__.copy()
+        state.pop('_dispatcher', None)
+        return state
+
+    def get_html_text_converter(self) -> 'html2text.HTML2Text':
+        import html2text
 
-    def get_html_text_converter(self) -> html2text.HTML2Text:
         html_text_converter = html2text.HTML2Text()
         # ignore links and images
         html_text_converter.ignore_links = False
@@ -71,168 +262,802 @@ class BrowserEnv:
     )
     def init_browser(self) -> None:
         logger.debug('Starting browser env...')
+        # a failed attempt closes the pipe and the frame ring, so every attempt
+        # gets its own
+        self.browser_side, self.agent_side = multiprocessing.Pipe()
+        if self.screenshot_transport == 'shm':
+            self.frame_ring = FrameRing(
+                slots=self.frame_slots, max_frame_bytes=self.max_frame_bytes
+            )
         try:
             self.process = multiprocessing.Process(target=self.browser_process)
             self.process.start()
         except Exception as e:
             logger.error(f'Failed to start browser process: {e}')
             raise
+        self._dispatcher = ResponseDispatcher(
+            self.agent_side, self.process.is_alive, SHUTDOWN_CHECK_INTERVAL
+        )
 
         if not self.check_alive(timeout=200):
             self.close()
             raise BrowserInitException('Failed to start browser environment.')
 
     def browser_process(self) -> None:
+        # drop the inherited copy of the agent end so a dead agent shows up as EOF
+        self.agent_side.close()
+
+        # the heavy browser stack is only ever imported here, in the browser process
+        import browsergym.core  # noqa F401 (we register the openended task as a gym environment)
+
         if self.eval_mode:
             assert self.browsergym_eval_env is not None
             logger.info('Initializing browser env for web browsing evaluation.')
-            if not self.browsergym_eval_env.startswith('browsergym/'):
-                self.browsergym_eval_env = 'browsergym/' + self.browsergym_eval_env
-            if 'visualwebarena' in self.browsergym_eval_env:
-                import browsergym.visualwebarena  # noqa F401 register visualwebarena tasks as gym environments
-                import nltk
-
-                nltk.download('punkt_tab')
-            elif 'webarena' in self.browsergym_eval_env:
-                import browsergym.webarena  # noqa F401 register webarena tasks as gym environments
-            elif 'miniwob' in self.browsergym_eval_env:
-                import browsergym.miniwob  # noqa F401 register miniwob tasks as gym environments
-            else:
-                raise ValueError(
-                    f'Unsupported browsergym eval env: {self.browsergym_eval_env}'
-                )
-            env = gym.make(self.browsergym_eval_env, tags_to_mark='all', timeout=100000)
-        else:
-            # Create downloads directory in the current working directory
-            downloads_path = os.path.join(os.getcwd(), '.downloads')
-            os.makedirs(downloads_path, exist_ok=True)
-            
-            env = gym.make(
-                'browsergym/openended',
-                task_kwargs={'start_url': 'about:blank', 'goal': 'PLACEHOLDER_GOAL'},
-                wait_for_user_message=False,
-                headless=True,
-                disable_env_checker=True,
-                tags_to_mark='all',
-                timeout=100000,
-                pw_context_kwargs={'accept_downloads': True},
-                pw_chromium_kwargs={'downloads_path': downloads_path},
-            )
-        obs, info = env.reset()
+            self.browsergym_eval_env = eval_env_id(self.browsergym_eval_env)
+            register_eval_envs(self.browsergym_eval_env)
 
-        logger.info('Successfully called env.reset')
-        # EVAL ONLY: save the goal into file for evaluation
-        self.eval_goal = None
-        self.goal_image_urls = []
-        self.eval_rewards: list[float] = []
-        if self.eval_mode:
-            self.eval_goal = obs['goal']
-            if 'goal_object' in obs:
-                obs['goal_object'] = list(obs['goal_object'])
-                if len(obs['goal_object']) > 0:
-                    self.eval_goal = obs['goal_object'][0]['text']
-                for message in obs['goal_object']:
-                    if message['type'] == 'image_url':
-                        image_src = message['image_url']
-                        if isinstance(image_src, dict):
-                            image_src = image_src['url']
-                        self.goal_image_urls.append(image_src)
-            logger.debug(f'Browsing goal: {self.eval_goal}')
+        # every session is a context of the same Chromium instead of its own browser
+        self.shared_chromium = SharedChromium.install()
+        self.html_text_converter = self.get_html_text_converter()
+        self.page_text = PageTextCache(self.html_text_converter, self.text_cache_size)
+        self.sessions: dict[str, _Session] = {}
+        self._open_session(DEFAULT_SESSION)
         logger.info('Browser env started.')
 
+        # a reader thread answers read-only queries right away and queues the
+        # rest for this (Playwright) thread, so queries never wait behind actions;
+        # liveness probes are queued as well, to prove this thread still runs
+        self._send_lock = threading.Lock()
+        requests: queue.Queue = queue.Queue()
+        threading.Thread(
+            target=self._read_requests, args=(requests,), name='browser-env-reader', daemon=True
+        ).start()
+        scheduler = RoundRobinScheduler()
+
         while should_continue():
             try:
-                if self.browser_side.poll(timeout=0.01):
-                    unique_request_id, action_data = self.browser_side.recv()
-
-                    # shutdown the browser environment
-                    if unique_request_id == 'SHUTDOWN':
-                        logger.debug('SHUTDOWN recv, shutting down browser env...')
-                        env.close()
-                        return
-                    elif unique_request_id == 'IS_ALIVE':
-                        self.browser_side.send(('ALIVE', None))
-                        continue
-
-                    # EVAL ONLY: Get evaluation info
-                    if action_data['action'] == BROWSER_EVAL_GET_GOAL_ACTION:
-                        self.browser_side.send(
-                            (
-                                unique_request_id,
-                                {
-                                    'text_content': self.eval_goal,
-                                    'image_content': self.goal_image_urls,
-                                },
-                            )
-                        )
-                        continue
-                    elif action_data['action'] == BROWSER_EVAL_GET_REWARDS_ACTION:
-                        self.browser_side.send(
-                            (
-                                unique_request_id,
-                                {'text_content': json.dumps(self.eval_rewards)},
-                            )
-                        )
-                        continue
-
-                    action = action_data['action']
-                    obs, reward, terminated, truncated, info = env.step(action)
-
-                    # EVAL ONLY: Save the rewards into file for evaluation
-                    if self.eval_mode:
-                        self.eval_rewards.append(reward)
-
-                    # add text content of the page
-                    html_str = flatten_dom_to_str(obs['dom_object'])
-                    obs['text_content'] = self.html_text_converter.handle(html_str)
-                    # make observation serializable
-                    obs['set_of_marks'] = image_to_png_base64_url(
-                        overlay_som(
-                            obs['screenshot'], obs.get('extra_element_properties', {})
-                        ),
-                        add_data_prefix=True,
-                    )
-                    obs['screenshot'] = image_to_png_base64_url(
-                        obs['screenshot'], add_data_prefix=True
-                    )
-                    obs['active_page_index'] = obs['active_page_index'].item()
-                    obs['elapsed_time'] = obs['elapsed_time'].item()
-                    self.browser_side.send((unique_request_id, obs))
-            except KeyboardInterrupt:
-                logger.debug('Browser env process interrupted by user.')
                 try:
-                    env.close()
-                except Exception:
+                    # block only while there is nothing to run, then drain the queue
+                    if scheduler:
+                        item = requests.get_nowait()
+                    else:
+                        item = requests.get(timeout=SHUTDOWN_CHECK_INTERVAL)
+                    while True:
+                        unique_request_id, action_data = item
+
+                        # shutdown the browser environment
+                        if unique_request_id == 'SHUTDOWN':
+                            logger.debug('SHUTDOWN recv, shutting down browser env...')
+                            self._close_sessions()
+                            if self.frame_ring is not None:
+                                self.frame_ring.close()
+                            return
+                        elif unique_request_id is None:
+                            raise EOFError()
+                        elif unique_request_id == 'IS_ALIVE':
+                            # answered here, between actions, so that a stuck
+                            # Playwright thread fails the probe
+                            self._send(('ALIVE', action_data), record=False)
+                        else:
+                            scheduler.put(action_data.get('session_id', DEFAULT_SESSION), item)
+                        item = requests.get_nowait()
+                except queue.Empty:
                     pass
+                if not scheduler:
+                    continue
+
+                # actions of different sessions take turns
+                unique_request_id, action_data = scheduler.pop()
+                with metrics.stage('browser_action'):
+                    response = self._run_action(action_data)
+                self._send((unique_request_id, response))
+            except EOFError:
+                logger.debug('Agent side of the pipe closed, shutting down browser env...')
+                self._close_sessions()
                 return
+            except KeyboardInterrupt:
+                logger.debug('Browser env process interrupted by user.')
+                self._close_sessions()
+                return
+
+    def _make_gym_env(self) -> 'gym.Env':
+        import gymnasium as gym
+
+        if self.eval_mode:
+            return gym.make(self.browsergym_eval_env, tags_to_mark='all', timeout=100000)
+
+        # Create downloads directory in the current working directory
+        downloads_path = os.path.join(os.getcwd(), '.downloads')
+        os.makedirs(downloads_path, exist_ok=True)
+
+        return gym.make(
+            'browsergym/openended',
+            task_kwargs={'start_url': 'about:blank', 'goal': 'PLACEHOLDER_GOAL'},
+            wait_for_user_message=False,
+            headless=True,
+            disable_env_checker=True,
+            tags_to_mark='all',
+            timeout=100000,
+            pw_context_kwargs={'accept_downloads': True},
+            pw_chromium_kwargs={'downloads_path': downloads_path},
+        )
+
+    def _open_session(self, session_id: str) -> '_Session':
+        env = self._make_gym_env()
+        obs, info = env.reset()
+        logger.info('Successfully called env.reset')
+
+        session = _Session(
+            session_id=session_id,
+            env=env,
+            som_renderer=SetOfMarksRenderer(self.som_cache_size),
+            delta_encoder=(
+                DeltaEncoder(self.full_snapshot_interval) if self.delta_observations else None
+            ),
+            frame_dedup=(
+                FrameDeduplicator(self.frame_diff_threshold) if self.dedup_frames else None
+            ),
+        )
+        self._track_context(session)
+        # EVAL ONLY: save the goal into file for evaluation
+        if self.eval_mode:
+            self._set_eval_goal(session, obs)
+        self.sessions[session_id] = session
+        return session
+
+    def _track_context(self, session: '_Session') -> None:
+        """Remember what a fresh env.reset() looks like, for later in-place resets."""
+        env = session.env.unwrapped
+        session.origins = OriginTracker(env.context)
+        session.initial_chat_len = len(env.chat.messages)
+
+    def _reset_session(self, session: '_Session', action_data: dict) -> dict:
+        """Clean up a session in place and return its first observation.
+
+        Unlike env.reset(), no browser, context or task is created: pages,
+        cookies, permissions and site storage are cleared and the chat is
+        rolled back to the task's opening messages.
+        """
+        env = session.env.unwrapped
+        clear_browser_context(env, session.origins, action_data.get('start_url', 'about:blank'))
+        del env.chat.messages[session.initial_chat_len :]
+        obs = observe(env)
+
+        session.step_count += 1
+        session.eval_rewards = []
+        if session.frame_dedup is not None:
+            # the first frame after a reset is always shipped
+            session.frame_dedup.reset()
+        return self._process_obs(
+            session, obs, action_data.get('fields'), action_data.get('frame_base')
+        )
+
+    def _set_eval_goal(self, session: '_Session', obs: dict) -> None:
+        session.eval_goal = obs['goal']
+        session.goal_image_urls = []
+        if 'goal_object' in obs:
+            obs['goal_object'] = list(obs['goal_object'])
+            if len(obs['goal_object']) > 0:
+                session.eval_goal = obs['goal_object'][0]['text']
+            for message in obs['goal_object']:
+                if message['type'] == 'image_url':
+                    image_src = message['image_url']
+                    if isinstance(image_src, dict):
+                        image_src = image_src['url']
+                    session.goal_image_urls.append(image_src)
+        logger.debug(f'Browsing goal: {session.eval_goal}')
+
+    def _load_eval_task(self, session: '_Session', action_data: dict) -> dict:
+        """Switch a session to another benchmark task and reset it.
+
+        Only the task changes: the gym env, its browser and the imported
+        benchmark packages are reused, so no process or Chromium is started.
+        """
+        import gymnasium as gym
+
+        task_id = eval_env_id(action_data['task_id'])
+        register_eval_envs(task_id)
+        # building the env only resolves the task's entrypoint; reset() starts browsers
+        template = gym.make(task_id).unwrapped
+        env = session.env.unwrapped
+        env.task_entrypoint = template.task_entrypoint
+        env.task_kwargs = dict(template.task_kwargs)
+        obs, info = session.env.reset(seed=action_data.get('seed'))
+        logger.info(f'Loaded eval task {task_id}')
+
+        self._track_context(session)
+        session.step_count += 1
+        session.eval_rewards = []
+        if session.frame_dedup is not None:
+            session.frame_dedup.reset()
+        self._set_eval_goal(session, obs)
+        if session.session_id == DEFAULT_SESSION:
+            self.browsergym_eval_env = task_id
+        return self._process_obs(
+            session, obs, action_data.get('fields'), action_data.get('frame_base')
+        )
+
+    def _close_sessions(self) -> None:
+        for session in list(self.sessions.values()):
+            try:
+                session.env.close()
+            except Exception:
+                pass
+        self.sessions.clear()
+        self.shared_chromium.close()
+
+    def _run_action(self, action_data: dict) -> Any:
+        """Run a queued (state-changing) request of one session; returns the response."""
+        session_id = action_data.get('session_id', DEFAULT_SESSION)
+        action = action_data['action']
+        if action == BROWSER_OPEN_SESSION_ACTION:
+            try:
+                self._open_session(session_id)
+            except Exception as e:
+                logger.error(f'Failed to open browser session: {e}')
+                return BrowserInitException(f'Failed to open browser session: {e}')
+            return {'session_id': session_id}
+
+        session = self.sessions.get(session_id)
+        if session is None:
+            return BrowserSessionNotFoundException(f'Unknown browser session: {session_id}')
+        if action == BROWSER_CLOSE_SESSION_ACTION:
+            del self.sessions[session_id]
+            session.env.close()
+            return {'session_id': session_id}
+        if action == BROWSER_STEP_MANY_ACTION:
+            return self._step_many(session, action_data)
+        if action in (BROWSER_LOAD_EVAL_TASK_ACTION, BROWSER_RESET_ACTION):
+            what = 'reset browser session' if action == BROWSER_RESET_ACTION else 'load eval task'
+            try:
+                if action == BROWSER_RESET_ACTION:
+                    obs = self._reset_session(session, action_data)
+                else:
+                    obs = self._load_eval_task(session, action_data)
+            except Exception as e:
+                logger.error(f'Failed to {what}: {e}')
+                return BrowserInitException(f'Failed to {what}: {e}')
+            if session.delta_encoder is not None:
+                self._encode_deltas(session, obs, action_data.get('delta_bases', {}))
+            return obs
 
-    def step(self, action_str: str, timeout: float = 120) -> dict:
-        """Execute an action in the browser environment and return the observation."""
+        obs = self._env_step(session, action)
+        obs = self._process_obs(
+            session, obs, action_data.get('fields'), action_data.get('frame_base')
+        )
+        if session.delta_encoder is not None:
+            self._encode_deltas(session, obs, action_data.get('delta_bases', {}))
+        return obs
+
+    def _read_requests(self, requests: queue.Queue) -> None:
+        """Browser-process reader thread; a (None, None) item signals EOF."""
+        while True:
+            try:
+                unique_request_id, action_data = self.browser_side.recv()
+            except (EOFError, OSError):
+                requests.put((None, None))
+                return
+
+            if unique_request_id == 'SHUTDOWN':
+                requests.put((unique_request_id, action_data))
+                return
+            elif unique_request_id == 'IS_ALIVE' or not self._answer_query(unique_request_id, action_data):
+                requests.put((unique_request_id, action_data))
+
+    def _answer_query(self, unique_request_id: str, action_data: dict) -> bool:
+        """Answer a read-only query; returns False for anything else."""
+        action = action_data['action']
+        if action not in READ_ONLY_ACTIONS:
+            return False
+
+        session_id = action_data.get('session_id', DEFAULT_SESSION)
+        session = self.sessions.get(session_id)
+        if action == BROWSER_GET_CACHE_STATS_ACTION:
+            response = self._cache_stats()
+        elif action == BROWSER_GET_METRICS_ACTION:
+            response = metrics.METRICS.snapshot()
+        elif session is None:
+            response = BrowserSessionNotFoundException(f'Unknown browser session: {session_id}')
+        # EVAL ONLY: Get evaluation info
+        elif action == BROWSER_EVAL_GET_GOAL_ACTION:
+            response = {
+                'text_content': session.eval_goal,
+                'image_content': session.goal_image_urls,
+            }
+        elif action == BROWSER_EVAL_GET_REWARDS_ACTION:
+            response = {'text_content': json.dumps(list(session.eval_rewards))}
+        else:
+            response = {
+                'set_of_marks': session.som_renderer.render(
+                    self.codec, step=action_data.get('step')
+                )
+            }
+        self._send((unique_request_id, response), record=action not in CONTROL_ACTIONS)
+        return True
+
+    def _send(self, message: tuple[str, Any], record: bool = True) -> None:
+        # pickled here rather than by send() so that it can be timed
+        if record:
+            with metrics.stage('pickle'):
+                data = ForkingPickler.dumps(message)
+        else:
+            data = ForkingPickler.dumps(message)
+        with self._send_lock:
+            self.browser_side.send_bytes(data)
+
+    def _env_step(self, session: '_Session', action: str) -> dict:
+        with metrics.stage('env_step'):
+            obs, reward, terminated, truncated, info = session.env.step(action)
+        session.step_count += 1
+
+        # EVAL ONLY: Save the rewards into file for evaluation
+        if self.eval_mode:
+            session.eval_rewards.append(reward)
+        return obs
+
+    def _step_many(self, session: '_Session', action_data: dict) -> dict:
+        """Run a batch of actions back to back, stopping at the first error.
+
+        Only the steps selected by ``observe`` get their artifacts computed; the
+        last executed step always returns at least its lightweight fields (URL,
+        errors, open pages).
+        """
+        observe = BatchObserveMode(action_data['observe'])
+        fields = action_data.get('fields')
+        delta_bases = dict(action_data.get('delta_bases', {}))
+        frame_base = action_data.get('frame_base')
+        actions = action_data['actions']
+
+        observations: list[dict | None] = []
+        failed_index = None
+        for index, action in enumerate(actions):
+            obs = self._env_step(session, action)
+            failed = bool(obs.get('last_action_error'))
+            last = failed or index == len(actions) - 1
+            if (
+                observe == BatchObserveMode.EACH
+                or (observe == BatchObserveMode.LAST and last)
+                or (observe == BatchObserveMode.ON_ERROR and failed)
+            ):
+                obs = self._process_obs(session, obs, fields, frame_base)
+                frame_base = obs.get('screenshot_step', frame_base)
+            elif last:
+                obs = self._process_obs(session, obs, ())
+            else:
+                obs = None
+            if obs is not None and session.delta_encoder is not None:
+                self._encode_deltas(session, obs, delta_bases)
+            observations.append(obs)
+            if failed:
+                failed_index = index
+                break
+        return {'observations': observations, 'failed_index': failed_index}
+
+    def _process_obs(
+        self,
+        session: '_Session',
+        obs: dict,
+        fields: Iterable[str] | None,
+        frame_base: int | None = None,
+    ) -> dict:
+        """Compute the requested artifacts of a raw BrowserGym observation.
+
+        Runs in the browser process. Artifacts outside ``fields`` (None means
+        all of them) are neither computed nor sent over the pipe. The Set-of-Marks
+        overlay is only rendered when the agent side first reads it. With frame
+        deduplication, a screenshot that repeats the agent's ``frame_base`` frame
+        is replaced by a FrameRef.
+        """
+        fields = None if fields is None else set(fields)
+
+        def wanted(field: ObservationField) -> bool:
+            return fields is None or field.value in fields
+
+        want_screenshot = wanted(ObservationField.SCREENSHOT)
+        want_som = wanted(ObservationField.SOM)
+
+        # keep the latest frame around for on-demand Set-of-Marks requests
+        session.som_renderer.update(
+            obs['screenshot'], obs.get('extra_element_properties', {}), session.step_count
+        )
+
+        # add text content of the page
+        if wanted(ObservationField.TEXT):
+            from browsergym.utils.obs import flatten_dom_to_str
+
+            with metrics.stage('flatten_dom'):
+                html_str = flatten_dom_to_str(obs['dom_object'])
+            with metrics.stage('html2text'):
+                obs['text_content'] = self.page_text.get_text(html_str)
+        else:
+            obs['text_content'] = ''
+
+        # unchanged screenshots are neither encoded nor shipped
+        frame_ref = None
+        if want_screenshot and session.frame_dedup is not None:
+            frame_ref = session.frame_dedup.check(
+                obs['screenshot'], session.step_count, frame_base
+            )
+            if frame_ref is None:
+                obs['screenshot_step'] = session.step_count
+            else:
+                want_screenshot = False
+
+        # make observation serializable
+        raw_frame = None
+        if want_screenshot or want_som:
+            if self.frame_ring is not None:
+                raw_frame = self.frame_ring.write(obs['screenshot'])
+            if raw_frame is None and self.codec.is_raw:
+                raw_frame = obs['screenshot']
+        if raw_frame is not None:
+            # the agent side gets the raw frame (or its shm slot) and encodes on demand
+            obs['set_of_marks'] = raw_frame if want_som else ''
+            obs['screenshot'] = raw_frame if want_screenshot else ''
+        else:
+            obs['set_of_marks'] = SetOfMarksRef(step=session.step_count) if want_som else ''
+            obs['screenshot'] = (
+                self.codec.to_base64_url(obs['screenshot']) if want_screenshot else ''
+            )
+            if obs['screenshot']:
+                metrics.observe_bytes('screenshot', len(obs['screenshot']))
+        if frame_ref is not None:
+            obs['screenshot'] = frame_ref
+
+        if not wanted(ObservationField.DOM):
+            obs['dom_object'] = {}
+        if not wanted(ObservationField.AXTREE):
+            obs['axtree_object'] = {}
+            if not (want_som and raw_frame is not None):
+                obs['extra_element_properties'] = {}
+
+        obs['active_page_index'] = obs['active_page_index'].item()
+        obs['elapsed_time'] = obs['elapsed_time'].item()
+        return obs
+
+    def _encode_deltas(
+        self, session: '_Session', obs: dict, delta_bases: dict[str, int]
+    ) -> None:
+        """Replace tree fields by deltas; ``delta_bases`` advances to the values sent."""
+        for name in DELTA_FIELDS:
+            # fields that weren't requested stay empty and leave the chain alone
+            if obs.get(name):
+                obs[name] = session.delta_encoder.encode(name, obs[name], delta_bases.get(name))
+                delta_bases[name] = obs[name].seq
+
+    def _cache_stats(self) -> dict[str, dict[str, int]]:
+        return {
+            'text': self.page_text.stats(),
+            'set_of_marks': _sum_stats(
+                session.som_renderer.cache.stats() for session in list(self.sessions.values())
+            ),
+            'frames': _sum_stats(
+                session.frame_dedup.stats()
+                for session in list(self.sessions.values())
+                if session.frame_dedup is not None
+            ),
+        }
+
+    def step(
+        self,
+        action_str: str,
+        timeout: float = 120,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Execute an action in the browser environment and return the observation.
+
+        ``fields`` limits the optional artifacts (see ObservationField) computed
+        for this step; None computes all of them.
+        """
+        obs = self._request(
+            self._action_data(action_str, fields, session_id), timeout=timeout
+        )
+        return self._finalize_obs(obs, session_id)
+
+    def step_many(
+        self,
+        actions: Sequence[str],
+        observe: str = BatchObserveMode.LAST.value,
+        timeout: float = 600,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Execute several actions in a single round-trip to the browser process.
+
+        Execution stops at the first action that reports ``last_action_error``.
+
+        Args:
+            actions: BrowserGym action strings, run in order
+            observe: A BatchObserveMode; which steps get a full observation
+            timeout: Timeout for the whole batch, in seconds
+            fields: Observation fields to compute for observed steps
+            session_id: Session to run the actions in
+
+        Returns:
+            Dict with 'observations' (one entry per executed action, None for
+            unobserved steps; the last entry is never None) and 'failed_index'
+            (index of the failing action, or None)
+        """
+        result = self._request(
+            self._batch_data(actions, observe, fields, session_id), timeout=timeout
+        )
+        return self._finalize_batch(result, session_id)
+
+    def get_set_of_marks(
+        self, step: int | None = None, timeout: float = 60, session_id: str = DEFAULT_SESSION
+    ) -> str:
+        """Render (or fetch from cache) the Set-of-Marks image of the latest step.
+
+        Returns '' if ``step`` is given and a newer step has run since.
+        """
+        response = self._request(
+            self._query_data(BROWSER_GET_SOM_ACTION, session_id, step=step), timeout=timeout
+        )
+        return response['set_of_marks']
+
+    def reset(
+        self,
+        start_url: str = 'about:blank',
+        timeout: float = 60,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Reset the browser to a clean state and return the first observation.
+
+        Closes all pages but one, clears cookies, permissions and site storage
+        and opens ``start_url``, all inside the running browser process, which
+        is much faster than closing the env and starting a new one.
+        """
+        obs = self._request(
+            self._reset_data(start_url, fields, session_id), timeout=timeout
+        )
+        return self._finalize_obs(obs, session_id)
+
+    def load_eval_task(
+        self,
+        task_id: str,
+        seed: int | None = None,
+        timeout: float = 300,
+        fields: Iterable[str] | None = None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Switch to another benchmark task (e.g. 'webarena.310') and reset the env.
+
+        Reuses the running browser process, so a long-lived eval worker can
+        run task after task without respawning. Returns the first observation.
+        """
+        obs = self._request(
+            self._load_task_data(task_id, seed, fields, session_id), timeout=timeout
+        )
+        if session_id == DEFAULT_SESSION:
+            self.browsergym_eval_env = eval_env_id(task_id)
+        return self._finalize_obs(obs, session_id)
+
+    def open_session(self, timeout: float = 120) -> BrowserSession:
+        """Open a new isolated session (browser context) in the browser process.
+
+        The session has its own cookies, storage and pages but shares the
+        browser process and Chromium with every other session of this env.
+        """
+        session_id = uuid.uuid4().hex
+        self._request(
+            self._query_data(BROWSER_OPEN_SESSION_ACTION, session_id), timeout=timeout
+        )
+        return BrowserSession(self, session_id)
+
+    def close_session(self, session_id: str, timeout: float = 60) -> None:
+        """Close a session opened with :meth:`open_session`."""
+        if session_id == DEFAULT_SESSION:
+            raise ValueError('The default session is closed together with the env.')
+        self._request(
+            self._query_data(BROWSER_CLOSE_SESSION_ACTION, session_id), timeout=timeout
+        )
+        self.delta_decoders.pop(session_id, None)
+        self.last_frames.pop(session_id, None)
+
+    def get_cache_stats(self, timeout: float = 60) -> dict[str, dict[str, int]]:
+        """Hit/miss counters of the browser process caches, keyed by cache name."""
+        return self._request({'action': BROWSER_GET_CACHE_STATS_ACTION}, timeout=timeout)
+
+    def get_metrics(self, timeout: float = 10) -> 'metrics.Snapshot':
+        """Stage and payload histograms recorded in the browser process.
+
+        See ``qa_browser.metrics``; agent-side stages are in ``metrics.METRICS``.
+        """
+        return self._request({'action': BROWSER_GET_METRICS_ACTION}, timeout=timeout)
+
+    def _collect_metrics(self) -> 'metrics.Snapshot | None':
+        if not self.process.is_alive():
+            return None
+        return self.get_metrics(timeout=2)
+
+    def _request(self, action_data: dict, timeout: float) -> Any:
+        """Send a request and block until its response arrives.
+
+        Safe to call from several threads at once; each caller waits on its own
+        future and responses are routed by request id.
+        """
         unique_request_id = str(uuid.uuid4())
-        self.agent_side.send((unique_request_id, {'action': action_str}))
-        start_time = time.time()
+        record = action_data['action'] not in CONTROL_ACTIONS
+        start = time.perf_counter()
+        future = self._dispatcher.submit(
+            unique_request_id, (unique_request_id, action_data), record=record
+        )
+        deadline = time.monotonic() + timeout
         while True:
-            if should_exit() or time.time() - start_time > timeout:
+            remaining = deadline - time.monotonic()
+            if should_exit() or remaining <= 0:
+                # a reply that still arrives is dropped by the dispatcher
+                self._dispatcher.discard(unique_request_id)
                 raise TimeoutError('Browser environment took too long to respond.')
-            if self.agent_side.poll(timeout=0.01):
-                response_id, obs = self.agent_side.recv()
-                if response_id == unique_request_id:
-                    return dict(obs)
+            try:
+                response = future.result(timeout=min(remaining, SHUTDOWN_CHECK_INTERVAL))
+            except concurrent.futures.TimeoutError:
+                # not the builtin TimeoutError before Python 3.11
+                continue
+            if record:
+                metrics.METRICS.observe_stage('round_trip', time.perf_counter() - start)
+            if isinstance(response, BrowserError):
+                raise response
+            return response
+
+    def _query_data(self, action: str, session_id: str, **kwargs: Any) -> dict:
+        action_data: dict[str, Any] = {'action': action, **kwargs}
+        if session_id != DEFAULT_SESSION:
+            action_data['session_id'] = session_id
+        return action_data
+
+    def _action_data(
+        self,
+        action_str: str,
+        fields: Iterable[str] | None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        action_data = self._query_data(action_str, session_id)
+        if fields is not None:
+            # validates and normalizes enum members / strings alike
+            action_data['fields'] = sorted(ObservationField(f).value for f in fields)
+        delta_decoder = self._delta_decoder(session_id)
+        if delta_decoder is not None:
+            action_data['delta_bases'] = delta_decoder.bases()
+        if session_id in self.last_frames:
+            action_data['frame_base'] = self.last_frames[session_id][0]
+        return action_data
+
+    def _delta_decoder(self, session_id: str) -> DeltaDecoder | None:
+        if not self.delta_observations:
+            return None
+        return self.delta_decoders.setdefault(session_id, DeltaDecoder())
+
+    def _batch_data(
+        self,
+        actions: Sequence[str],
+        observe: str,
+        fields: Iterable[str] | None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        if not actions:
+            raise ValueError('step_many needs at least one action')
+        action_data = self._action_data(BROWSER_STEP_MANY_ACTION, fields, session_id)
+        action_data['actions'] = list(actions)
+        action_data['observe'] = BatchObserveMode(observe).value
+        return action_data
+
+    def _reset_data(
+        self, start_url: str, fields: Iterable[str] | None, session_id: str = DEFAULT_SESSION
+    ) -> dict:
+        action_data = self._action_data(BROWSER_RESET_ACTION, fields, session_id)
+        action_data['start_url'] = start_url
+        return action_data
+
+    def _load_task_data(
+        self,
+        task_id: str,
+        seed: int | None,
+        fields: Iterable[str] | None,
+        session_id: str = DEFAULT_SESSION,
+    ) -> dict:
+        if not self.eval_mode:
+            raise ValueError('load_eval_task needs an env created with browsergym_eval_env')
+        action_data = self._action_data(BROWSER_LOAD_EVAL_TASK_ACTION, fields, session_id)
+        action_data['task_id'] = task_id
+        action_data['seed'] = seed
+        return action_data
+
+    def _finalize_batch(self, result: dict, session_id: str = DEFAULT_SESSION) -> dict:
+        return {
+            'observations': [
+                None if obs is None else self._finalize_obs(obs, session_id)
+                for obs in result['observations']
+            ],
+            'failed_index': result['failed_index'],
+        }
+
+    def _finalize_obs(self, obs: dict, session_id: str = DEFAULT_SESSION) -> dict:
+        """Turn a raw step response into the observation dict handed to callers."""
+        with metrics.stage('decode_obs'):
+            obs = self._decode_obs(dict(obs), session_id)
+        if not self.dedup_frames:
+            return obs
+
+        screenshot_step = obs.pop('screenshot_step', None)
+        if isinstance(obs.get('screenshot'), FrameRef):
+            step, screenshot = self.last_frames.get(session_id, (None, ''))
+            if step != obs['screenshot'].step:
+                logger.warning('Repeated screenshot refers to a frame that is no longer held.')
+                self.last_frames.pop(session_id, None)
+                screenshot = ''
+            obs['screenshot'] = screenshot
+            obs['screenshot_unchanged'] = True
+        elif screenshot_step is not None and obs.get('screenshot'):
+            self.last_frames[session_id] = (screenshot_step, obs['screenshot'])
+        return obs
+
+    def _decode_obs(self, obs: dict, session_id: str) -> dict:
+        delta_decoder = self._delta_decoder(session_id)
+        if delta_decoder is not None:
+            for name in DELTA_FIELDS:
+                if isinstance(obs.get(name), (FullSnapshot, Delta)):
+                    obs[name] = delta_decoder.decode(name, obs[name])
+        if isinstance(obs.get('set_of_marks'), SetOfMarksRef):
+            browser = self if session_id == DEFAULT_SESSION else BrowserSession(self, session_id)
+            obs['set_of_marks'] = RemoteSetOfMarks(browser, obs['set_of_marks'].step)
+
+        raw_types = (FrameDescriptor, np.ndarray)
+        raw_frame = next(
+            (
+                obs[key]
+                for key in ('screenshot', 'set_of_marks')
+                if isinstance(obs.get(key), raw_types)
+            ),
+            None,
+        )
+        if raw_frame is None:
+            return obs
+
+        if isinstance(raw_frame, FrameDescriptor):
+            frame = self.frame_ring.read(raw_frame) if self.frame_ring else None
+        else:
+            frame = raw_frame
+        if frame is None:
+            logger.warning('Screenshot frame was overwritten before it could be read.')
+            obs['screenshot'] = ''
+            obs['set_of_marks'] = ''
+            return obs
+
+        if isinstance(obs.get('screenshot'), raw_types):
+            obs['screenshot'] = LazyImage(frame, self.codec)
+        if isinstance(obs.get('set_of_marks'), raw_types):
+            extra_element_properties = obs.get('extra_element_properties', {})
+            obs['set_of_marks'] = LazyImage(
+                lambda: _overlay_som(frame, extra_element_properties), self.codec
+            )
+        return obs
 
     def check_alive(self, timeout: float = 60) -> bool:
-        self.agent_side.send(('IS_ALIVE', None))
-        if self.agent_side.poll(timeout=timeout):
-            response_id, _ = self.agent_side.recv()
-            if response_id == 'ALIVE':
-                return True
-            logger.debug(f'Browser env is not alive. Response ID: {response_id}')
+        probe = str(uuid.uuid4())
+        try:
+            future = self._dispatcher.submit(probe, ('IS_ALIVE', probe), record=False)
+            future.result(timeout=timeout)
+            return True
+        except concurrent.futures.TimeoutError:
+            self._dispatcher.discard(probe)
+            logger.debug('Browser env did not answer the liveness probe.')
+        except BrowserUnavailableException:
+            logger.debug('Browser env is not alive.')
         return False
 
     def close(self) -> None:
+        metrics.remove_collector(self)
         if not self.process.is_alive():
+            self._dispatcher.close()
+            self.agent_side.close()
+            self.browser_side.close()
+            self._close_frame_ring()
             return
         try:
-            self.agent_side.send(('SHUTDOWN', None))
+            self._dispatcher.send(('SHUTDOWN', None))
             self.process.join(5)  # Wait for the process to terminate
             if self.process.is_alive():
                 logger.error(
@@ -243,7 +1068,15 @@ class BrowserEnv:
                 if self.process.is_alive():
                     self.process.kill()
                     self.process.join(5)  # Wait for the process to terminate
+            self._dispatcher.close()
             self.agent_side.close()
             self.browser_side.close()
         except Exception as e:
             logger.error(f'Encountered an error when closing browser env: {e}')
+        self._dispatcher.close()
+        self._close_frame_ring()
+
+    def _close_frame_ring(self) -> None:
+        if self.frame_ring is not None:
+            self.frame_ring.close()
+            self.frame_ring = None
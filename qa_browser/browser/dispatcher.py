@@ -0,0 +1,133 @@
+"""Routing of browser process responses to concurrent callers"""
+
+import logging
+import multiprocessing.connection
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.reduction import ForkingPickler
+from typing import Any, Callable
+
+from qa_browser import metrics
+from qa_browser.exceptions import BrowserUnavailableException
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseDispatcher:
+    """Multiplexes requests over the agent end of a BrowserEnv pipe.
+
+    A single reader thread owns ``connection.recv_bytes()`` and resolves the future
+    registered for each response's request id, so any number of requests can
+    be in flight at once (e.g. a Set-of-Marks fetch while a navigation runs).
+    Replies that arrive after their caller gave up are dropped.
+    """
+
+    def __init__(
+        self,
+        connection: multiprocessing.connection.Connection,
+        is_alive: Callable[[], bool],
+        check_interval: float = 1.0,
+    ):
+        self._connection = connection
+        self._is_alive = is_alive
+        self._check_interval = check_interval
+        self._pending: dict[str, Future] = {}
+        # keys whose responses are kept out of the metrics, see submit()
+        self._unrecorded: set[str] = set()
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._reader: threading.Thread | None = None
+        self._unavailable = False
+
+    def submit(self, key: str, message: tuple[str, Any], record: bool = True) -> Future:
+        """Send ``message`` and return a future for the response routed to ``key``.
+
+        With ``record=False`` the size and unpickling time of the response are
+        not recorded, e.g. for liveness probes and metrics requests.
+        """
+        future: Future = Future()
+        with self._lock:
+            if self._unavailable or self._closed.is_set():
+                raise BrowserUnavailableException()
+            self._pending[key] = future
+            if not record:
+                self._unrecorded.add(key)
+            self._ensure_reader()
+        try:
+            self.send(message)
+        except (OSError, ValueError):
+            self.discard(key)
+            raise BrowserUnavailableException() from None
+        return future
+
+    def send(self, message: tuple[str, Any]) -> None:
+        """Send a message that expects no response."""
+        with self._send_lock:
+            self._connection.send(message)
+
+    def discard(self, key: str) -> None:
+        """Stop waiting for ``key``; its reply is dropped if it still arrives."""
+        with self._lock:
+            self._pending.pop(key, None)
+            self._unrecorded.discard(key)
+
+    def close(self) -> None:
+        self._closed.set()
+        if self._reader is not None and self._reader is not threading.current_thread():
+            self._reader.join(self._check_interval * 2)
+        self._fail_pending()
+
+    def _ensure_reader(self) -> None:
+        if self._reader is None or not self._reader.is_alive():
+            self._reader = threading.Thread(
+                target=self._read_responses, name='browser-env-dispatcher', daemon=True
+            )
+            self._reader.start()
+
+    def _read_responses(self) -> None:
+        while not self._closed.is_set():
+            try:
+                if not multiprocessing.connection.wait(
+                    [self._connection], timeout=self._check_interval
+                ):
+                    if not self._is_alive():
+                        if self._pending:
+                            logger.error('Browser process died with requests in flight.')
+                        break
+                    continue
+                data = self._connection.recv_bytes()
+            except (EOFError, OSError) as e:
+                if not self._closed.is_set():
+                    logger.error(f'Browser env pipe closed: {e}')
+                break
+            start = time.perf_counter()
+            response_id, payload = ForkingPickler.loads(data)
+            unpickle_seconds = time.perf_counter() - start
+
+            # IS_ALIVE probes are answered with ('ALIVE', <probe token>)
+            key = payload if response_id == 'ALIVE' else response_id
+            with self._lock:
+                future = self._pending.pop(key, None)
+                record = key not in self._unrecorded
+                self._unrecorded.discard(key)
+            if record:
+                metrics.observe_bytes('response', len(data))
+                metrics.METRICS.observe_stage('unpickle', unpickle_seconds)
+            if future is None:
+                logger.debug(f'Dropping late browser env response: {response_id}')
+            elif not future.done():
+                future.set_result(payload)
+
+        with self._lock:
+            self._unavailable = not self._closed.is_set()
+        self._fail_pending()
+
+    def _fail_pending(self) -> None:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._unrecorded.clear()
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(BrowserUnavailableException())
@@ -0,0 +1,105 @@
+"""Detection of screenshots that repeat the previous step's"""
+
+import hashlib
+from dataclasses import dataclass
+
+import numpy as np
+
+# Side length of the grayscale thumbnail used for near-duplicate detection
+THUMBNAIL_GRID = 32
+
+
+@dataclass(frozen=True)
+class FrameRef:
+    """Sent instead of a screenshot that is unchanged since step ``step``."""
+
+    step: int
+
+
+def frame_digest(frame: np.ndarray) -> str:
+    """Exact content hash of a raw frame."""
+    frame = np.ascontiguousarray(frame)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{frame.shape}:{frame.dtype}'.encode())
+    digest.update(frame.data)
+    return digest.hexdigest()
+
+
+def frame_thumbnail(frame: np.ndarray, grid: int = THUMBNAIL_GRID) -> np.ndarray:
+    """``grid`` x ``grid`` grayscale thumbnail, values in [0, 1].
+
+    Each cell is the mean of every pixel in its block of the frame (blocks
+    differ by at most a pixel in size when the frame doesn't divide evenly),
+    so no change, however small, falls between the pixels that are read.
+    """
+    if frame.ndim == 2:
+        frame = frame[..., np.newaxis]
+    height, width, channels = frame.shape[0], frame.shape[1], min(frame.shape[2], 3)
+    rows = np.linspace(0, height, min(grid, height) + 1).astype(np.intp)
+    cols = np.linspace(0, width, min(grid, width) + 1).astype(np.intp)
+    # block sums, without a float copy of the whole frame
+    sums = np.add.reduceat(frame[..., :channels], rows[:-1], axis=0, dtype=np.uint32)
+    sums = np.add.reduceat(sums, cols[:-1], axis=1).sum(axis=2)
+    counts = np.outer(np.diff(rows), np.diff(cols)) * channels
+    return (sums / (counts * 255.0)).astype(np.float32)
+
+
+class FrameDeduplicator:
+    """Tells whether a screenshot repeats the last one shipped to the agent.
+
+    Frames are compared with an exact hash and, if ``diff_threshold`` is set,
+    by the largest difference between the cells of their block-averaged
+    thumbnails (0 to 1). A change confined to a few pixels, like a caret
+    blink or anti-aliasing noise, moves its cell by little and is ignored;
+    one that covers a good part of a cell, like a checkbox, a toast or edited
+    text, is not averaged away by the rest of the frame. Frames are always
+    compared against the last frame *shipped*, so small changes can't add up
+    to a stale screenshot.
+    """
+
+    def __init__(self, diff_threshold: float | None = None, grid: int = THUMBNAIL_GRID):
+        self.diff_threshold = diff_threshold
+        self.grid = grid
+        self.step: int | None = None
+        self._digest: str | None = None
+        self._thumbnail: np.ndarray | None = None
+        self._shape: tuple[int, ...] | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def check(self, frame: np.ndarray, step: int, base_step: int | None) -> FrameRef | None:
+        """A FrameRef if ``frame`` repeats the agent's frame ``base_step``.
+
+        Otherwise ``frame`` becomes the new base (as of ``step``) and None is
+        returned, meaning it has to be shipped.
+        """
+        digest = frame_digest(frame)
+        thumbnail = None
+        # the agent must still hold the base frame for a reference to resolve
+        if self.step is not None and base_step == self.step:
+            if digest == self._digest:
+                self.hits += 1
+                return FrameRef(self.step)
+            if self.diff_threshold is not None:
+                thumbnail = frame_thumbnail(frame, self.grid)
+                if (
+                    self._thumbnail is not None
+                    and frame.shape == self._shape
+                    and float(np.abs(thumbnail - self._thumbnail).max()) <= self.diff_threshold
+                ):
+                    self.hits += 1
+                    return FrameRef(self.step)
+
+        if self.diff_threshold is not None and thumbnail is None:
+            thumbnail = frame_thumbnail(frame, self.grid)
+        self.step, self._digest, self._thumbnail = step, digest, thumbnail
+        self._shape = frame.shape
+        self.misses += 1
+        return None
+
+    def reset(self) -> None:
+        """Forget the base frame, so the next frame is shipped whatever it shows."""
+        self.step = self._digest = self._thumbnail = self._shape = None
+
+    def stats(self) -> dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,196 @@
+"""Shared-memory frame transport and lazily encoded screenshots"""
+
+import struct
+import time
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Callable
+
+import numpy as np
+
+from qa_browser.browser.base64 import ImageCodec, bytes_to_base64_url
+
+# Each slot starts with the sequence number of the frame it holds (0 while the
+# slot is free or being written) and the time.monotonic() it was written at
+SLOT_HEADER = struct.Struct('<Qd')
+
+# Seconds after which a frame nobody read (e.g. its response was dropped)
+# gives its slot back
+DEFAULT_LEASE_TIMEOUT = 60.0
+
+# Room for a 1920x1080 RGB frame per slot
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+@dataclass(frozen=True)
+class FrameDescriptor:
+    """Small, picklable handle for a frame stored in a FrameRing slot."""
+
+    slot: int
+    seq: int
+    shape: tuple[int, ...]
+    dtype: str = '|u1'
+
+
+class FrameRing:
+    """Ring buffer of raw frames in a ``multiprocessing.shared_memory`` block.
+
+    The agent creates the ring; the browser process attaches to it by name
+    when the ring is unpickled on its side. The browser writes each frame into
+    a free slot and sends only a FrameDescriptor over the pipe. The slot stays
+    leased until the agent reads the frame, which happens when the response is
+    decoded and may be after further frames were written (a batch observing
+    each step, other sessions, other requests in flight). When every slot is
+    leased, write() returns None and the caller ships the frame inline.
+    """
+
+    def __init__(
+        self,
+        slots: int = 3,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+        name: str | None = None,
+        lease_timeout: float = DEFAULT_LEASE_TIMEOUT,
+    ):
+        self.slots = slots
+        self.max_frame_bytes = max_frame_bytes
+        self.lease_timeout = lease_timeout
+        self.slot_size = SLOT_HEADER.size + max_frame_bytes
+        self._owner = name is None
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=self._owner, size=slots * self.slot_size if self._owner else 0
+        )
+        self._next_seq = 1
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __getstate__(self) -> dict:
+        return {
+            'name': self.name,
+            'slots': self.slots,
+            'max_frame_bytes': self.max_frame_bytes,
+            'lease_timeout': self.lease_timeout,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(
+            slots=state['slots'],
+            max_frame_bytes=state['max_frame_bytes'],
+            name=state['name'],
+            lease_timeout=state.get('lease_timeout', DEFAULT_LEASE_TIMEOUT),
+        )
+
+    def _free_slot(self) -> int | None:
+        now = time.monotonic()
+        for i in range(self.slots):
+            slot = (self._next_seq + i) % self.slots
+            seq, written_at = SLOT_HEADER.unpack_from(self._shm.buf, slot * self.slot_size)
+            if seq == 0 or now - written_at > self.lease_timeout:
+                return slot
+        return None
+
+    def write(self, frame: np.ndarray) -> FrameDescriptor | None:
+        """Copy a frame into a free slot.
+
+        Returns None if it doesn't fit or all slots hold frames not read yet.
+        """
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.max_frame_bytes:
+            return None
+        slot = self._free_slot()
+        if slot is None:
+            return None
+
+        seq = self._next_seq
+        self._next_seq += 1
+        offset = slot * self.slot_size
+
+        SLOT_HEADER.pack_into(self._shm.buf, offset, 0, 0.0)
+        target = np.ndarray(
+            frame.shape, dtype=frame.dtype, buffer=self._shm.buf, offset=offset + SLOT_HEADER.size
+        )
+        target[...] = frame
+        del target
+        SLOT_HEADER.pack_into(self._shm.buf, offset, seq, time.monotonic())
+        return FrameDescriptor(slot=slot, seq=seq, shape=frame.shape, dtype=frame.dtype.str)
+
+    def read(self, descriptor: FrameDescriptor) -> np.ndarray | None:
+        """Copy a frame out of its slot and free the slot.
+
+        Returns None if the frame was overwritten, which only happens to frames
+        left unread for longer than ``lease_timeout``.
+        """
+        offset = descriptor.slot * self.slot_size
+        if SLOT_HEADER.unpack_from(self._shm.buf, offset)[0] != descriptor.seq:
+            return None
+        source = np.ndarray(
+            descriptor.shape,
+            dtype=np.dtype(descriptor.dtype),
+            buffer=self._shm.buf,
+            offset=offset + SLOT_HEADER.size,
+        )
+        frame = source.copy()
+        del source
+        # the writer may have reclaimed the slot while we were copying
+        if SLOT_HEADER.unpack_from(self._shm.buf, offset)[0] != descriptor.seq:
+            return None
+        SLOT_HEADER.pack_into(self._shm.buf, offset, 0, 0.0)
+        return frame
+
+    def close(self) -> None:
+        """Detach from the shared memory block (and remove it, on the owning side)."""
+        self._shm.close()
+        if self._owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class LazyImage:
+    """An image that is only encoded when someone asks for its bytes or base64.
+
+    ``source`` is either the raw RGB array or a callable producing it (for
+    derived images such as the Set-of-Marks overlay). Encoding uses ``codec``
+    (PNG by default) and results are cached, so repeated access costs nothing.
+    """
+
+    def __init__(
+        self,
+        source: np.ndarray | Callable[[], np.ndarray],
+        codec: ImageCodec | None = None,
+    ):
+        self._source = source
+        self._codec = codec or ImageCodec()
+        self._array: np.ndarray | None = None
+        self._bytes: bytes | None = None
+        self._base64_url: str | None = None
+
+    @property
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            self._array = self._source() if callable(self._source) else self._source
+        return self._array
+
+    @property
+    def mime_type(self) -> str:
+        return self._codec.mime_type
+
+    def to_bytes(self) -> bytes:
+        if self._bytes is None:
+            self._bytes = self._codec.encode(self.array)
+        return self._bytes
+
+    def to_base64_url(self, add_data_prefix: bool = True) -> str:
+        if not add_data_prefix:
+            return bytes_to_base64_url(self.to_bytes(), self.mime_type)
+        if self._base64_url is None:
+            self._base64_url = bytes_to_base64_url(
+                self.to_bytes(), self.mime_type, add_data_prefix=True
+            )
+        return self._base64_url
+
+    def __repr__(self) -> str:
+        shape = None if self._array is None else self._array.shape
+        return f'LazyImage(shape={shape}, encoded={self._bytes is not None})'
@@ -0,0 +1,39 @@
+"""Memoized html2text conversion of flattened page DOMs"""
+
+import hashlib
+from typing import TYPE_CHECKING
+
+from qa_browser.browser.cache import LRUCache
+
+if TYPE_CHECKING:
+    import html2text
+
+
+def text_fingerprint(html_str: str) -> str:
+    """Cheap hash of a flattened DOM string."""
+    return hashlib.blake2b(html_str.encode('utf-8', 'surrogatepass'), digest_size=16).hexdigest()
+
+
+class PageTextCache:
+    """Converts flattened DOMs to page text, reusing results for unchanged pages.
+
+    Lives in the browser process. Hovers, focus changes and failed clicks leave
+    the DOM untouched, so the previous text is returned without running
+    html2text again; the LRU of recent pages also turns back/forward
+    navigation into hits.
+    """
+
+    def __init__(self, converter: 'html2text.HTML2Text', max_entries: int = 32):
+        self.converter = converter
+        self.cache: LRUCache[str, str] = LRUCache(max_entries)
+
+    def get_text(self, html_str: str) -> str:
+        key = text_fingerprint(html_str)
+        text = self.cache.get(key)
+        if text is None:
+            text = self.converter.handle(html_str)
+            self.cache.put(key, text)
+        return text
+
+    def stats(self) -> dict[str, int]:
+        return self.cache.stats()
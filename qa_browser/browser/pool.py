@@ -0,0 +1,391 @@
+"""Pool of pre-warmed browser environments"""
+
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from qa_browser.browser.browser_env import BrowserEnv
+from qa_browser.exceptions import (
+    BrowserError,
+    BrowserTimeoutException,
+    BrowserUnavailableException,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserLease:
+    """A single lease on a pooled BrowserEnv.
+
+    Usable as a sync (``with``) or async (``async with``) context manager; the
+    browser is returned to the pool when the block exits.
+    """
+
+    def __init__(self, pool: 'BrowserPool', timeout: float | None = None):
+        self._pool = pool
+        self._timeout = timeout
+        self.browser: BrowserEnv | None = None
+
+    def __enter__(self) -> BrowserEnv:
+        self.browser = self._pool.acquire(timeout=self._timeout)
+        return self.browser
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.browser is not None:
+            self._pool.release(self.browser)
+            self.browser = None
+
+    async def __aenter__(self) -> BrowserEnv:
+        self.browser = await self._pool.acquire_async(timeout=self._timeout)
+        return self.browser
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if self.browser is None:
+            return
+        if self._pool.reset_on_release or self._pool._will_retire(self.browser):
+            # resetting is a round-trip to the browser process and retiring joins
+            # it; keep both off the loop
+            await asyncio.to_thread(self.__exit__, exc_type, exc, tb)
+        else:
+            self.__exit__(exc_type, exc, tb)
+
+
+class BrowserPool:
+    """Keeps ``size`` warm BrowserEnv processes and hands them out on demand.
+
+    Members are started in the background, idle members are health-checked
+    every ``health_check_interval`` seconds, and dead or retired members are
+    replaced automatically. With ``reset_on_release``, released members are
+    reset in place (see BrowserEnv.reset) so every lease starts from a clean
+    browser. Extra keyword arguments are passed to BrowserEnv.
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        browsergym_eval_env: str | None = None,
+        health_check_interval: float = 30.0,
+        health_check_timeout: float = 5.0,
+        max_uses: int | None = None,
+        reset_on_release: bool = False,
+        reset_timeout: float = 30.0,
+        env_factory: Callable[[], BrowserEnv] | None = None,
+        **env_kwargs: Any,
+    ):
+        if size < 1:
+            raise ValueError(f'Pool size must be at least 1, got {size}')
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.health_check_timeout = health_check_timeout
+        # Retire a member after it has been leased this many times (None = never)
+        self.max_uses = max_uses
+        self.reset_on_release = reset_on_release
+        self.reset_timeout = reset_timeout
+        self._env_factory = env_factory or (
+            lambda: BrowserEnv(browsergym_eval_env=browsergym_eval_env, **env_kwargs)
+        )
+
+        self._idle: deque[BrowserEnv] = deque()
+        self._leased: set[BrowserEnv] = set()
+        self._uses: dict[BrowserEnv, int] = {}
+        self._starting = 0
+        self._checking = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        self._maintainer = threading.Thread(
+            target=self._maintain, name='browser-pool-maintainer', daemon=True
+        )
+        self._maintainer.start()
+        atexit.register(self.close)
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    def acquire(self, timeout: float | None = None) -> BrowserEnv:
+        """Take an idle browser out of the pool, waiting up to ``timeout`` seconds."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._idle or self._closed, timeout=timeout)
+            if self._closed:
+                raise BrowserUnavailableException('Browser pool is closed')
+            if not self._idle:
+                raise BrowserTimeoutException('Timed out waiting for a pooled browser')
+            # LIFO: the most recently used member is the warmest one
+            browser = self._idle.pop()
+            self._leased.add(browser)
+            self._uses[browser] = self._uses.get(browser, 0) + 1
+            return browser
+
+    async def acquire_async(self, timeout: float | None = None) -> BrowserEnv:
+        """Async variant of :meth:`acquire`."""
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self.acquire, timeout)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # acquire() goes on in its thread; return what it gets to the pool
+            future.add_done_callback(self._return_abandoned)
+            raise
+
+    def _return_abandoned(self, future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        browser = future.result()
+        with self._cond:
+            # it was never used: no reset, and the lease doesn't count
+            self._leased.discard(browser)
+            self._uses[browser] = self._uses.get(browser, 1) - 1
+            retire = self._closed
+            if not retire:
+                self._idle.append(browser)
+            self._cond.notify_all()
+        if retire:
+            threading.Thread(target=self._close_member, args=(browser,), daemon=True).start()
+
+    def release(self, browser: BrowserEnv, discard: bool = False) -> None:
+        """Return a leased browser to the pool.
+
+        The browser is closed instead of being reused when ``discard`` is set,
+        when the pool is closed, when its process died, or when it reached
+        ``max_uses``. The pool refills itself in the background. A member that
+        fails its ``reset_on_release`` reset is replaced as well.
+        """
+        if self.reset_on_release and not discard and not self._will_retire(browser):
+            try:
+                browser.reset(timeout=self.reset_timeout)
+            except Exception as e:
+                logger.warning(f'Failed to reset pooled browser, replacing it: {e}')
+                discard = True
+
+        with self._cond:
+            self._leased.discard(browser)
+            retire = discard or self._will_retire(browser)
+            if not retire:
+                self._idle.append(browser)
+            else:
+                self._uses.pop(browser, None)
+            self._cond.notify_all()
+
+        if retire:
+            self._close_member(browser)
+
+    def _will_retire(self, browser: BrowserEnv) -> bool:
+        return (
+            self._closed
+            or not browser.process.is_alive()
+            or (self.max_uses is not None and self._uses.get(browser, 0) >= self.max_uses)
+        )
+
+    def lease(self, timeout: float | None = None) -> BrowserLease:
+        """Lease a browser for the duration of a ``with``/``async with`` block."""
+        return BrowserLease(self, timeout=timeout)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                'size': self.size,
+                'idle': len(self._idle),
+                'leased': len(self._leased),
+                'starting': self._starting,
+            }
+
+    def close(self) -> None:
+        """Close all idle members; leased members are closed when released."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for browser in idle:
+            self._close_member(browser)
+
+    # ------------------------------------------------------------------
+    # Background maintenance
+    # ------------------------------------------------------------------
+
+    def _maintain(self) -> None:
+        next_check = time.monotonic() + self.health_check_interval
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                missing = self.size - (
+                    len(self._idle) + len(self._leased) + self._starting + self._checking
+                )
+                for _ in range(max(missing, 0)):
+                    self._starting += 1
+                    threading.Thread(
+                        target=self._start_member, name='browser-pool-starter', daemon=True
+                    ).start()
+                remaining = next_check - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+            self._health_check()
+            next_check = time.monotonic() + self.health_check_interval
+
+    def _start_member(self) -> None:
+        browser = None
+        try:
+            browser = self._env_factory()
+        except Exception as e:
+            logger.error(f'Failed to start pooled browser: {e}')
+            # Back off a little so a broken environment doesn't spin the maintainer
+            time.sleep(1)
+
+        with self._cond:
+            self._starting -= 1
+            closed = self._closed
+            if browser is not None and not closed:
+                self._idle.append(browser)
+            self._cond.notify_all()
+
+        if browser is not None and closed:
+            self._close_member(browser)
+
+    def _health_check(self) -> None:
+        """Check the idle members one at a time, so the others stay available."""
+        with self._cond:
+            candidates = list(self._idle)
+
+        for browser in candidates:
+            with self._cond:
+                if self._closed:
+                    return
+                if browser not in self._idle:
+                    # leased since the sweep started
+                    continue
+                self._idle.remove(browser)
+                self._checking += 1
+
+            try:
+                alive = browser.process.is_alive() and browser.check_alive(
+                    timeout=self.health_check_timeout
+                )
+            except Exception as e:
+                logger.debug(f'Pooled browser health check failed: {e}')
+                alive = False
+
+            with self._cond:
+                self._checking -= 1
+                keep = alive and not self._closed
+                if keep:
+                    # behind the members that were in use more recently
+                    self._idle.appendleft(browser)
+                self._cond.notify_all()
+            if not keep:
+                if not alive:
+                    logger.warning('Replacing unhealthy pooled browser')
+                self._close_member(browser)
+
+    def _close_member(self, browser: BrowserEnv) -> None:
+        with self._cond:
+            self._uses.pop(browser, None)
+        try:
+            browser.close()
+        except Exception as e:
+            logger.error(f'Error closing pooled browser: {e}')
+
+
+@dataclass
+class EvalTaskResult:
+    """Outcome of one benchmark task run by an EvalTaskQueue."""
+
+    task_id: str
+    result: Any = None
+    error: str | None = None
+    attempts: int = 0
+
+
+class EvalTaskQueue:
+    """Runs benchmark tasks on long-lived eval workers from a BrowserPool.
+
+    Each worker thread leases a pooled browser, switches it to the next task
+    with ``load_eval_task`` (no new process or Chromium) and calls
+    ``run_task(browser, task_id, obs)`` with the task's first observation.
+    A task that fails to load is retried up to ``retries`` times, and a worker
+    that timed out or died while loading is discarded (the pool starts a
+    replacement). Errors raised by ``run_task`` are recorded without a retry.
+    """
+
+    def __init__(
+        self,
+        pool: BrowserPool,
+        run_task: Callable[[BrowserEnv, str, dict], Any],
+        retries: int = 1,
+        load_timeout: float = 300,
+        acquire_timeout: float | None = None,
+    ):
+        self.pool = pool
+        self.run_task = run_task
+        self.retries = retries
+        self.load_timeout = load_timeout
+        self.acquire_timeout = acquire_timeout
+
+    def run(
+        self,
+        task_ids: Iterable[str],
+        seed: int | None = None,
+        num_workers: int | None = None,
+    ) -> list[EvalTaskResult]:
+        """Run every task and return their results, in the order of ``task_ids``."""
+        results = [EvalTaskResult(task_id) for task_id in task_ids]
+        pending = deque(results)
+        lock = threading.Lock()
+
+        def next_task() -> EvalTaskResult | None:
+            with lock:
+                return pending.popleft() if pending else None
+
+        def worker() -> None:
+            task = next_task()
+            while task is not None:
+                self._run_one(task, seed)
+                task = next_task()
+
+        workers = [
+            threading.Thread(target=worker, name='eval-task-worker', daemon=True)
+            for _ in range(min(num_workers or self.pool.size, len(results)))
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        return results
+
+    def _run_one(self, task: EvalTaskResult, seed: int | None) -> None:
+        while task.attempts <= self.retries:
+            task.attempts += 1
+            try:
+                browser = self.pool.acquire(timeout=self.acquire_timeout)
+            except BrowserError as e:
+                task.error = str(e)
+                return
+
+            try:
+                obs = browser.load_eval_task(task.task_id, seed=seed, timeout=self.load_timeout)
+            except (BrowserError, TimeoutError) as e:
+                logger.warning(f'Eval worker failed to load {task.task_id}: {e}')
+                task.error = str(e)
+                # a hung or dead worker is replaced; a bad task id leaves it usable
+                stuck = isinstance(e, TimeoutError) or not browser.process.is_alive()
+                self.pool.release(browser, discard=stuck)
+                continue
+
+            try:
+                task.result = self.run_task(browser, task.task_id, obs)
+                task.error = None
+            except Exception as e:
+                logger.error(f'Eval task {task.task_id} failed: {e}')
+                task.error = str(e)
+            finally:
+                self.pool.release(browser)
+            return
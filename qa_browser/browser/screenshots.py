@@ -0,0 +1,238 @@
+"""Background, content-addressed persistence of browser screenshots"""
+
+import atexit
+import base64
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from qa_browser.browser.base64 import FILE_EXTENSIONS, data_url_mime_type
+from qa_browser.browser.cache import LRUCache
+from qa_browser.browser.frames import LazyImage
+
+logger = logging.getLogger(__name__)
+
+# Directory under a workspace that browse() saves screenshots to
+SCREENSHOTS_DIR = '.browser_screenshots'
+
+# When written files are fsynced: never, every ``fsync_batch`` files / ``fsync_interval``
+# seconds, or after every file
+FSYNC_POLICIES = ('none', 'batch', 'always')
+
+_STOP = object()
+
+
+def screenshot_digest(screenshot: str | LazyImage) -> str:
+    """Content hash of a screenshot, computed without encoding or decoding it."""
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(screenshot, LazyImage):
+        frame = np.ascontiguousarray(screenshot.array)
+        digest.update(f'{screenshot.mime_type}:{frame.shape}:{frame.dtype}'.encode())
+        digest.update(frame.data)
+    else:
+        digest.update(screenshot.encode())
+    return digest.hexdigest()
+
+
+class ScreenshotWriter:
+    """Writes screenshots to disk on worker threads.
+
+    ``submit`` hashes the screenshot and returns the path it will be written to
+    right away; encoding, decoding and file I/O happen in the background.
+    Identical frames map to the same file and are only written once. Files
+    appear atomically (written to a temporary name, then renamed), so a path
+    either doesn't exist yet or is complete; call ``flush`` to wait for them.
+
+    The queue holds at most ``max_pending`` screenshots; ``submit`` blocks when
+    it is full, so a slow disk slows the producer down instead of growing memory.
+    From async code, call it in a worker thread (browse() does).
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 64,
+        num_workers: int = 2,
+        fsync_policy: str = 'batch',
+        fsync_batch: int = 16,
+        fsync_interval: float = 1.0,
+        known_paths: int = 4096,
+    ):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f'Unsupported fsync policy: {fsync_policy}')
+        self.fsync_policy = fsync_policy
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        # recently written or queued paths; duplicates are not queued again
+        self._known: LRUCache[str, bool] = LRUCache(known_paths)
+        self._created_dirs: set[Path] = set()
+        self._unsynced: list[str] = []
+        self._last_sync = time.monotonic()
+        self._closed = False
+        self.written = 0
+        self.deduplicated = 0
+        self.errors = 0
+
+        self._workers = [
+            threading.Thread(target=self._work, name='screenshot-writer', daemon=True)
+            for _ in range(num_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, directory: str | Path, screenshot: str | LazyImage) -> str:
+        """Queue a screenshot (base64 data URL or LazyImage) and return its future path."""
+        if isinstance(screenshot, LazyImage):
+            mime_type = screenshot.mime_type
+        else:
+            mime_type = data_url_mime_type(screenshot)
+        extension = FILE_EXTENSIONS.get(mime_type, 'png')
+        path = str(Path(directory) / f'{screenshot_digest(screenshot)}.{extension}')
+
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('Screenshot writer is closed')
+            if self._known.get(path):
+                self.deduplicated += 1
+                return path
+            self._known.put(path, True)
+        self._queue.put((path, screenshot))
+        return path
+
+    def flush(self) -> None:
+        """Wait until every submitted screenshot is on disk (and synced, unless 'none')."""
+        self._queue.join()
+        if self.fsync_policy != 'none':
+            self._sync(force=True)
+
+    def close(self) -> None:
+        """Flush pending screenshots and stop the workers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self.flush()
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                'written': self.written,
+                'deduplicated': self.deduplicated,
+                'errors': self.errors,
+                'pending': self._queue.qsize(),
+            }
+
+    def _work(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                # an idle writer still honours the fsync interval
+                if self.fsync_policy == 'batch':
+                    self._sync()
+                continue
+            if item is _STOP:
+                self._queue.task_done()
+                return
+
+            path, screenshot = item
+            try:
+                self._write(path, screenshot)
+            except Exception as e:
+                logger.error(f'Failed to save screenshot {path}: {e}')
+                with self._lock:
+                    self.errors += 1
+                    self._known.put(path, False)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, path: str, screenshot: str | LazyImage) -> None:
+        directory = Path(path).parent
+        if directory not in self._created_dirs:
+            directory.mkdir(parents=True, exist_ok=True)
+            self._created_dirs.add(directory)
+        # written by an earlier run, or by a writer sharing the directory
+        if os.path.exists(path):
+            with self._lock:
+                self.deduplicated += 1
+            return
+
+        if isinstance(screenshot, LazyImage):
+            data = screenshot.to_bytes()
+        else:
+            data = base64.b64decode(screenshot.split(',', 1)[-1])
+
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            if self.fsync_policy == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self.written += 1
+            if self.fsync_policy == 'batch':
+                self._unsynced.append(path)
+        if self.fsync_policy == 'batch':
+            self._sync()
+        elif self.fsync_policy == 'always':
+            _fsync_path(str(directory))
+
+    def _sync(self, force: bool = False) -> None:
+        """fsync the files written since the last sync once a batch is due."""
+        with self._lock:
+            due = force or (
+                len(self._unsynced) >= self.fsync_batch
+                or (self._unsynced and time.monotonic() - self._last_sync >= self.fsync_interval)
+            )
+            if not due:
+                return
+            paths, self._unsynced = self._unsynced, []
+            self._last_sync = time.monotonic()
+
+        for path in paths:
+            _fsync_path(path)
+        # the renames live in the directory entries
+        for directory in {os.path.dirname(path) for path in paths}:
+            _fsync_path(directory)
+
+
+def _fsync_path(path: str) -> None:
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError as e:
+        logger.debug(f'Cannot open {path} for fsync: {e}')
+        return
+    try:
+        os.fsync(fd)
+    except OSError as e:
+        logger.debug(f'fsync failed for {path}: {e}')
+    finally:
+        os.close(fd)
+
+
+_default_writer: ScreenshotWriter | None = None
+_default_writer_lock = threading.Lock()
+
+
+def get_screenshot_writer() -> ScreenshotWriter:
+    """Process-wide writer used by browse(); flushed and closed at exit."""
+    global _default_writer
+    with _default_writer_lock:
+        if _default_writer is None:
+            _default_writer = ScreenshotWriter()
+            atexit.register(_default_writer.close)
+        return _default_writer
@@ -0,0 +1,223 @@
+"""Several isolated browser sessions inside one browser process"""
+
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import TYPE_CHECKING, Any, Iterable, Sequence
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from qa_browser.browser.browser_env import BrowserEnv
+
+logger = logging.getLogger(__name__)
+
+# Session that every BrowserEnv starts with; requests without a session id go here
+DEFAULT_SESSION = 'default'
+
+
+class BrowserSession:
+    """Handle to one session (browser context) of a BrowserEnv.
+
+    Each session has its own cookies, storage, pages and observation state,
+    but shares the browser process (and Chromium) with the other sessions of
+    the same env. It offers the same step API as BrowserEnv, so it can be
+    passed to browse() in its place.
+    """
+
+    def __init__(self, env: 'BrowserEnv', session_id: str):
+        self.env = env
+        self.session_id = session_id
+
+    def step(
+        self, action_str: str, timeout: float = 120, fields: Iterable[str] | None = None
+    ) -> dict:
+        return self.env.step(action_str, timeout=timeout, fields=fields, session_id=self.session_id)
+
+    def step_many(self, actions: Sequence[str], **kwargs: Any) -> dict:
+        return self.env.step_many(actions, session_id=self.session_id, **kwargs)
+
+    def get_set_of_marks(self, step: int | None = None, timeout: float = 60) -> str:
+        return self.env.get_set_of_marks(step=step, timeout=timeout, session_id=self.session_id)
+
+    def reset(self, **kwargs: Any) -> dict:
+        return self.env.reset(session_id=self.session_id, **kwargs)
+
+    def load_eval_task(self, task_id: str, **kwargs: Any) -> dict:
+        return self.env.load_eval_task(task_id, session_id=self.session_id, **kwargs)
+
+    async def astep(
+        self, action_str: str, timeout: float = 120, fields: Iterable[str] | None = None
+    ) -> dict:
+        return await self.env.astep(
+            action_str, timeout=timeout, fields=fields, session_id=self.session_id
+        )
+
+    async def astep_many(self, actions: Sequence[str], **kwargs: Any) -> dict:
+        return await self.env.astep_many(actions, session_id=self.session_id, **kwargs)
+
+    async def areset(self, **kwargs: Any) -> dict:
+        return await self.env.areset(session_id=self.session_id, **kwargs)
+
+    async def aget_set_of_marks(self, step: int | None = None, timeout: float = 60) -> str:
+        return await self.env.aget_set_of_marks(
+            step=step, timeout=timeout, session_id=self.session_id
+        )
+
+    def close(self) -> None:
+        self.env.close_session(self.session_id)
+
+    def __enter__(self) -> 'BrowserSession':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        return f'BrowserSession({self.session_id!r})'
+
+
+class RoundRobinScheduler:
+    """Per-session FIFO queues served in round-robin order.
+
+    Used by the browser process so one busy session cannot starve the others.
+    """
+
+    def __init__(self) -> None:
+        self._queues: OrderedDict[str, deque] = OrderedDict()
+
+    def put(self, session_id: str, item: Any) -> None:
+        self._queues.setdefault(session_id, deque()).append(item)
+
+    def pop(self) -> Any:
+        session_id, items = next(iter(self._queues.items()))
+        item = items.popleft()
+        # the session goes to the back of the line (or leaves it if drained)
+        del self._queues[session_id]
+        if items:
+            self._queues[session_id] = items
+        return item
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self._queues.values())
+
+
+class _SharedBrowser:
+    """Proxy whose close() leaves the shared browser running."""
+
+    def __init__(self, browser: Any):
+        self._browser = browser
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._browser, name)
+
+    def close(self, **kwargs: Any) -> None:
+        # contexts are closed by their owners; the browser by SharedChromium.close()
+        pass
+
+
+class SharedChromium:
+    """Makes ``chromium.launch()`` return one shared browser per launch config.
+
+    BrowserGym launches a Chromium per env (and one per chat window). Installed
+    in the browser process, this turns every session into a new context of
+    the same Chromium instead.
+    """
+
+    def __init__(self, browser_type: Any):
+        self._browser_type = browser_type
+        self._launch = browser_type.launch
+        self._browsers: dict[str, Any] = {}
+
+    @classmethod
+    def install(cls) -> 'SharedChromium':
+        from browsergym.core import _get_global_playwright
+
+        shared = cls(_get_global_playwright().chromium)
+        shared._browser_type.launch = shared.launch
+        return shared
+
+    def launch(self, **kwargs: Any) -> _SharedBrowser:
+        key = repr(sorted(kwargs.items()))
+        browser = self._browsers.get(key)
+        if browser is None or not browser.is_connected():
+            browser = self._browsers[key] = self._launch(**kwargs)
+        return _SharedBrowser(browser)
+
+    def close(self) -> None:
+        self._browser_type.launch = self._launch
+        for browser in self._browsers.values():
+            try:
+                browser.close()
+            except Exception as e:
+                logger.debug(f'Failed to close shared browser: {e}')
+        self._browsers.clear()
+
+
+class OriginTracker:
+    """Records the origins a browser context navigates to.
+
+    Playwright can clear cookies for a whole context, but site storage
+    (localStorage, IndexedDB, Cache Storage, service workers) can only be
+    cleared per origin, so the origins are collected as frames navigate.
+    """
+
+    def __init__(self, context: Any):
+        self.context = context
+        self.origins: set[str] = set()
+        for page in context.pages:
+            self._watch(page)
+        context.on('page', self._watch)
+
+    def _watch(self, page: Any) -> None:
+        page.on('framenavigated', self._record)
+
+    def _record(self, frame: Any) -> None:
+        url = urlsplit(frame.url)
+        if url.scheme in ('http', 'https'):
+            self.origins.add(f'{url.scheme}://{url.netloc}')
+
+
+def observe(env: Any) -> dict:
+    """Observation of a BrowserGym env's current page, as env.reset() returns it.
+
+    BrowserGym has no public way to observe without acting, so this calls
+    the method that reset() and step() both end with. It is part of the
+    browsergym-core version pinned in requirements.txt (tests/test_sessions.py
+    checks it when BrowserGym is installed).
+    """
+    return env._get_obs()
+
+
+def clear_browser_context(env: Any, origins: OriginTracker, start_url: str = 'about:blank') -> None:
+    """Return a BrowserGym env to a blank page in a clean context, keeping Chromium up.
+
+    Closes every page but a fresh one, clears cookies, permissions and the
+    storage of every origin visited since the last reset, and resets the
+    env's page tracking so the next observation starts from ``start_url``.
+    """
+    context = env.context
+    # sessionStorage and history live in the tabs, so they go with the old pages
+    page = context.new_page()
+    for old_page in context.pages:
+        if old_page != page:
+            old_page.close()
+
+    context.clear_cookies()
+    context.clear_permissions()
+    if origins.origins:
+        cdp = context.new_cdp_session(page)
+        try:
+            for origin in origins.origins:
+                cdp.send('Storage.clearDataForOrigin', {'origin': origin, 'storageTypes': 'all'})
+        finally:
+            cdp.detach()
+        origins.origins.clear()
+
+    if start_url != 'about:blank':
+        page.goto(start_url)
+    env.page = page
+    env.page_history = {page: None}
+    env.last_action = ''
+    env.last_action_error = ''
+    env.infeasible_message_received = False
+    env.start_time = time.time()
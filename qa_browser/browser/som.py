@@ -0,0 +1,104 @@
+"""On-demand, memoized Set-of-Marks rendering"""
+
+import hashlib
+import json
+import threading
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+
+from qa_browser import metrics
+from qa_browser.browser.base64 import ImageCodec
+from qa_browser.browser.cache import LRUCache
+
+
+@dataclass(frozen=True)
+class SetOfMarksRef:
+    """Sent over the pipe instead of a rendered Set-of-Marks image."""
+
+    step: int
+
+
+def _overlay_som(frame: np.ndarray, extra_element_properties: dict[str, Any]) -> np.ndarray:
+    from browsergym.utils.obs import overlay_som
+
+    with metrics.stage('overlay_som'):
+        return overlay_som(frame, extra_element_properties)
+
+
+def som_fingerprint(frame: np.ndarray, extra_element_properties: dict[str, Any]) -> str:
+    """Hash of everything the Set-of-Marks overlay depends on."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(frame.shape).encode())
+    digest.update(np.ascontiguousarray(frame).data)
+    digest.update(json.dumps(extra_element_properties, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+class SetOfMarksRenderer:
+    """Keeps the latest frame and renders its Set-of-Marks overlay on request.
+
+    Lives in the browser process. Rendered images are memoized in an LRU keyed
+    by the hash of screenshot and element properties (plus the codec), so an
+    unchanged page is never composited or encoded twice.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.cache: LRUCache[tuple[str, ImageCodec], str] = LRUCache(max_entries)
+        self.step = 0
+        self._frame: np.ndarray | None = None
+        self._extra_element_properties: dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def update(
+        self, frame: np.ndarray, extra_element_properties: dict[str, Any], step: int
+    ) -> None:
+        """Remember the frame of ``step``; nothing is rendered yet."""
+        with self._lock:
+            self._frame = frame
+            self._extra_element_properties = extra_element_properties
+            self.step = step
+
+    def render(self, codec: ImageCodec, step: int | None = None) -> str:
+        """Base64 overlay of the latest frame, or '' if ``step`` is no longer the latest."""
+        with self._lock:
+            if self._frame is None or (step is not None and step != self.step):
+                return ''
+            frame, extra_element_properties = self._frame, self._extra_element_properties
+
+        key = (som_fingerprint(frame, extra_element_properties), codec)
+        image = self.cache.get(key)
+        if image is None:
+            image = codec.to_base64_url(_overlay_som(frame, extra_element_properties))
+            self.cache.put(key, image)
+        return image
+
+
+class RemoteSetOfMarks:
+    """Set-of-Marks image that is fetched from the browser process on first access.
+
+    The first access is a blocking round-trip to the browser; once a newer
+    step has run there, the image resolves to ''. Copies and pickles don't
+    reference the browser: an image that was not fetched yet becomes ''.
+    """
+
+    def __init__(self, browser: Any, step: int):
+        self.browser = browser
+        self.step = step
+        self._image: str | None = None
+
+    def to_base64_url(self) -> str:
+        if self._image is None:
+            if self.browser is None:
+                self._image = ''
+            else:
+                self._image = self.browser.get_set_of_marks(step=self.step)
+                self.browser = None
+        return self._image
+
+    def __getstate__(self) -> dict:
+        return {'browser': None, 'step': self.step, '_image': self._image or ''}
+
+    def __repr__(self) -> str:
+        return f'RemoteSetOfMarks(step={self.step}, fetched={self._image is not None})'
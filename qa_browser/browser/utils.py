@@ -1,23 +1,29 @@
-import base64
-import datetime
+import asyncio
 import os
 from pathlib import Path
-from typing import Any
-
-from browsergym.utils.obs import flatten_axtree_to_str
-from PIL import Image
+from typing import Any, Callable, TypeVar
 
+from qa_browser import metrics
 from qa_browser.exceptions import BrowserUnavailableException
 from qa_browser.events import (
     ActionType,
+    BrowseBatchAction,
     BrowseInteractiveAction,
     BrowseURLAction,
     BrowserOutputObservation,
+    ObservationField,
 )
-from qa_browser.browser.base64 import png_base64_url_to_image
+from qa_browser.browser.async_browser_env import AsyncBrowserEnv
+from qa_browser.browser.axtree import AXTREE_CHAR_BUDGET, serialize_axtree
 from qa_browser.browser.browser_env import BrowserEnv
-import asyncio
-from typing import Callable, TypeVar, Any
+from qa_browser.browser.pool import BrowserPool
+from qa_browser.browser.screenshots import (
+    SCREENSHOTS_DIR,
+    ScreenshotWriter,
+    get_screenshot_writer,
+)
+from qa_browser.browser.sessions import BrowserSession
+from qa_browser.browser.som import RemoteSetOfMarks
 
 T = TypeVar('T')
 
@@ -33,6 +39,8 @@ def get_axtree_str(
     extra_element_properties: dict[str, Any],
     filter_visible_only: bool = False,
 ) -> str:
+    from browsergym.utils.obs import flatten_axtree_to_str
+
     cur_axtree_txt = flatten_axtree_to_str(
         axtree_object,
         extra_properties=extra_element_properties,
@@ -43,9 +51,18 @@ def get_axtree_str(
     return str(cur_axtree_txt)
 
 
-def get_agent_obs_text(obs: BrowserOutputObservation) -> str:
-    """Get a concise text that will be shown to the agent."""
-    if obs.trigger_by_action == ActionType.BROWSE_INTERACTIVE.value:
+def get_agent_obs_text(
+    obs: BrowserOutputObservation, max_axtree_chars: int | None = AXTREE_CHAR_BUDGET
+) -> str:
+    """Get a concise text that will be shown to the agent.
+
+    The accessibility tree is cut off after ``max_axtree_chars`` characters
+    (None for no limit); visible and clickable elements are listed first then.
+    """
+    if obs.trigger_by_action in (
+        ActionType.BROWSE_INTERACTIVE.value,
+        ActionType.BROWSE_BATCH.value,
+    ):
         text = f'[Current URL: {obs.url}]\n'
         text += f'[Focused element bid: {obs.focused_element_bid}]\n'
 
@@ -56,9 +73,13 @@ def get_agent_obs_text(obs: BrowserOutputObservation) -> str:
         text += '\n'
 
         if obs.error:
+            if obs.failed_action_index is not None:
+                failed_action = f'action #{obs.failed_action_index} of the batch'
+            else:
+                failed_action = 'the last action'
             text += (
                 '================ BEGIN error message ===============\n'
-                'The following error occurred when executing the last action:\n'
+                f'The following error occurred when executing {failed_action}:\n'
                 f'{obs.last_browser_action_error}\n'
                 '================ END error message ===============\n'
             )
@@ -67,12 +88,18 @@ def get_agent_obs_text(obs: BrowserOutputObservation) -> str:
         try:
             # We do not filter visible only here because we want to show the full content
             # of the web page to the agent for simplicity.
-            # FIXME: handle the case when the web page is too large
-            cur_axtree_txt = get_axtree_str(
+            chunk = serialize_axtree(
                 obs.axtree_object,
                 obs.extra_element_properties,
                 filter_visible_only=obs.filter_visible_only,
+                max_chars=max_axtree_chars,
             )
+            cur_axtree_txt = chunk.text
+            if chunk.truncated:
+                cur_axtree_txt += (
+                    f'\n[Accessibility tree truncated after {chunk.num_nodes} elements; '
+                    'visible and clickable elements are listed first.]'
+                )
             if not obs.filter_visible_only:
                 text += (
                     f'Accessibility tree of the COMPLETE webpage:\nNote: [bid] is the unique alpha-numeric identifier at the beginning of lines for each element in the AXTree. Always use bid to refer to elements in your actions.\n'
@@ -109,14 +136,62 @@ def get_agent_obs_text(obs: BrowserOutputObservation) -> str:
         raise ValueError(f'Invalid trigger_by_action: {obs.trigger_by_action}')
 
 
+def get_observation_fields(
+    action: BrowseURLAction | BrowseInteractiveAction | BrowseBatchAction,
+) -> set[str]:
+    """Observation fields to request from the browser for ``action``.
+
+    Defaults to everything browse() puts into the observation except the
+    Set-of-Marks overlay, which callers have to ask for. The field that
+    get_agent_obs_text() renders (page text for BrowseURLAction, the
+    accessibility tree for interactive and batch actions) is always included.
+    """
+    if action.observation_fields is None:
+        # the raw DOM snapshot never makes it into the observation, and the
+        # Set-of-Marks overlay is opt-in whatever the screenshot transport
+        fields = {
+            f.value
+            for f in ObservationField
+            if f not in (ObservationField.DOM, ObservationField.SOM)
+        }
+    else:
+        fields = {ObservationField(f).value for f in action.observation_fields}
+    if isinstance(action, BrowseURLAction):
+        fields.add(ObservationField.TEXT.value)
+    else:
+        fields.add(ObservationField.AXTREE.value)
+    return fields
+
+
 async def browse(
-    action: BrowseURLAction | BrowseInteractiveAction,
-    browser: BrowserEnv | None,
+    action: BrowseURLAction | BrowseInteractiveAction | BrowseBatchAction,
+    browser: BrowserEnv | BrowserSession | BrowserPool | None,
     workspace_dir: str | None = None,
+    screenshot_writer: ScreenshotWriter | None = None,
 ) -> BrowserOutputObservation:
     if browser is None:
         raise BrowserUnavailableException()
 
+    if isinstance(browser, BrowserPool):
+        # lease a warm browser from the pool for the duration of this action
+        async with browser.lease() as pooled_browser:
+            return await browse(
+                action,
+                pooled_browser,
+                workspace_dir=workspace_dir,
+                screenshot_writer=screenshot_writer,
+            )
+
+    with metrics.stage('browse'):
+        return await _browse(action, browser, workspace_dir, screenshot_writer)
+
+
+async def _browse(
+    action: BrowseURLAction | BrowseInteractiveAction | BrowseBatchAction,
+    browser: BrowserEnv | BrowserSession,
+    workspace_dir: str | None,
+    screenshot_writer: ScreenshotWriter | None,
+) -> BrowserOutputObservation:
     if isinstance(action, BrowseURLAction):
         # legacy BrowseURLAction
         asked_url = action.url
@@ -128,87 +203,70 @@ async def browse(
         # new BrowseInteractiveAction, supports full featured BrowserGym actions
         # action in BrowserGym: see https://github.com/ServiceNow/BrowserGym/blob/main/core/src/browsergym/core/action/functions.py
         action_str = action.browser_actions
+    elif isinstance(action, BrowseBatchAction):
+        # several BrowserGym actions in one round-trip, see BrowserEnv.step_many
+        action_str = None
     else:
         raise ValueError(f'Invalid action type: {action.action}')
 
     try:
         # obs provided by BrowserGym: see https://github.com/ServiceNow/BrowserGym/blob/main/core/src/browsergym/core/env.py#L396
-        obs = await call_sync_from_async(browser.step, action_str)
-
-        # Save screenshot if workspace_dir is provided
+        fields = get_observation_fields(action)
+        failed_index = None
+        earlier_obs: list[dict] = []
+        if isinstance(action, BrowseBatchAction):
+            if isinstance(browser, AsyncBrowserEnv):
+                result = await browser.astep_many(
+                    action.browser_actions, observe=action.observe, fields=fields
+                )
+            else:
+                result = await call_sync_from_async(
+                    browser.step_many,
+                    action.browser_actions,
+                    observe=action.observe,
+                    fields=fields,
+                )
+            *earlier_obs, obs = [o for o in result['observations'] if o is not None]
+            failed_index = result['failed_index']
+        elif isinstance(browser, AsyncBrowserEnv):
+            obs = await browser.astep(action_str, fields=fields)
+        else:
+            obs = await call_sync_from_async(browser.step, action_str, fields=fields)
+
+        # Set-of-Marks is only part of the observation when the action asked
+        # for it. Rendered in the browser process on first access, it is
+        # fetched now: the observation must not keep the browser around (a
+        # pooled browser is re-leased and reset afterwards)
+        set_of_marks = obs.get('set_of_marks')
+        if ObservationField.SOM.value not in fields:
+            obs['set_of_marks'] = ''
+        elif isinstance(set_of_marks, RemoteSetOfMarks):
+            if isinstance(browser, AsyncBrowserEnv):
+                obs['set_of_marks'] = await browser.aget_set_of_marks(step=set_of_marks.step)
+            else:
+                obs['set_of_marks'] = await call_sync_from_async(set_of_marks.to_base64_url)
+        for earlier in earlier_obs:
+            if ObservationField.SOM.value not in fields or isinstance(
+                earlier.get('set_of_marks'), RemoteSetOfMarks
+            ):
+                # only the last step's overlay can still be fetched
+                earlier['set_of_marks'] = ''
+
+        # Save screenshot if workspace_dir is provided; the file is written in the
+        # background and named by content hash, so the path is known right away.
+        # submit() hashes the frame and blocks while the writer's queue is full,
+        # so it runs off the event loop
         screenshot_path = None
         if workspace_dir is not None and obs.get('screenshot'):
-            # Create screenshots directory if it doesn't exist
-            screenshots_dir = Path(workspace_dir) / '.browser_screenshots'
-            screenshots_dir.mkdir(exist_ok=True)
-
-            # Generate a filename based on timestamp
-            timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-            screenshot_filename = f'screenshot_{timestamp}.png'
-            screenshot_path = str(screenshots_dir / screenshot_filename)
-
-            # Direct image saving from base64 data without using PIL's Image.open
-            # This approach bypasses potential encoding issues that might occur when
-            # converting between different image representations, ensuring the raw PNG
-            # data from the browser is saved directly to disk.
-
-            # Extract the base64 data
-            base64_data = obs.get('screenshot', '')
-            if ',' in base64_data:
-                base64_data = base64_data.split(',')[1]
-
-            try:
-                # Decode base64 directly to binary
-                image_data = base64.b64decode(base64_data)
-
-                # Write binary data directly to file
-                with open(screenshot_path, 'wb') as f:
-                    f.write(image_data)
-
-                # Verify the image was saved correctly by opening it
-                # This is just a verification step and can be removed in production
-                Image.open(screenshot_path).verify()
-            except Exception:
-                # If direct saving fails, fall back to the original method
-                image = png_base64_url_to_image(obs.get('screenshot'))
-                image.save(screenshot_path, format='PNG', optimize=True)
-
-        # Create the observation with all data
-        observation = BrowserOutputObservation(
-            content=obs['text_content'],  # text content of the page
-            url=obs.get('url', ''),  # URL of the page
-            screenshot=obs.get('screenshot', None),  # base64-encoded screenshot, png
-            screenshot_path=screenshot_path,  # path to saved screenshot file
-            set_of_marks=obs.get(
-                'set_of_marks', None
-            ),  # base64-encoded Set-of-Marks annotated screenshot, png,
-            goal_image_urls=obs.get('image_content', []),
-            open_pages_urls=obs.get('open_pages_urls', []),  # list of open pages
-            active_page_index=obs.get(
-                'active_page_index', -1
-            ),  # index of the active page
-            axtree_object=obs.get('axtree_object', {}),  # accessibility tree object
-            extra_element_properties=obs.get('extra_element_properties', {}),
-            focused_element_bid=obs.get(
-                'focused_element_bid', None
-            ),  # focused element bid
-            last_browser_action=obs.get(
-                'last_action', ''
-            ),  # last browser env action performed
-            last_browser_action_error=obs.get('last_action_error', ''),
-            error=True if obs.get('last_action_error', '') else False,  # error flag
-            trigger_by_action=action.action,
-        )
-
-        # Process the content first using the axtree_object
-        observation.content = get_agent_obs_text(observation)
-
-        # If return_axtree is False, remove the axtree_object to save space
-        if not action.return_axtree:
-            observation.dom_object = {}
-            observation.axtree_object = {}
-            observation.extra_element_properties = {}
+            writer = screenshot_writer or get_screenshot_writer()
+            screenshot_path = await asyncio.to_thread(
+                writer.submit, Path(workspace_dir) / SCREENSHOTS_DIR, obs['screenshot']
+            )
 
+        observation = _build_observation(action, obs, screenshot_path, failed_index)
+        observation.batch_observations = [
+            _build_observation(action, earlier) for earlier in earlier_obs
+        ]
         return observation
     except Exception as e:
         error_message = str(e)
@@ -233,3 +291,52 @@ async def browse(
             pass
 
         return observation
+
+
+def _build_observation(
+    action: BrowseURLAction | BrowseInteractiveAction | BrowseBatchAction,
+    obs: dict,
+    screenshot_path: str | None = None,
+    failed_action_index: int | None = None,
+) -> BrowserOutputObservation:
+    """Turn a BrowserEnv step result into the observation returned by browse()."""
+    # Create the observation with all data
+    observation = BrowserOutputObservation(
+        content=obs.get('text_content', ''),  # text content of the page
+        url=obs.get('url', ''),  # URL of the page
+        screenshot=obs.get('screenshot', None),  # base64-encoded screenshot, png
+        screenshot_path=screenshot_path,  # path to saved screenshot file
+        screenshot_unchanged=obs.get('screenshot_unchanged', False),
+        set_of_marks=obs.get(
+            'set_of_marks', None
+        ),  # base64-encoded Set-of-Marks annotated screenshot, png,
+        goal_image_urls=obs.get('image_content', []),
+        open_pages_urls=obs.get('open_pages_urls', []),  # list of open pages
+        active_page_index=obs.get(
+            'active_page_index', -1
+        ),  # index of the active page
+        axtree_object=obs.get('axtree_object', {}),  # accessibility tree object
+        extra_element_properties=obs.get('extra_element_properties', {}),
+        focused_element_bid=obs.get(
+            'focused_element_bid', None
+        ),  # focused element bid
+        last_browser_action=obs.get(
+            'last_action', ''
+        ),  # last browser env action performed
+        last_browser_action_error=obs.get('last_action_error', ''),
+        error=True if obs.get('last_action_error', '') else False,  # error flag
+        trigger_by_action=action.action,
+        failed_action_index=failed_action_index,
+    )
+
+    # Process the content first using the axtree_object
+    with metrics.stage('agent_obs_text'):
+        observation.content = get_agent_obs_text(observation)
+
+    # If return_axtree is False, remove the axtree_object to save space
+    if not action.return_axtree:
+        observation.dom_object = {}
+        observation.axtree_object = {}
+        observation.extra_element_properties = {}
+
+    return observation
@@ -14,6 +14,7 @@ class ActionType(str, Enum):
     """Types of actions that can be performed"""
     BROWSE = 'browse'
     BROWSE_INTERACTIVE = 'browse_interactive'
+    BROWSE_BATCH = 'browse_batch'
 
 
 class ObservationType(str, Enum):
@@ -22,6 +23,22 @@ class ObservationType(str, Enum):
     BROWSE_INTERACTIVE = 'browse_interactive'
 
 
+class BatchObserveMode(str, Enum):
+    """Which steps of a batch of browser actions produce an observation"""
+    LAST = 'last'  # only the last executed action
+    EACH = 'each'  # every executed action
+    ON_ERROR = 'on_error'  # only the action that failed, if any
+
+
+class ObservationField(str, Enum):
+    """Optional artifacts a browser step can compute and return"""
+    TEXT = 'text'  # html2text page content
+    AXTREE = 'axtree'  # accessibility tree and extra element properties
+    DOM = 'dom'  # raw DOM snapshot
+    SCREENSHOT = 'screenshot'
+    SOM = 'som'  # Set-of-Marks annotated screenshot
+
+
 class EventSource(str, Enum):
     """Source of an event"""
     AGENT = 'agent'
@@ -95,6 +112,9 @@ class BrowseURLAction(Action):
     runnable: ClassVar[bool] = True
     security_risk: ActionSecurityRisk = ActionSecurityRisk.UNKNOWN
     return_axtree: bool = False
+    # ObservationField values to compute for this step; None means all of them
+    # except the Set-of-Marks image, which is only computed when listed
+    observation_fields: set[str] | None = None
 
     @property
     def message(self) -> str:
@@ -118,6 +138,9 @@ class BrowseInteractiveAction(Action):
     runnable: ClassVar[bool] = True
     security_risk: ActionSecurityRisk = ActionSecurityRisk.UNKNOWN
     return_axtree: bool = False
+    # ObservationField values to compute for this step; None means all of them
+    # except the Set-of-Marks image, which is only computed when listed
+    observation_fields: set[str] | None = None
 
     @property
     def message(self) -> str:
@@ -131,18 +154,78 @@ class BrowseInteractiveAction(Action):
         return ret
 
 
+@dataclass
+class BrowseBatchAction(Action):
+    """Several BrowserGym actions executed back to back in one round-trip
+
+    Execution stops at the first action that reports an error.
+    """
+    browser_actions: list[str] = field(default_factory=list)
+    thought: str = ''
+    observe: str = BatchObserveMode.LAST.value
+    action: str = ActionType.BROWSE_BATCH.value
+    runnable: ClassVar[bool] = True
+    security_risk: ActionSecurityRisk = ActionSecurityRisk.UNKNOWN
+    return_axtree: bool = False
+    # ObservationField values to compute for observed steps; None means all of them
+    # except the Set-of-Marks image, which is only computed when listed
+    observation_fields: set[str] | None = None
+
+    @property
+    def message(self) -> str:
+        actions = '\n'.join(self.browser_actions)
+        return f'Running {len(self.browser_actions)} browser actions:\n```\n{actions}\n```'
+
+    def __str__(self) -> str:
+        ret = '**BrowseBatchAction**\n'
+        if self.thought:
+            ret += f'THOUGHT: {self.thought}\n'
+        ret += f'OBSERVE: {self.observe}\n'
+        ret += 'BROWSER_ACTIONS:\n' + '\n'.join(self.browser_actions)
+        return ret
+
+
 # ============================================
 # Browser Observations
 # ============================================
 
+class LazyImageField:
+    """Dataclass field descriptor for base64 images that may be encoded lazily.
+
+    Values exposing ``to_base64_url()`` (e.g. ``qa_browser.browser.frames.LazyImage``)
+    are stored as-is and only encoded the first time the attribute is read.
+    """
+
+    def __init__(self, default: str = ''):
+        self._default = default
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self._attr = f'_{name}'
+
+    def __get__(self, obj: Any, objtype: type | None = None) -> Any:
+        if obj is None:
+            return self
+        value = obj.__dict__.get(self._attr, self._default)
+        if value is not None and not isinstance(value, str):
+            value = value.to_base64_url()
+            obj.__dict__[self._attr] = value
+        return value
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        # the dataclass __init__ passes the descriptor itself as the default
+        obj.__dict__[self._attr] = self._default if value is self else value
+
+
 @dataclass
 class BrowserOutputObservation(Observation):
     """Observation from browser output"""
     url: str = ''
     trigger_by_action: str = ''
-    screenshot: str = field(repr=False, default='')
+    screenshot: str = field(repr=False, default=LazyImageField())
     screenshot_path: str | None = None
-    set_of_marks: str = field(default='', repr=False)
+    # the screenshot repeats the previous step's (BrowserEnv(dedup_frames=True))
+    screenshot_unchanged: bool = False
+    set_of_marks: str = field(default=LazyImageField(), repr=False)
     error: bool = False
     observation: str = ObservationType.BROWSE.value
     goal_image_urls: list[str] = field(default_factory=list)
@@ -155,6 +238,12 @@ class BrowserOutputObservation(Observation):
     last_browser_action_error: str = ''
     focused_element_bid: str = ''
     filter_visible_only: bool = False
+    # BrowseBatchAction only: index of the action that failed, if any
+    failed_action_index: int | None = None
+    # BrowseBatchAction only: observations of the earlier observed actions
+    batch_observations: list['BrowserOutputObservation'] = field(
+        default_factory=list, repr=False
+    )
 
     @property
     def message(self) -> str:
@@ -181,6 +270,7 @@ class BrowserOutputObservation(Observation):
 __all__ = [
     'ActionType',
     'ObservationType',
+    'ObservationField',
     'EventSource',
     'ActionSecurityRisk',
     'Event',
@@ -188,6 +278,8 @@ __all__ = [
     'Observation',
     'BrowseURLAction',
     'BrowseInteractiveAction',
+    'BrowseBatchAction',
+    'BatchObserveMode',
     'BrowserOutputObservation',
 ]
 
@@ -22,3 +22,17 @@ class BrowserTimeoutException(BrowserError):
     def __init__(self, message: str = 'Browser operation timed out') -> None:
         super().__init__(message)
 
+
+class BrowserSessionNotFoundException(BrowserError):
+    """Raised when a request addresses a browser session that does not exist."""
+    def __init__(self, message: str = 'Browser session not found') -> None:
+        super().__init__(message)
+
+
+class BrowserObservationOutOfSyncException(BrowserError):
+    """Raised when a delta-encoded observation can't be rebuilt on the agent side.
+
+    The next step carries full snapshots again.
+    """
+    def __init__(self, message: str = 'Browser observation delta is out of sequence') -> None:
+        super().__init__(message)
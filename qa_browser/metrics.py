@@ -0,0 +1,304 @@
+"""Per-stage latency and payload size histograms
+
+Stages of a step are timed where they run: the browser process (env.step,
+DOM flattening, html2text, Set-of-Marks, image encoding, pickling), the agent
+side of BrowserEnv (round trip, unpickling, decoding) and browse() (building
+the observation text). Each process records into its own METRICS registry;
+``collect()`` merges this process's registry with those of the browser
+processes of all live BrowserEnvs.
+
+Recording is a perf_counter() pair, a bisect and a locked increment, cheap
+enough to leave on. Set QA_BROWSER_METRICS=0 to turn it off.
+
+    from qa_browser import metrics
+
+    with metrics.stage('my_stage'):
+        ...
+    metrics.summarize(metrics.collect())  # {'stages': {'env_step': {'p50': ...}}}
+"""
+
+import bisect
+import os
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+# Bucket upper bounds, in seconds and bytes
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+SIZE_BUCKETS = tuple(256 * 4**i for i in range(11))  # 256 B to 256 MiB
+
+# Metric families: name -> (label name, buckets, help text)
+FAMILIES = {
+    'stage_seconds': ('stage', LATENCY_BUCKETS, 'Time spent in each stage of a browser step'),
+    'payload_bytes': ('payload', SIZE_BUCKETS, 'Size of the payloads produced by a browser step'),
+}
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass
+class HistogramSnapshot:
+    """Point-in-time copy of a histogram; picklable and mergeable."""
+
+    bounds: tuple[float, ...]
+    # one count per bound plus the overflow bucket
+    counts: list[int]
+    total: float
+    count: int
+
+    def merge(self, other: 'HistogramSnapshot') -> 'HistogramSnapshot':
+        if self.bounds != other.bounds:
+            raise ValueError('Cannot merge histograms with different buckets')
+        return HistogramSnapshot(
+            self.bounds,
+            [a + b for a, b in zip(self.counts, other.counts)],
+            self.total + other.total,
+            self.count + other.count,
+        )
+
+    def quantile(self, q: float) -> float:
+        """Estimate of the ``q`` quantile, interpolated within its bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.bounds):
+                    # overflow bucket: the best we know is its lower bound
+                    return self.bounds[-1]
+                lower = self.bounds[index - 1] if index else 0.0
+                return lower + (self.bounds[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.bounds[-1]
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram."""
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)
+        self._total = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._total += value
+            self._count += 1
+
+    def snapshot(self) -> HistogramSnapshot:
+        with self._lock:
+            return HistogramSnapshot(self.bounds, list(self._counts), self._total, self._count)
+
+
+# family -> label value -> histogram
+Snapshot = dict[str, dict[str, HistogramSnapshot]]
+
+
+class _StageTimer:
+    __slots__ = ('_histogram', '_start')
+
+    def __init__(self, histogram: Histogram):
+        self._histogram = histogram
+
+    def __enter__(self) -> '_StageTimer':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._histogram.observe(time.perf_counter() - self._start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """The histograms of one process."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: dict[str, dict[str, Histogram]] = {family: {} for family in FAMILIES}
+        self._lock = threading.Lock()
+
+    def _histogram(self, family: str, label: str) -> Histogram:
+        histogram = self._histograms[family].get(label)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms[family].setdefault(
+                    label, Histogram(FAMILIES[family][1])
+                )
+        return histogram
+
+    def stage(self, name: str) -> _StageTimer | _NullTimer:
+        """Context manager timing one run of stage ``name``."""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self._histogram('stage_seconds', name))
+
+    def observe_stage(self, name: str, seconds: float) -> None:
+        if self.enabled:
+            self._histogram('stage_seconds', name).observe(seconds)
+
+    def observe_bytes(self, payload: str, size: int) -> None:
+        if self.enabled:
+            self._histogram('payload_bytes', payload).observe(size)
+
+    def snapshot(self) -> Snapshot:
+        return {
+            family: {label: histogram.snapshot() for label, histogram in list(histograms.items())}
+            for family, histograms in self._histograms.items()
+        }
+
+
+def _enabled_by_env() -> bool:
+    return os.environ.get('QA_BROWSER_METRICS', '1').lower() not in ('0', 'false', 'no', 'off')
+
+
+# The registry of this process
+METRICS = MetricsRegistry(enabled=_enabled_by_env())
+
+# Extra snapshot sources, e.g. the browser processes of live BrowserEnvs
+_collectors: dict[int, Callable[[], Snapshot | None]] = {}
+_collectors_lock = threading.Lock()
+
+
+def stage(name: str) -> _StageTimer | _NullTimer:
+    """Time a stage in this process's registry."""
+    return METRICS.stage(name)
+
+
+def observe_bytes(payload: str, size: int) -> None:
+    """Record a payload size in this process's registry."""
+    METRICS.observe_bytes(payload, size)
+
+
+def add_collector(owner: object, method: Callable[[], Snapshot | None]) -> None:
+    """Include ``method()``'s snapshot in collect() for as long as ``owner`` lives.
+
+    ``method`` must be a bound method of ``owner``; it is held weakly.
+    """
+    key = id(owner)
+    ref = weakref.WeakMethod(method)
+
+    def collect() -> Snapshot | None:
+        bound = ref()
+        return None if bound is None else bound()
+
+    with _collectors_lock:
+        _collectors[key] = collect
+    weakref.finalize(owner, remove_collector, key)
+
+
+def remove_collector(owner: object | int) -> None:
+    key = owner if isinstance(owner, int) else id(owner)
+    with _collectors_lock:
+        _collectors.pop(key, None)
+
+
+def merge(snapshots: Iterable[Snapshot]) -> Snapshot:
+    merged: Snapshot = {family: {} for family in FAMILIES}
+    for snapshot in snapshots:
+        for family, histograms in snapshot.items():
+            target = merged.setdefault(family, {})
+            for label, histogram in histograms.items():
+                target[label] = (
+                    target[label].merge(histogram) if label in target else histogram
+                )
+    return merged
+
+
+def collect() -> Snapshot:
+    """Snapshot of this process merged with those of all collectors.
+
+    Collectors that fail (e.g. a browser process that is shutting down) are
+    skipped.
+    """
+    with _collectors_lock:
+        collectors = list(_collectors.values())
+    snapshots = [METRICS.snapshot()]
+    for collector in collectors:
+        try:
+            snapshot = collector()
+        except Exception:
+            continue
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return merge(snapshots)
+
+
+def summarize(snapshot: Snapshot) -> dict[str, dict[str, dict[str, float]]]:
+    """Count, sum and p50/p95/p99 of every histogram, e.g. for logging."""
+    names = {'stage_seconds': 'stages', 'payload_bytes': 'payloads'}
+    return {
+        names.get(family, family): {
+            label: {
+                'count': histogram.count,
+                'sum': histogram.total,
+                **{f'p{round(q * 100)}': histogram.quantile(q) for q in QUANTILES},
+            }
+            for label, histogram in sorted(histograms.items())
+        }
+        for family, histograms in snapshot.items()
+    }
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus(snapshot: Snapshot, prefix: str = 'qa_browser') -> str:
+    """Prometheus text exposition of a snapshot."""
+    lines = []
+    for family, histograms in snapshot.items():
+        label_name, _, help_text = FAMILIES[family]
+        name = f'{prefix}_{family}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for label, histogram in sorted(histograms.items()):
+            label_value = label.replace('\\', '\\\\').replace('"', '\\"')
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{{label_name}="{label_value}",le="{_format_value(bound)}"}} '
+                    f'{cumulative}'
+                )
+            lines.append(f'{name}_bucket{{{label_name}="{label_value}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{label_name}="{label_value}"}} {histogram.total}')
+            lines.append(f'{name}_count{{{label_name}="{label_value}"}} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+
+__all__ = [
+    'Histogram',
+    'HistogramSnapshot',
+    'METRICS',
+    'MetricsRegistry',
+    'add_collector',
+    'collect',
+    'merge',
+    'observe_bytes',
+    'remove_collector',
+    'render_prometheus',
+    'Snapshot',
+    'stage',
+    'summarize',
+]
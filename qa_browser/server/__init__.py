@@ -1,23 +1,101 @@
 """QA Browser Server - WebSocket server for real-time browser updates"""
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from typing import Dict, Set
-import json
+from fastapi.responses import PlainTextResponse
+from typing import TYPE_CHECKING, Callable, Dict
+from contextlib import asynccontextmanager
+import hashlib
 import asyncio
+import json
+import time
 from datetime import datetime
 import logging
 
+from qa_browser import metrics
+from qa_browser.server.broker import Broker, InMemoryBroker, UnixSocketBroker
+from qa_browser.server.client import ClientConnection, OverflowPolicy
+from qa_browser.server.replay import FINISHED_STATUSES, EventHistory
+from qa_browser.server.protocol import (
+    WireProtocol,
+    encode_binary,
+    encode_text,
+    negotiate,
+)
+
+if TYPE_CHECKING:
+    from qa_browser.server.tiles import TileStreamer
+
 logger = logging.getLogger(__name__)
 
 
 class QABrowserServer:
-    """Real-time WebSocket server for QA browser events"""
+    """Real-time WebSocket server for QA browser events
+
+    Clients pick a wire protocol when connecting to ``/ws/{test_id}``: JSON
+    text (the default) or binary frames with raw screenshot bytes, requested
+    with the ``qa-browser.binary.v1`` subprotocol or ``?protocol=binary`` (see
+    ``qa_browser.server.protocol``). JSON frames are compressed with
+    permessage-deflate when the client supports it; uvicorn negotiates it by
+    default (``ws_per_message_deflate``).
+
+    Every client has its own outbound queue of ``queue_size`` messages, drained
+    by a writer task; ``overflow_policy`` decides what happens when a client
+    falls that far behind.
+
+    With ``tile_streaming``, clients connecting with ``?stream=tiles`` get
+    only the changed tiles of each screenshot (see ``qa_browser.server.tiles``),
+    with a keyframe every ``keyframe_interval`` frames, on joining and after
+    asking for a resync. Other clients keep getting full screenshots.
 
-    def __init__(self):
-        self.app = FastAPI(title="QA Browser Server")
-        self.active_connections: Dict[str, Set[WebSocket]] = {}
+    Events are published to ``broker``, which numbers them per test
+    (``seq``), keeps their history, also while no client is connected, and
+    delivers them to every server with clients for the test. New clients are
+    sent the recent events first, and reconnecting clients can pass
+    ``?since=<seq>`` to get only what they missed (see
+    ``qa_browser.server.replay``). The default InMemoryBroker serves a single
+    process; with a ``UnixSocketBroker``, uvicorn can run several workers and
+    tests can publish from their own processes (see
+    ``qa_browser.server.broker``).
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 64,
+        overflow_policy: OverflowPolicy | str = OverflowPolicy.DROP_OLDEST,
+        tile_streaming: bool = False,
+        tile_size: int = 64,
+        keyframe_interval: int = 30,
+        broker: Broker | None = None,
+    ):
+        self.app = FastAPI(title="QA Browser Server", lifespan=self._lifespan)
+        self.queue_size = queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.tile_streaming = tile_streaming
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.tile_streamers: Dict[str, 'TileStreamer'] = {}
+        self.broker = broker if broker is not None else InMemoryBroker()
+        self.broker.bind(self._deliver)
+        self.active_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {}
+        # Hash of the last screenshot broadcast per test, to skip repeated frames
+        self.last_screenshots: Dict[str, str] = {}
+        # (last event, finished) monotonic times of each test, so the per-test
+        # state above is evicted on the same TTLs as the broker's history
+        self._test_activity: Dict[str, tuple[float, float | None]] = {}
+        history = getattr(self.broker, 'history', None) or EventHistory()
+        self._ttl = history.ttl
+        self._finished_ttl = history.finished_ttl
+        self._last_sweep = time.monotonic()
         self.setup_routes()
 
+    @asynccontextmanager
+    async def _lifespan(self, app: FastAPI):
+        await self.broker.start()
+        try:
+            yield
+        finally:
+            await self.broker.close()
+
     def setup_routes(self):
         """Setup WebSocket and HTTP routes"""
 
@@ -29,65 +107,239 @@ class QABrowserServer:
                     # Keep connection alive and receive messages
                     data = await websocket.receive_text()
                     logger.debug(f"Received message from {test_id}: {data}")
+                    self.handle_message(websocket, test_id, data)
             except WebSocketDisconnect:
+                pass
+            finally:
                 await self.disconnect(websocket, test_id)
 
         @self.app.get("/health")
         async def health_check():
-            return {"status": "healthy", "active_tests": len(self.active_connections)}
+            return {
+                "status": "healthy",
+                "active_tests": len(self.active_connections),
+                "clients": self.client_stats(),
+                "history": await self.broker.stats(),
+            }
+
+        @self.app.get("/metrics")
+        async def metrics_endpoint():
+            # collecting asks each live browser process for its histograms
+            snapshot = await asyncio.to_thread(metrics.collect)
+            return PlainTextResponse(
+                metrics.render_prometheus(snapshot),
+                media_type="text/plain; version=0.0.4",
+            )
+
+    def client_stats(self) -> Dict[str, list]:
+        """Queue depth, sent and dropped message counts of every client, by test"""
+        return {
+            test_id: [client.stats() for client in clients.values()]
+            for test_id, clients in self.active_connections.items()
+        }
 
     async def connect(self, websocket: WebSocket, test_id: str):
         """Connect a new WebSocket client"""
-        await websocket.accept()
+        protocol, subprotocol = negotiate(
+            websocket.scope.get('subprotocols', []),
+            websocket.query_params.get('protocol'),
+        )
+        await websocket.accept(subprotocol=subprotocol)
 
         if test_id not in self.active_connections:
-            self.active_connections[test_id] = set()
+            self.active_connections[test_id] = {}
+            self.broker.subscribe(test_id)
 
-        self.active_connections[test_id].add(websocket)
-        logger.info(f"Client connected to test {test_id}")
+        client = ClientConnection(
+            websocket,
+            protocol,
+            queue_size=self.queue_size,
+            overflow_policy=self.overflow_policy,
+            on_closed=lambda client: self._remove_client(test_id, client.websocket),
+            stream_tiles=(
+                self.tile_streaming and websocket.query_params.get('stream') == 'tiles'
+            ),
+        )
+        self.active_connections[test_id][websocket] = client
+        logger.info(f"Client connected to test {test_id} ({protocol.value})")
 
         # Send connection confirmation
-        await self.send_event(test_id, {
+        self._dispatch(test_id, {
             "type": "connection",
             "status": "connected",
             "test_id": test_id,
             "timestamp": datetime.now().isoformat()
         })
+        await self.replay(test_id, client, websocket.query_params.get('since'))
+        if client.stream_tiles:
+            self.send_keyframe(test_id, client)
+
+    async def replay(self, test_id: str, client: ClientConnection, since: str | None = None):
+        """Send the buffered events of a test after ``since`` to a client
+
+        They are preceded by a ``replay`` event telling how many follow and
+        whether some that the client asked for are no longer buffered. Live
+        events arriving meanwhile are held back and sent after them.
+        """
+        try:
+            since_seq = int(since) if since is not None else None
+        except ValueError:
+            since_seq = None
+        client.hold()
+        try:
+            # leave room in the queue for the replay event and a keyframe
+            events, missing = await self.broker.replay(
+                test_id, since_seq, limit=max(1, self.queue_size - 2)
+            )
+        except Exception as e:
+            logger.error(f"Error replaying events of test {test_id}: {e}")
+            events, missing = [], False
+        if events or missing:
+            self._send_replay(client, events, missing, since_seq)
+        client.release(events[-1]["seq"] if events else since_seq)
+
+    def _send_replay(
+        self, client: ClientConnection, events: list, missing: bool, since_seq: int | None
+    ):
+        client.enqueue(self._encode({
+            "type": "replay",
+            "count": len(events),
+            "since": since_seq,
+            "missing": missing,
+            "timestamp": datetime.now().isoformat(),
+        }, client.protocol))
+        for event in events:
+            client.enqueue(
+                self._encode(event, client.protocol), screenshot=bool(event.get("screenshot"))
+            )
+
+    def handle_message(self, websocket: WebSocket, test_id: str, data: str):
+        """Handle a message from a client; only resync requests are understood"""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        client = self.active_connections.get(test_id, {}).get(websocket)
+        if client is not None and isinstance(message, dict) and message.get("type") == "resync":
+            self.send_keyframe(test_id, client)
+
+    def send_keyframe(self, test_id: str, client: ClientConnection):
+        """Send the current screenshot of a test to a tile-streaming client"""
+        streamer = self.tile_streamers.get(test_id)
+        if streamer is None or streamer.keyframe()[1] is None:
+            return
+        client.resync = False
+        event = self._keyframe_event(streamer, {
+            "type": "browser_frame",
+            "timestamp": datetime.now().isoformat(),
+        })
+        client.enqueue(self._encode(event, client.protocol), screenshot=True)
 
     async def disconnect(self, websocket: WebSocket, test_id: str):
         """Disconnect a WebSocket client"""
+        client = self.active_connections.get(test_id, {}).get(websocket)
+        if client is not None:
+            await client.close()
+        self._remove_client(test_id, websocket)
+
+        logger.info(f"Client disconnected from test {test_id}")
+
+    def _remove_client(self, test_id: str, websocket: WebSocket) -> None:
         if test_id in self.active_connections:
-            self.active_connections[test_id].discard(websocket)
+            self.active_connections[test_id].pop(websocket, None)
 
             if not self.active_connections[test_id]:
                 del self.active_connections[test_id]
-
-        logger.info(f"Client disconnected from test {test_id}")
+                self.broker.unsubscribe(test_id)
+                self.last_screenshots.pop(test_id, None)
+                self.tile_streamers.pop(test_id, None)
 
     async def send_event(self, test_id: str, event: dict):
-        """Send an event to all connected clients for a test"""
-        if test_id not in self.active_connections:
-            logger.warning(f"No clients connected for test {test_id}")
-            return
+        """Publish an event to all clients for a test, in any worker
 
+        Doesn't wait for the clients to receive it; each client's writer task
+        sends it.
+        """
         # Add timestamp if not present
         if "timestamp" not in event:
             event["timestamp"] = datetime.now().isoformat()
 
-        message = json.dumps(event)
+        self._track(test_id, event)
+        await self.broker.publish(test_id, event)
 
-        # Send to all connected clients
-        dead_connections = set()
-        for connection in self.active_connections[test_id]:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error sending to client: {e}")
-                dead_connections.add(connection)
+    def _track(self, test_id: str, event: dict):
+        """Note an event of a test, then evict the state of stale tests"""
+        now = time.monotonic()
+        finished = event.get("type") == "test_status" and event.get("status") in FINISHED_STATUSES
+        self._test_activity[test_id] = (now, now if finished else None)
+        self._evict_expired(throttle=1.0)
 
-        # Clean up dead connections
-        for conn in dead_connections:
-            self.active_connections[test_id].discard(conn)
+    def _evict_expired(self, throttle: float = 0):
+        """Drop the per-test state of tests without clients that are past their TTL
+
+        Runs at most once every ``throttle`` seconds.
+        """
+        now = time.monotonic()
+        if now - self._last_sweep < throttle:
+            return
+        self._last_sweep = now
+        for test_id, (updated_at, finished_at) in list(self._test_activity.items()):
+            if test_id in self.active_connections:
+                continue
+            if now - updated_at > self._ttl or (
+                finished_at is not None and now - finished_at > self._finished_ttl
+            ):
+                del self._test_activity[test_id]
+                self.last_screenshots.pop(test_id, None)
+                self.tile_streamers.pop(test_id, None)
+
+    def _dispatch(
+        self,
+        test_id: str,
+        event: dict,
+        select: Callable[[ClientConnection], dict] | None = None,
+    ):
+        """Queue ``event``, or the variant ``select`` picks, for each local client"""
+        if test_id not in self.active_connections:
+            logger.debug(f"No clients connected for test {test_id}")
+            return
+
+        # Each variant is encoded at most once per protocol, however many
+        # clients there are
+        encoded: Dict[tuple[int, WireProtocol], str | bytes] = {}
+        for client in list(self.active_connections[test_id].values()):
+            chosen = event if select is None else select(client)
+            key = (id(chosen), client.protocol)
+            if key not in encoded:
+                encoded[key] = self._encode(chosen, client.protocol)
+            client.enqueue(
+                encoded[key],
+                screenshot=bool(chosen.get("screenshot")) or "frame" in chosen,
+                seq=chosen.get("seq"),
+            )
+
+    @staticmethod
+    def _encode(event: dict, protocol: WireProtocol) -> str | bytes:
+        if protocol == WireProtocol.BINARY:
+            message = encode_binary(event)
+            if message is not None:
+                return message
+        return encode_text(event)
+
+    def _tile_streamer(self, test_id: str) -> 'TileStreamer':
+        streamer = self.tile_streamers.get(test_id)
+        if streamer is None:
+            # imported here, as it needs numpy and PIL
+            from qa_browser.server.tiles import TileStreamer
+
+            streamer = TileStreamer(self.tile_size, self.keyframe_interval)
+            self.tile_streamers[test_id] = streamer
+        return streamer
+
+    @staticmethod
+    def _keyframe_event(streamer: 'TileStreamer', event: dict) -> dict:
+        seq, screenshot = streamer.keyframe()
+        return dict(event, screenshot=screenshot, frame={"seq": seq, "keyframe": True})
 
     async def broadcast_browser_observation(
         self,
@@ -96,19 +348,69 @@ class QABrowserServer:
         screenshot: str | None = None,
         action: str = '',
         error: bool = False,
-        error_message: str = ''
+        error_message: str = '',
+        screenshot_unchanged: bool = False,
     ):
-        """Broadcast a browser observation to connected clients"""
+        """Broadcast a browser observation to connected clients
+
+        A screenshot that repeats the last one sent for the test (or that the
+        browser reported as unchanged) is not sent again; clients get
+        ``screenshot_unchanged`` and keep showing the previous frame.
+        """
+        if screenshot and not screenshot_unchanged:
+            digest = hashlib.blake2b(screenshot.encode(), digest_size=16).hexdigest()
+            screenshot_unchanged = self.last_screenshots.get(test_id) == digest
+            self.last_screenshots[test_id] = digest
         event = {
             "type": "browser_observation",
             "url": url,
-            "screenshot": screenshot,
+            "screenshot": None if screenshot_unchanged else screenshot,
+            "screenshot_unchanged": screenshot_unchanged,
             "action": action,
             "error": error,
             "error_message": error_message,
         }
         await self.send_event(test_id, event)
 
+    async def _deliver(self, test_id: str, event: dict):
+        """Send an event the broker delivered to this server's clients"""
+        self._track(test_id, event)
+        screenshot = event.get("screenshot")
+        if not (
+            self.tile_streaming
+            and event.get("type") == "browser_observation"
+            and screenshot
+            and test_id in self.active_connections
+        ):
+            self._dispatch(test_id, event)
+            return
+
+        streamer = self._tile_streamer(test_id)
+        async with streamer.lock:
+            clients = self.active_connections.get(test_id, {}).values()
+            if not any(client.stream_tiles for client in clients):
+                # nobody to diff for; just remember the frame for joining clients
+                streamer.skip(screenshot)
+                self._dispatch(test_id, event)
+                return
+            # decoding and diffing the frame is CPU-bound
+            update = await asyncio.to_thread(streamer.push, screenshot)
+            keyframe_event = self._keyframe_event(streamer, event)
+        if update.keyframe:
+            tile_event = keyframe_event
+        else:
+            tile_event = dict(event, screenshot=None, frame=update.frame_info(streamer.tile_size))
+
+        def select(client: ClientConnection) -> dict:
+            if not client.stream_tiles:
+                return event
+            if client.resync:
+                client.resync = False
+                return keyframe_event
+            return tile_event
+
+        self._dispatch(test_id, event, select)
+
     async def broadcast_test_status(
         self,
         test_id: str,
@@ -122,7 +424,16 @@ class QABrowserServer:
             "message": message,
         }
         await self.send_event(test_id, event)
+        if status in FINISHED_STATUSES:
+            await self.broker.finish(test_id)
 
 
-__all__ = ['QABrowserServer']
+__all__ = [
+    'Broker',
+    'EventHistory',
+    'InMemoryBroker',
+    'OverflowPolicy',
+    'QABrowserServer',
+    'UnixSocketBroker',
+]
 
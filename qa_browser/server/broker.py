@@ -0,0 +1,438 @@
+"""Pub/sub fan-out of test events between QABrowserServer processes
+
+A QABrowserServer publishes every event to its broker, and the broker
+delivers it to each server that has clients for the test, possibly in
+another process. The broker also owns the replay history, so events are
+numbered and buffered once, whichever process published them.
+
+InMemoryBroker only reaches the current process. UnixSocketBroker connects
+the processes on one host, e.g. uvicorn workers and the test runners that
+publish to them, without external services: the first process to take the
+lock next to the socket path hosts the hub, the others connect to it, and a
+new hub is elected if its process exits. The history lives in the hub and
+is lost when it moves.
+"""
+
+import asyncio
+import errno
+import fcntl
+import itertools
+import json
+import logging
+import os
+import struct
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Awaitable, Callable
+
+from qa_browser.server.replay import EventHistory
+
+logger = logging.getLogger(__name__)
+
+# Called with (test_id, event) for each event of a subscribed test
+EventHandler = Callable[[str, dict], Awaitable[None]]
+
+
+class Broker(ABC):
+    """Delivers published events to the subscribed servers."""
+
+    def __init__(self) -> None:
+        self._on_event: EventHandler | None = None
+
+    def bind(self, on_event: EventHandler) -> None:
+        """Set the handler events of subscribed tests are delivered to."""
+        self._on_event = on_event
+
+    async def start(self) -> None:
+        """Connect the broker; called when the app starts."""
+
+    async def close(self) -> None:
+        """Disconnect the broker; called when the app shuts down."""
+
+    @abstractmethod
+    async def publish(self, test_id: str, event: dict) -> None:
+        """Number and buffer ``event``, then deliver it to the subscribers."""
+
+    @abstractmethod
+    def subscribe(self, test_id: str) -> None:
+        """Start receiving the events of ``test_id``."""
+
+    @abstractmethod
+    def unsubscribe(self, test_id: str) -> None:
+        """Stop receiving the events of ``test_id``."""
+
+    @abstractmethod
+    async def replay(
+        self, test_id: str, since: int | None = None, limit: int | None = None
+    ) -> tuple[list[dict], bool]:
+        """Buffered events of a test; see ReplayBuffer.since."""
+
+    @abstractmethod
+    async def finish(self, test_id: str) -> None:
+        """Mark a test finished, starting its history's eviction countdown."""
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        """History totals, for /health."""
+
+
+class InMemoryBroker(Broker):
+    """Broker for a single process."""
+
+    def __init__(self, history: EventHistory | None = None):
+        super().__init__()
+        self.history = history if history is not None else EventHistory()
+        self.subscriptions: set[str] = set()
+
+    async def publish(self, test_id: str, event: dict) -> None:
+        self.history.record(test_id, event)
+        if test_id in self.subscriptions and self._on_event is not None:
+            await self._on_event(test_id, event)
+
+    def subscribe(self, test_id: str) -> None:
+        self.subscriptions.add(test_id)
+
+    def unsubscribe(self, test_id: str) -> None:
+        self.subscriptions.discard(test_id)
+
+    async def replay(
+        self, test_id: str, since: int | None = None, limit: int | None = None
+    ) -> tuple[list[dict], bool]:
+        return self.history.replay(test_id, since, limit)
+
+    async def finish(self, test_id: str) -> None:
+        self.history.finish(test_id)
+
+    async def stats(self) -> dict:
+        return self.history.stats()
+
+
+# Frames between the hub and its peers: op (u8), body length (u32), JSON body
+_FRAME = struct.Struct('>BI')
+_PUBLISH, _SUBSCRIBE, _UNSUBSCRIBE, _REPLAY, _FINISH, _STATS, _EVENT, _REPLY = range(1, 9)
+
+
+def _frame(op: int, body: dict) -> bytes:
+    data = json.dumps(body).encode()
+    return _FRAME.pack(op, len(data)) + data
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[int, dict]:
+    op, length = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    return op, json.loads(await reader.readexactly(length))
+
+
+class _Peer:
+    """A connection to the hub with its own bounded send queue.
+
+    Frames are written by a writer task, so a peer that stops reading never
+    holds up the events of the other peers. A peer that falls ``queue_size``
+    frames behind is disconnected; it reconnects and subscribes again.
+    """
+
+    def __init__(
+        self,
+        writer: asyncio.StreamWriter,
+        queue_size: int,
+        on_closed: Callable[['_Peer'], None] | None = None,
+    ):
+        self.writer = writer
+        self.queue_size = queue_size
+        self.on_closed = on_closed
+        self._queue: deque[bytes] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self._task = asyncio.create_task(self._write())
+
+    def send(self, frame: bytes) -> bool:
+        """Queue a frame without waiting; False if the peer was dropped."""
+        if self.closed:
+            return False
+        if len(self._queue) >= self.queue_size:
+            logger.warning('Disconnecting a broker peer that is not keeping up')
+            self.close()
+            return False
+        self._queue.append(frame)
+        self._ready.set()
+        return True
+
+    async def _write(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    self.writer.write(self._queue.popleft())
+                    await self.writer.drain()
+                self._ready.clear()
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.debug(f'Broker peer connection lost: {e}')
+            self.close()
+
+    def close(self) -> None:
+        """Stop the writer and close the connection, ending the peer's handler."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._task is not asyncio.current_task():
+            self._task.cancel()
+        # not close(): that waits for the send buffer to drain, which it never
+        # does for a peer that stopped reading
+        self.writer.transport.abort()
+        if self.on_closed is not None:
+            self.on_closed(self)
+
+
+class _Hub:
+    """Routes events between the peers of a UnixSocketBroker and keeps the history."""
+
+    def __init__(self, history: EventHistory, peer_queue_size: int = 1024):
+        if peer_queue_size < 1:
+            raise ValueError(f'peer_queue_size must be at least 1, got {peer_queue_size}')
+        self.history = history
+        self.peer_queue_size = peer_queue_size
+        self.subscribers: dict[str, set[_Peer]] = {}
+        # peers and the tasks handling them
+        self.peers: dict[_Peer, asyncio.Task] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscribed: set[str] = set()
+        peer = _Peer(writer, self.peer_queue_size, on_closed=self._remove_peer)
+        self.peers[peer] = asyncio.current_task()
+        try:
+            while True:
+                op, body = await _read_frame(reader)
+                if op == _PUBLISH:
+                    self._publish(body['test_id'], body['event'])
+                elif op == _SUBSCRIBE:
+                    self.subscribers.setdefault(body['test_id'], set()).add(peer)
+                    subscribed.add(body['test_id'])
+                elif op == _UNSUBSCRIBE:
+                    self._unsubscribe(body['test_id'], peer)
+                    subscribed.discard(body['test_id'])
+                elif op == _REPLAY:
+                    events, missing = self.history.replay(
+                        body['test_id'], body.get('since'), body.get('limit')
+                    )
+                    peer.send(_frame(_REPLY, {'id': body['id'], 'result': [events, missing]}))
+                elif op == _FINISH:
+                    self.history.finish(body['test_id'])
+                elif op == _STATS:
+                    peer.send(_frame(_REPLY, {'id': body['id'], 'result': self.history.stats()}))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            peer.close()
+            # frames read after the peer was closed may have subscribed it again
+            for test_id in subscribed:
+                self._unsubscribe(test_id, peer)
+
+    async def close(self) -> None:
+        """Drop every peer, so that they elect a new hub."""
+        tasks = list(self.peers.values())
+        for peer in list(self.peers):
+            peer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _publish(self, test_id: str, event: dict) -> None:
+        self.history.record(test_id, event)
+        subscribers = self.subscribers.get(test_id)
+        if not subscribers:
+            return
+        # encoded once for all subscribers
+        frame = _frame(_EVENT, {'test_id': test_id, 'event': event})
+        for subscriber in list(subscribers):
+            if not subscriber.send(frame):
+                self._unsubscribe(test_id, subscriber)
+
+    def _remove_peer(self, peer: _Peer) -> None:
+        """Stop routing events to a closed peer."""
+        self.peers.pop(peer, None)
+        for test_id in list(self.subscribers):
+            self._unsubscribe(test_id, peer)
+
+    def _unsubscribe(self, test_id: str, peer: _Peer) -> None:
+        subscribers = self.subscribers.get(test_id)
+        if subscribers is not None:
+            subscribers.discard(peer)
+            if not subscribers:
+                del self.subscribers[test_id]
+
+
+class UnixSocketBroker(Broker):
+    """Broker for the processes of one host, over a Unix domain socket.
+
+    Args:
+        path: Socket path; every process sharing events must use the same one
+        history: History kept by whichever process hosts the hub
+        reconnect_delay: Seconds between attempts to reach or become the hub
+        request_timeout: Seconds to wait for replay and stats replies
+        peer_queue_size: Frames the hub queues for a peer before disconnecting it
+    """
+
+    def __init__(
+        self,
+        path: str,
+        history: EventHistory | None = None,
+        reconnect_delay: float = 0.1,
+        request_timeout: float = 10,
+        peer_queue_size: int = 1024,
+    ):
+        super().__init__()
+        self.path = path
+        self.history = history if history is not None else EventHistory()
+        self.reconnect_delay = reconnect_delay
+        self.request_timeout = request_timeout
+        self.peer_queue_size = peer_queue_size
+        self.subscriptions: set[str] = set()
+        self._writer: asyncio.StreamWriter | None = None
+        self._connected = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._hub_server: asyncio.AbstractServer | None = None
+        self._hub: _Hub | None = None
+        self._lock_fd: int | None = None
+        self._replies: dict[int, asyncio.Future] = {}
+        self._request_ids = itertools.count()
+        self._closed = False
+
+    @property
+    def is_hub(self) -> bool:
+        return self._hub_server is not None
+
+    async def start(self) -> None:
+        if self._runner is None:
+            self._closed = False
+            self._runner = asyncio.create_task(self._run())
+        await self._connected.wait()
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except asyncio.CancelledError:
+                pass
+            self._runner = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._hub_server is not None:
+            self._hub_server.close()
+            await self._hub.close()
+            self._hub_server = self._hub = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    async def _run(self) -> None:
+        while not self._closed:
+            await self._try_become_hub()
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            self._writer = writer
+            for test_id in self.subscriptions:
+                writer.write(_frame(_SUBSCRIBE, {'test_id': test_id}))
+            self._connected.set()
+            logger.info(f"Connected to broker hub at {self.path} (hub: {self.is_hub})")
+            try:
+                await self._read(reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("Lost the broker hub connection, reconnecting")
+            finally:
+                self._connected.clear()
+                self._writer = None
+                writer.close()
+                for reply in self._replies.values():
+                    if not reply.done():
+                        reply.set_exception(ConnectionError('Broker hub connection lost'))
+                self._replies.clear()
+
+    async def _try_become_hub(self) -> None:
+        """Host the hub if no other process holds the lock."""
+        if self._hub_server is not None:
+            return
+        fd = os.open(f'{self.path}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError as e:
+            os.close(fd)
+            if e.errno not in (errno.EAGAIN, errno.EACCES):
+                raise
+            return
+        self._lock_fd = fd
+        # a socket left behind by a hub that died
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._hub = _Hub(self.history, self.peer_queue_size)
+        self._hub_server = await asyncio.start_unix_server(self._hub.handle, self.path)
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            op, body = await _read_frame(reader)
+            if op == _EVENT:
+                if body['test_id'] in self.subscriptions and self._on_event is not None:
+                    try:
+                        await self._on_event(body['test_id'], body['event'])
+                    except Exception as e:
+                        logger.error(f"Error delivering event of test {body['test_id']}: {e}")
+            elif op == _REPLY:
+                reply = self._replies.pop(body['id'], None)
+                if reply is not None and not reply.done():
+                    reply.set_result(body['result'])
+
+    async def _send(self, op: int, body: dict) -> None:
+        if not self._connected.is_set():
+            await self.start()
+        self._writer.write(_frame(op, body))
+        await self._writer.drain()
+
+    async def _request(self, op: int, body: dict):
+        request_id = next(self._request_ids)
+        reply = asyncio.get_running_loop().create_future()
+        self._replies[request_id] = reply
+        try:
+            await self._send(op, dict(body, id=request_id))
+            return await asyncio.wait_for(reply, self.request_timeout)
+        finally:
+            self._replies.pop(request_id, None)
+
+    async def publish(self, test_id: str, event: dict) -> None:
+        await self._send(_PUBLISH, {'test_id': test_id, 'event': event})
+
+    def subscribe(self, test_id: str) -> None:
+        self.subscriptions.add(test_id)
+        if self._writer is not None:
+            self._writer.write(_frame(_SUBSCRIBE, {'test_id': test_id}))
+
+    def unsubscribe(self, test_id: str) -> None:
+        self.subscriptions.discard(test_id)
+        if self._writer is not None:
+            self._writer.write(_frame(_UNSUBSCRIBE, {'test_id': test_id}))
+
+    async def replay(
+        self, test_id: str, since: int | None = None, limit: int | None = None
+    ) -> tuple[list[dict], bool]:
+        events, missing = await self._request(
+            _REPLAY, {'test_id': test_id, 'since': since, 'limit': limit}
+        )
+        return events, missing
+
+    async def finish(self, test_id: str) -> None:
+        await self._send(_FINISH, {'test_id': test_id})
+
+    async def stats(self) -> dict:
+        return await self._request(_STATS, {})
+
+
+__all__ = ['Broker', 'EventHandler', 'InMemoryBroker', 'UnixSocketBroker']
@@ -0,0 +1,185 @@
+"""Outbound queue and writer task of one WebSocket client"""
+
+import asyncio
+import logging
+from collections import deque
+from enum import Enum
+from typing import Callable
+
+from fastapi import WebSocket
+
+from qa_browser.server.protocol import WireProtocol
+
+logger = logging.getLogger(__name__)
+
+# Close code sent to clients dropped by OverflowPolicy.DISCONNECT
+SLOW_CONSUMER_CLOSE_CODE = 1008
+
+
+class OverflowPolicy(str, Enum):
+    """What to do when a client's outbound queue is full."""
+
+    # discard the oldest queued message
+    DROP_OLDEST = 'drop_oldest'
+    # a new screenshot replaces the queued ones, so only the latest frame is
+    # kept; other messages discard the oldest queued screenshot
+    COALESCE = 'coalesce'
+    # close the connection of the slow client
+    DISCONNECT = 'disconnect'
+
+
+class ClientConnection:
+    """A connected client with its own bounded send queue.
+
+    Messages are sent by a writer task, so a slow client never holds up the
+    test that broadcasts or the other clients of the test.
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        protocol: WireProtocol,
+        queue_size: int = 64,
+        overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        on_closed: Callable[['ClientConnection'], None] | None = None,
+        stream_tiles: bool = False,
+    ):
+        if queue_size < 1:
+            raise ValueError(f'queue_size must be at least 1, got {queue_size}')
+        self.websocket = websocket
+        self.protocol = protocol
+        self.queue_size = queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.on_closed = on_closed
+        # receives tile deltas instead of full screenshots (see server.tiles)
+        self.stream_tiles = stream_tiles
+        # a screenshot was dropped, so the next frame must be a keyframe
+        self.resync = False
+        # live messages held back while the history is replayed
+        self._held: list[tuple[str | bytes, bool, int | None]] | None = None
+        # (message, carries a screenshot)
+        self._queue: deque[tuple[str | bytes, bool]] = deque()
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+        self._writer = asyncio.create_task(self._write())
+        # closes the WebSocket of a client dropped by OverflowPolicy.DISCONNECT
+        self._closing: asyncio.Task | None = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(
+        self, message: str | bytes, screenshot: bool = False, seq: int | None = None
+    ) -> bool:
+        """Queue a message without waiting; False if it was not queued.
+
+        ``seq`` is the event's number, for messages held during a replay.
+        """
+        if self.closed:
+            return False
+        if self._held is not None and seq is not None:
+            self._held.append((message, screenshot, seq))
+            return True
+        if len(self._queue) >= self.queue_size:
+            if self.overflow_policy == OverflowPolicy.DISCONNECT:
+                logger.warning('Disconnecting a client that is not keeping up')
+                self.dropped += len(self._queue) + 1
+                self._stop()
+                self._closing = asyncio.create_task(
+                    self._close_websocket(SLOW_CONSUMER_CLOSE_CODE)
+                )
+                return False
+            if self.overflow_policy == OverflowPolicy.COALESCE and screenshot:
+                self._drop_screenshots()
+            if len(self._queue) >= self.queue_size:
+                self._drop(prefer_screenshot=self.overflow_policy == OverflowPolicy.COALESCE)
+        self._queue.append((message, screenshot))
+        self._ready.set()
+        return True
+
+    def hold(self) -> None:
+        """Hold back numbered messages until release()."""
+        self._held = []
+
+    def release(self, replayed_seq: int | None) -> None:
+        """Queue the held messages, skipping those up to ``replayed_seq``."""
+        held, self._held = self._held or [], None
+        for message, screenshot, seq in held:
+            if replayed_seq is None or seq > replayed_seq:
+                self.enqueue(message, screenshot)
+
+    def _drop_screenshots(self) -> None:
+        kept = deque(item for item in self._queue if not item[1])
+        if len(kept) < len(self._queue):
+            self.dropped += len(self._queue) - len(kept)
+            self.resync = True
+            self._queue = kept
+
+    def _drop(self, prefer_screenshot: bool) -> None:
+        if prefer_screenshot:
+            for index, (_, screenshot) in enumerate(self._queue):
+                if screenshot:
+                    del self._queue[index]
+                    self.dropped += 1
+                    self.resync = True
+                    return
+        _, screenshot = self._queue.popleft()
+        self.dropped += 1
+        self.resync = self.resync or screenshot
+
+    async def _write(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                while self._queue:
+                    message, _ = self._queue.popleft()
+                    if isinstance(message, bytes):
+                        await self.websocket.send_bytes(message)
+                    else:
+                        await self.websocket.send_text(message)
+                    self.sent += 1
+                self._ready.clear()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Error sending to client: {e}")
+            await self.close()
+
+    async def close(self, code: int | None = None) -> None:
+        """Stop the writer; with ``code``, close the WebSocket as well."""
+        if self.closed:
+            if self._closing is not None:
+                await self._closing
+            return
+        self._stop()
+        if code is not None:
+            await self._close_websocket(code)
+
+    def _stop(self) -> None:
+        self.closed = True
+        self._queue.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if self.on_closed is not None:
+            self.on_closed(self)
+
+    async def _close_websocket(self, code: int) -> None:
+        try:
+            await self.websocket.close(code=code)
+        except Exception as e:
+            logger.debug(f"Error closing client: {e}")
+
+    def stats(self) -> dict:
+        return {
+            'protocol': self.protocol.value,
+            'stream_tiles': self.stream_tiles,
+            'queue_depth': self.queue_depth,
+            'sent': self.sent,
+            'dropped': self.dropped,
+        }
+
+
+__all__ = ['ClientConnection', 'OverflowPolicy', 'SLOW_CONSUMER_CLOSE_CODE']
@@ -0,0 +1,157 @@
+"""Wire formats for events sent over ``/ws/{test_id}``
+
+Text clients (the default) get every event as one JSON text frame, with
+screenshots inlined as base64 data URLs.
+
+Binary clients get events that carry images as a single binary frame::
+
+    +----------------------+-------------------+-------------------+
+    | header length (u32)  | JSON header       | image bytes       |
+    | big-endian           | (UTF-8)           | (PNG, WebP, ...)  |
+    +----------------------+-------------------+-------------------+
+
+The header is the event itself with the images removed. A screenshot is
+replaced by ``screenshot_mime_type`` and ``screenshot_size`` and its bytes
+come first. The tiles of a tile delta (see ``qa_browser.server.tiles``)
+form the tile table: each keeps its position and gets ``image_mime_type``,
+``image_offset`` and ``image_size`` in place of its data URL, the offset
+counting from the start of the image bytes::
+
+    {"frame": {..., "tiles": [{"x": 128, "y": 0, "width": 192, "height": 64,
+                               "image": null, "image_mime_type": "image/png",
+                               "image_offset": 0, "image_size": 1830}]}}
+
+Events without images are still sent as JSON text frames.
+"""
+
+import base64
+import binascii
+import json
+import struct
+from enum import Enum
+from typing import Iterable
+
+_HEADER_LENGTH = struct.Struct('>I')
+
+
+class WireProtocol(str, Enum):
+    TEXT = 'text'
+    BINARY = 'binary'
+
+
+# WebSocket subprotocols a client can offer to pick a wire protocol
+SUBPROTOCOLS = {
+    'qa-browser.text.v1': WireProtocol.TEXT,
+    'qa-browser.binary.v1': WireProtocol.BINARY,
+}
+
+
+def negotiate(
+    offered_subprotocols: Iterable[str], protocol_param: str | None = None
+) -> tuple[WireProtocol, str | None]:
+    """Pick the wire protocol for a new client.
+
+    A known subprotocol offered in the handshake wins; otherwise the
+    ``?protocol=`` query parameter is used, and clients that ask for neither
+    get JSON text.
+
+    Returns:
+        The protocol and the subprotocol to accept (None if none was offered)
+    """
+    for subprotocol in offered_subprotocols:
+        if subprotocol in SUBPROTOCOLS:
+            return SUBPROTOCOLS[subprotocol], subprotocol
+    if protocol_param == WireProtocol.BINARY.value:
+        return WireProtocol.BINARY, None
+    return WireProtocol.TEXT, None
+
+
+def encode_text(event: dict) -> str:
+    return json.dumps(event)
+
+
+def split_data_url(data_url: str) -> tuple[str, bytes] | None:
+    """MIME type and decoded bytes of a base64 data URL, or None if it isn't one."""
+    if not data_url.startswith('data:') or ';base64,' not in data_url:
+        return None
+    prefix, payload = data_url.split(',', 1)
+    try:
+        return prefix[5 : prefix.index(';')], base64.b64decode(payload, validate=True)
+    except binascii.Error:
+        return None
+
+
+def encode_binary(event: dict, image_field: str = 'screenshot') -> bytes | None:
+    """Encode an event carrying images as one binary frame.
+
+    The images are the data URL in ``image_field`` and those of the tiles in
+    the event's ``frame``. Returns None when the event has none; such events
+    are sent as text to every client.
+    """
+    header = dict(event)
+    images: list[bytes] = []
+
+    image = event.get(image_field)
+    parts = split_data_url(image) if isinstance(image, str) else None
+    if parts is not None:
+        mime_type, image_bytes = parts
+        header[image_field] = None
+        header[f'{image_field}_mime_type'] = mime_type
+        header[f'{image_field}_size'] = len(image_bytes)
+        images.append(image_bytes)
+
+    frame = event.get('frame')
+    if isinstance(frame, dict) and frame.get('tiles'):
+        offset = sum(len(image_bytes) for image_bytes in images)
+        tiles = []
+        for tile in frame['tiles']:
+            image = tile.get('image')
+            parts = split_data_url(image) if isinstance(image, str) else None
+            if parts is not None:
+                mime_type, image_bytes = parts
+                tile = dict(
+                    tile,
+                    image=None,
+                    image_mime_type=mime_type,
+                    image_offset=offset,
+                    image_size=len(image_bytes),
+                )
+                images.append(image_bytes)
+                offset += len(image_bytes)
+            tiles.append(tile)
+        header['frame'] = dict(frame, tiles=tiles)
+
+    if not images:
+        return None
+    header_bytes = json.dumps(header).encode()
+    return b''.join((_HEADER_LENGTH.pack(len(header_bytes)), header_bytes, *images))
+
+
+def decode_binary(message: bytes) -> tuple[dict, bytes]:
+    """Split a binary frame into its JSON header and image bytes."""
+    (header_length,) = _HEADER_LENGTH.unpack_from(message)
+    start = _HEADER_LENGTH.size
+    header = json.loads(message[start : start + header_length])
+    return header, message[start + header_length :]
+
+
+def tile_images(header: dict, images: bytes) -> list[tuple[dict, bytes]]:
+    """Each tile of a decoded binary frame with its image bytes."""
+    tiles = (header.get('frame') or {}).get('tiles') or []
+    return [
+        (tile, images[tile['image_offset'] : tile['image_offset'] + tile['image_size']])
+        for tile in tiles
+        if 'image_offset' in tile
+    ]
+
+
+__all__ = [
+    'SUBPROTOCOLS',
+    'WireProtocol',
+    'decode_binary',
+    'encode_binary',
+    'encode_text',
+    'negotiate',
+    'split_data_url',
+    'tile_images',
+]
@@ -0,0 +1,195 @@
+"""Recent event history of each test, replayed to clients that connect late
+
+Every recorded event gets a per-test ``seq``. A client connecting to
+``/ws/{test_id}`` is sent the buffered events first; one that reconnects
+with ``?since=<seq>`` only gets the events after that one.
+"""
+
+import hashlib
+import json
+import time
+from collections import deque
+from dataclasses import dataclass
+
+# broadcast_test_status() statuses after which a test gets no more events
+FINISHED_STATUSES = frozenset({'completed', 'passed', 'failed', 'error', 'cancelled'})
+
+
+@dataclass
+class _Entry:
+    seq: int
+    # the event without its screenshot
+    event: dict
+    # digest of the screenshot the event carries or, if it is unchanged, repeats
+    screenshot: str | None
+    size: int
+
+
+class ReplayBuffer:
+    """Ring buffer of the recent events of one test.
+
+    Bounded by event count and by bytes. Screenshots are stored once per
+    distinct image and referenced by the events that carry or repeat them.
+    """
+
+    def __init__(self, max_events: int, max_bytes: int):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.seq = 0
+        self.nbytes = 0
+        self._entries: deque[_Entry] = deque()
+        # digest -> [data URL, number of entries referring to it]
+        self._screenshots: dict[str, list] = {}
+        self._current_screenshot: str | None = None
+        self.updated_at = time.monotonic()
+        self.finished_at: float | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def record(self, event: dict) -> int:
+        """Buffer ``event``, stamping it with the next ``seq``."""
+        self.seq += 1
+        event['seq'] = self.seq
+        self.updated_at = time.monotonic()
+        self.finished_at = None
+
+        stored = dict(event)
+        screenshot = stored.pop('screenshot', None)
+        digest = None
+        size = 0
+        if screenshot:
+            digest = hashlib.blake2b(screenshot.encode(), digest_size=16).hexdigest()
+            if digest not in self._screenshots:
+                self._screenshots[digest] = [screenshot, 0]
+                size += len(screenshot)
+            self._current_screenshot = digest
+        elif stored.get('screenshot_unchanged') and self._current_screenshot in self._screenshots:
+            digest = self._current_screenshot
+        if digest is not None:
+            self._screenshots[digest][1] += 1
+        size += len(json.dumps(stored))
+
+        self._entries.append(_Entry(self.seq, stored, digest, size))
+        self.nbytes += size
+        self._trim()
+        return self.seq
+
+    def _trim(self) -> None:
+        # the newest event is kept even if it alone is over max_bytes
+        while len(self._entries) > self.max_events or (
+            len(self._entries) > 1 and self.nbytes > self.max_bytes
+        ):
+            entry = self._entries.popleft()
+            self.nbytes -= entry.size
+            if entry.screenshot is None:
+                continue
+            screenshot = self._screenshots[entry.screenshot]
+            screenshot[1] -= 1
+            if screenshot[1] == 0:
+                del self._screenshots[entry.screenshot]
+                self.nbytes -= len(screenshot[0])
+
+    def since(self, seq: int | None = None, limit: int | None = None) -> tuple[list[dict], bool]:
+        """The buffered events after ``seq`` (all of them if None), oldest first.
+
+        At most the last ``limit`` are returned. The flag is True when events
+        the client asked for are missing, because they were evicted or cut
+        by ``limit``.
+        """
+        entries = [entry for entry in self._entries if seq is None or entry.seq > seq]
+        first_seq = entries[0].seq if entries else self.seq + 1
+        if limit is not None and len(entries) > limit:
+            entries = entries[len(entries) - limit :]
+        missing = entries[0].seq > first_seq if entries else False
+        if seq is not None:
+            missing = missing or first_seq > seq + 1
+
+        # a fresh client doesn't have the frame unchanged screenshots refer to
+        has_screenshot = seq is not None
+        events = []
+        for entry in entries:
+            event = dict(entry.event)
+            if entry.screenshot is None:
+                pass
+            elif not event.get('screenshot_unchanged'):
+                event['screenshot'] = self._screenshots[entry.screenshot][0]
+                has_screenshot = True
+            elif not has_screenshot:
+                event['screenshot'] = self._screenshots[entry.screenshot][0]
+                event['screenshot_unchanged'] = False
+                has_screenshot = True
+            events.append(event)
+        return events, missing
+
+
+class EventHistory:
+    """Replay buffers of all tests, evicted once they go stale.
+
+    Args:
+        max_events: Events kept per test; 0 disables the history
+        max_bytes: Approximate memory limit per test, screenshots included
+        ttl: Seconds after its last event that a test is evicted
+        finished_ttl: Seconds after it finished that a test is evicted
+    """
+
+    def __init__(
+        self,
+        max_events: int = 256,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl: float = 3600,
+        finished_ttl: float = 300,
+    ):
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.finished_ttl = finished_ttl
+        self.buffers: dict[str, ReplayBuffer] = {}
+        self._last_sweep = time.monotonic()
+
+    def record(self, test_id: str, event: dict) -> int | None:
+        """Buffer an event of ``test_id``; returns its ``seq``."""
+        if self.max_events <= 0:
+            return None
+        self.evict_expired(throttle=1.0)
+        buffer = self.buffers.get(test_id)
+        if buffer is None:
+            buffer = self.buffers[test_id] = ReplayBuffer(self.max_events, self.max_bytes)
+        return buffer.record(event)
+
+    def replay(
+        self, test_id: str, since: int | None = None, limit: int | None = None
+    ) -> tuple[list[dict], bool]:
+        """Buffered events of ``test_id``; see ReplayBuffer.since."""
+        buffer = self.buffers.get(test_id)
+        if buffer is None:
+            return [], False
+        return buffer.since(since, limit)
+
+    def finish(self, test_id: str) -> None:
+        """Start the ``finished_ttl`` countdown of a test."""
+        buffer = self.buffers.get(test_id)
+        if buffer is not None and buffer.finished_at is None:
+            buffer.finished_at = time.monotonic()
+
+    def evict_expired(self, throttle: float = 0) -> None:
+        """Drop tests past their TTL; at most once every ``throttle`` seconds."""
+        now = time.monotonic()
+        if now - self._last_sweep < throttle:
+            return
+        self._last_sweep = now
+        for test_id, buffer in list(self.buffers.items()):
+            if now - buffer.updated_at > self.ttl or (
+                buffer.finished_at is not None and now - buffer.finished_at > self.finished_ttl
+            ):
+                del self.buffers[test_id]
+
+    def stats(self) -> dict[str, int]:
+        return {
+            'tests': len(self.buffers),
+            'events': sum(len(buffer) for buffer in self.buffers.values()),
+            'bytes': sum(buffer.nbytes for buffer in self.buffers.values()),
+        }
+
+
+__all__ = ['EventHistory', 'FINISHED_STATUSES', 'ReplayBuffer']
@@ -0,0 +1,181 @@
+"""Tile-based delta encoding of the screenshots streamed to dashboards
+
+A TileStreamer keeps the last frame of a test and turns each new one into
+either a keyframe (the full screenshot) or a delta: the rectangles of the
+tile grid whose pixels changed, each encoded on its own. Changed tiles that
+are next to each other in a tile row are sent as one rectangle.
+
+Delta events carry a ``frame`` object::
+
+    {"seq": 7, "base_seq": 6, "keyframe": false, "tile_size": 64,
+     "tiles": [{"x": 128, "y": 0, "width": 192, "height": 64,
+                "image": "data:image/png;base64,..."}]}
+
+and keyframes ``{"seq": 7, "keyframe": true}`` next to the full screenshot.
+A client that sees a ``base_seq`` other than the last ``seq`` it applied has
+missed a frame and should send ``{"type": "resync"}``. Binary clients get the
+tile images as raw bytes after the header instead (see
+``qa_browser.server.protocol``).
+"""
+
+import asyncio
+import io
+from dataclasses import dataclass, field
+
+import numpy as np
+from PIL import Image
+
+from qa_browser.browser.base64 import ImageCodec
+from qa_browser.server.protocol import split_data_url
+
+
+@dataclass
+class FrameUpdate:
+    """The encoding of one frame pushed to a TileStreamer."""
+
+    seq: int
+    keyframe: bool
+    # changed rectangles, for deltas only
+    tiles: list[dict] = field(default_factory=list)
+    base_seq: int | None = None
+
+    def frame_info(self, tile_size: int) -> dict:
+        if self.keyframe:
+            return {'seq': self.seq, 'keyframe': True}
+        return {
+            'seq': self.seq,
+            'base_seq': self.base_seq,
+            'keyframe': False,
+            'tile_size': tile_size,
+            'tiles': self.tiles,
+        }
+
+
+def decode_frame(data_url: str) -> np.ndarray | None:
+    """RGB array of a base64 image data URL, or None if it isn't one."""
+    parts = split_data_url(data_url)
+    if parts is None:
+        return None
+    with Image.open(io.BytesIO(parts[1])) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+def changed_tiles(previous: np.ndarray, frame: np.ndarray, tile_size: int) -> np.ndarray:
+    """Boolean (rows, columns) grid of the tiles that differ between two frames."""
+    height, width = frame.shape[:2]
+    rows = -(-height // tile_size)
+    cols = -(-width // tile_size)
+    changed = np.zeros((rows * tile_size, cols * tile_size), dtype=bool)
+    changed[:height, :width] = (previous != frame).any(axis=2)
+    return changed.reshape(rows, tile_size, cols, tile_size).any(axis=(1, 3))
+
+
+class TileStreamer:
+    """Keyframe/delta encoder for the screenshots of one test.
+
+    Args:
+        tile_size: Side of the square tiles, in pixels
+        keyframe_interval: A keyframe is sent at least every this many frames
+        max_changed_fraction: Above this fraction of changed tiles a keyframe
+            is sent instead, as it is about as large and much cheaper to build
+        codec: Encoding of the tiles
+    """
+
+    def __init__(
+        self,
+        tile_size: int = 64,
+        keyframe_interval: int = 30,
+        max_changed_fraction: float = 0.5,
+        codec: ImageCodec | None = None,
+    ):
+        codec = codec or ImageCodec(png_compress_level=1)
+        if codec.scale != 1 or codec.is_raw:
+            raise ValueError('Tiles need an unscaled, encoded ImageCodec')
+        if tile_size < 8:
+            raise ValueError(f'tile_size must be at least 8, got {tile_size}')
+        self.tile_size = tile_size
+        self.keyframe_interval = keyframe_interval
+        self.max_changed_fraction = max_changed_fraction
+        self.codec = codec
+        # serializes push() calls, which may run in worker threads
+        self.lock = asyncio.Lock()
+        # (seq, data URL, pixels) of the current frame, replaced as a whole so
+        # readers on other threads never see a mix of two frames
+        self._current: tuple[int, str | None, np.ndarray | None] = (0, None, None)
+        self._since_keyframe = 0
+
+    @property
+    def seq(self) -> int:
+        return self._current[0]
+
+    def keyframe(self) -> tuple[int, str | None]:
+        """Sequence number and data URL of the current frame."""
+        return self._current[:2]
+
+    def skip(self, screenshot: str) -> None:
+        """Make ``screenshot`` the current frame without diffing it.
+
+        The next frame pushed is a keyframe.
+        """
+        self._current = (self.seq + 1, screenshot, None)
+
+    def push(self, screenshot: str) -> FrameUpdate:
+        """Make ``screenshot`` the current frame and encode it."""
+        base_seq, _, previous = self._current
+        seq = base_seq + 1
+        frame = decode_frame(screenshot)
+
+        update = None
+        if not (
+            frame is None
+            or previous is None
+            or previous.shape != frame.shape
+            or self._since_keyframe + 1 >= self.keyframe_interval
+        ):
+            changed = changed_tiles(previous, frame, self.tile_size)
+            if changed.mean() <= self.max_changed_fraction:
+                update = FrameUpdate(
+                    seq=seq,
+                    keyframe=False,
+                    tiles=self._encode_tiles(frame, changed),
+                    base_seq=base_seq,
+                )
+
+        if update is None:
+            self._since_keyframe = 0
+            update = FrameUpdate(seq=seq, keyframe=True)
+        else:
+            self._since_keyframe += 1
+        self._current = (seq, screenshot, frame)
+        return update
+
+    def _encode_tiles(self, frame: np.ndarray, changed: np.ndarray) -> list[dict]:
+        size = self.tile_size
+        width = frame.shape[1]
+        tiles = []
+        for row, col_start, col_end in _row_runs(changed):
+            y, x = row * size, col_start * size
+            region = np.ascontiguousarray(frame[y : y + size, x : min(col_end * size, width)])
+            tiles.append(
+                {
+                    'x': x,
+                    'y': y,
+                    'width': region.shape[1],
+                    'height': region.shape[0],
+                    'image': self.codec.to_base64_url(region),
+                }
+            )
+        return tiles
+
+
+def _row_runs(changed: np.ndarray) -> list[tuple[int, int, int]]:
+    """(row, first column, end column) of each run of changed tiles in a row."""
+    # a run starts where a tile is changed and its left neighbour isn't
+    padded = np.pad(changed, ((0, 0), (1, 1)))
+    edges = np.diff(padded.astype(np.int8), axis=1)
+    starts = np.argwhere(edges == 1)
+    ends = np.argwhere(edges == -1)
+    return [(int(row), int(start), int(end)) for (row, start), (_, end) in zip(starts, ends)]
+
+
+__all__ = ['FrameUpdate', 'TileStreamer', 'changed_tiles', 'decode_frame']
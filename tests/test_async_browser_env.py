@@ -0,0 +1,126 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import threading
+
+import pytest
+
+from qa_browser.browser import utils
+from qa_browser.browser.async_browser_env import AsyncBrowserEnv
+from qa_browser.browser.browser_env import BROWSER_GET_SOM_ACTION
+from qa_browser.browser.dispatcher import ResponseDispatcher
+from qa_browser.browser.som import SetOfMarksRef
+from qa_browser.browser.utils import browse
+from qa_browser.events import BrowseInteractiveAction, ObservationField
+
+
+class _PipeEnv(AsyncBrowserEnv):
+    """AsyncBrowserEnv whose browser end of the pipe is answered by a thread.
+
+    Step requests are answered once ``batch`` of them are in flight, last
+    one first.
+    """
+
+    def __init__(self, batch: int = 1):
+        self.agent_side, self.browser_side = multiprocessing.Pipe()
+        self._dispatcher = ResponseDispatcher(self.agent_side, lambda: True, check_interval=0.05)
+        self.delta_observations = False
+        self.dedup_frames = False
+        self.last_frames = {}
+        self.requests: list[dict] = []
+        self._batch = batch
+        threading.Thread(target=self._answer, daemon=True).start()
+
+    def _answer(self) -> None:
+        waiting = []
+        while True:
+            try:
+                request_id, action_data = self.browser_side.recv()
+            except (EOFError, OSError):
+                return
+            self.requests.append(action_data)
+            if action_data['action'] == BROWSER_GET_SOM_ACTION:
+                self.browser_side.send((request_id, {'set_of_marks': 'data:image/png;base64,c29t'}))
+                continue
+            waiting.append((request_id, action_data))
+            if len(waiting) == self._batch:
+                for request_id, action_data in reversed(waiting):
+                    self.browser_side.send((request_id, {
+                        'url': f"http://localhost/{action_data['action']}",
+                        'set_of_marks': SetOfMarksRef(step=4),
+                    }))
+                waiting = []
+
+    def close(self) -> None:
+        self._dispatcher.close()
+        self.agent_side.close()
+        self.browser_side.close()
+
+
+class _NoExecutor(concurrent.futures.ThreadPoolExecutor):
+    def submit(self, *args, **kwargs):
+        raise AssertionError('a request went through an executor thread')
+
+
+def _run(main):
+    async def without_executor():
+        asyncio.get_running_loop().set_default_executor(_NoExecutor())
+        return await main()
+
+    return asyncio.run(without_executor())
+
+
+@pytest.fixture
+def env():
+    env = _PipeEnv()
+    yield env
+    env.close()
+
+
+def test_browse_awaits_the_env_directly(env, monkeypatch):
+    async def call_sync_from_async(*args, **kwargs):
+        raise AssertionError('browse() hopped to a thread')
+
+    monkeypatch.setattr(utils, 'call_sync_from_async', call_sync_from_async)
+    action = BrowseInteractiveAction(
+        browser_actions='noop()', observation_fields={ObservationField.SOM.value}
+    )
+    observation = _run(lambda: browse(action, env))
+    assert not observation.error, observation.content
+    assert observation.url == 'http://localhost/noop()'
+    # the Set-of-Marks overlay was fetched with aget_set_of_marks()
+    assert observation.set_of_marks == 'data:image/png;base64,c29t'
+    assert [request['action'] for request in env.requests] == ['noop()', BROWSER_GET_SOM_ACTION]
+    assert env.requests[1]['step'] == 4
+
+
+def test_concurrent_steps_are_routed_by_request_id():
+    env = _PipeEnv(batch=20)
+    try:
+        actions = [f'click("{n}")' for n in range(20)]
+
+        async def main():
+            return await asyncio.gather(*(env.astep(action) for action in actions))
+
+        # all 20 are in flight at once, and answered in reverse order
+        observations = _run(main)
+        assert [obs['url'] for obs in observations] == [
+            f'http://localhost/{action}' for action in actions
+        ]
+    finally:
+        env.close()
+
+
+def test_the_sync_api_still_works(env):
+    assert env.step('noop()')['url'] == 'http://localhost/noop()'
+
+
+def test_a_timed_out_step_is_discarded(env):
+    env._batch = 2
+
+    async def main():
+        with pytest.raises(TimeoutError):
+            await env.astep('noop()', timeout=0.1)
+
+    _run(main)
+    assert env._dispatcher._pending == {}
@@ -0,0 +1,86 @@
+import pytest
+
+from qa_browser.browser.axtree import AXTreeSerializer
+
+IGNORED_ROLES = {'LineBreak'}
+IGNORED_PROPERTIES = {'editable', 'readonly'}
+
+
+def _node(node_id: str, role: str, name: str, children=(), bid: str | None = None) -> dict:
+    node = {
+        'nodeId': node_id,
+        'role': {'value': role},
+        'name': {'value': name},
+        'childIds': list(children),
+    }
+    if bid is not None:
+        node['browsergym_id'] = bid
+    return node
+
+
+def _tree(names: list[str]) -> dict:
+    children = [str(i + 1) for i in range(len(names))]
+    nodes = [_node('0', 'RootWebArea', 'Page', children)]
+    nodes += [_node(str(i + 1), 'button', name, bid=f'b{i + 1}') for i, name in enumerate(names)]
+    return {'nodes': nodes}
+
+
+def _serializer(axtree: dict, extra: dict | None = None) -> AXTreeSerializer:
+    return AXTreeSerializer(
+        axtree,
+        extra,
+        ignored_roles=IGNORED_ROLES,
+        ignored_properties=IGNORED_PROPERTIES,
+    )
+
+
+def _follow(serializer: AXTreeSerializer, **budget) -> list[str]:
+    """Every chunk's text, following cursors until the tree is done."""
+    texts = []
+    chunk = serializer.serialize(prioritize=False, **budget)
+    texts.append(chunk.text)
+    for _ in range(100):
+        if not chunk.truncated:
+            return texts
+        chunk = serializer.serialize(cursor=chunk.cursor, prioritize=False, **budget)
+        texts.append(chunk.text)
+    raise AssertionError('cursor does not make progress')
+
+
+def test_unbudgeted_serialization():
+    chunk = _serializer(_tree(['a', 'b'])).serialize()
+    assert chunk.text == "RootWebArea 'Page'\n\t[b1] button 'a'\n\t[b2] button 'b'"
+    assert (chunk.num_nodes, chunk.truncated, chunk.cursor) == (3, False, None)
+
+
+def test_chunks_cover_the_tree():
+    serializer = _serializer(_tree([f'button {i}' for i in range(20)]))
+    full = serializer.serialize().text
+    texts = _follow(serializer, max_nodes=3)
+    assert '\n'.join(texts) == full
+    assert len(texts) == 7
+
+
+def test_oversize_line_is_clipped_and_the_cursor_advances():
+    serializer = _serializer(_tree(['x' * 500, 'short']))
+    texts = _follow(serializer, max_chars=40)
+    assert all(0 < len(text) <= 40 for text in texts)
+    assert texts[-1].endswith("button 'short'")
+
+
+def test_empty_budgets_are_rejected():
+    serializer = _serializer(_tree(['a']))
+    with pytest.raises(ValueError):
+        serializer.serialize(max_nodes=0)
+    with pytest.raises(ValueError):
+        serializer.serialize(max_chars=0)
+
+
+def test_priority_nodes_come_first_when_truncated():
+    extra = {
+        'b1': {'visibility': 0.0, 'clickable': False},
+        'b2': {'visibility': 1.0, 'clickable': False},
+    }
+    chunk = _serializer(_tree(['hidden', 'shown']), extra).serialize(max_nodes=2)
+    assert chunk.truncated
+    assert chunk.text.splitlines()[1] == "\t[b2] button 'shown'"
@@ -0,0 +1,96 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from qa_browser.browser.base64 import (
+    IMAGE_FORMATS,
+    ImageCodec,
+    data_url_mime_type,
+    png_base64_url_to_image,
+)
+
+
+def _frame(height: int = 48, width: int = 64) -> np.ndarray:
+    """A smooth gradient, so lossy codecs stay close to the original."""
+    y, x = np.mgrid[0:height, 0:width]
+    return np.stack([x * 255 // width, y * 255 // height, (x + y) % 256], axis=-1).astype(np.uint8)
+
+
+def _decode(data_url: str) -> np.ndarray:
+    return np.asarray(png_base64_url_to_image(data_url).convert('RGB'))
+
+
+def _error(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.abs(a.astype(int) - b.astype(int)).mean())
+
+
+@pytest.mark.parametrize('format', IMAGE_FORMATS)
+def test_each_format_round_trips(format):
+    codec = ImageCodec(format=format)
+    frame = _frame()
+    data_url = codec.to_base64_url(frame)
+    assert data_url_mime_type(data_url) == codec.mime_type
+    decoded = _decode(data_url)
+    assert decoded.shape == frame.shape
+    if format in ('png', 'raw'):
+        # raw frames are PNG-encoded when they have to be encoded at all
+        assert np.array_equal(decoded, frame)
+    else:
+        assert _error(decoded, frame) < 8
+
+
+@pytest.mark.parametrize('level', [0, 1, 6, 9])
+def test_png_is_lossless_at_every_compress_level(level):
+    frame = _frame()
+    encoded = ImageCodec(png_compress_level=level).encode(frame)
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(encoded))), frame)
+
+
+def test_png_compress_level_trades_size():
+    frame = np.tile(_frame(), (4, 4, 1))
+    sizes = [len(ImageCodec(png_compress_level=level).encode(frame)) for level in (0, 9)]
+    assert sizes[1] < sizes[0]
+
+
+@pytest.mark.parametrize('format', ['jpeg', 'webp'])
+def test_quality_trades_fidelity_for_size(format):
+    frame = _frame(96, 128)
+    low, high = (ImageCodec(format=format, quality=q) for q in (10, 95))
+    assert len(low.encode(frame)) < len(high.encode(frame))
+    assert _error(_decode(high.to_base64_url(frame)), frame) < _error(
+        _decode(low.to_base64_url(frame)), frame
+    )
+
+
+def test_scale_downsizes_before_encoding():
+    decoded = _decode(ImageCodec(scale=0.5).to_base64_url(_frame(48, 64)))
+    assert decoded.shape == (24, 32, 3)
+    # never below one pixel
+    assert _decode(ImageCodec(scale=0.01).to_base64_url(_frame(8, 8))).shape == (1, 1, 3)
+
+
+def test_non_uint8_frames_are_converted():
+    frame = _frame()
+    decoded = _decode(ImageCodec().to_base64_url(frame.astype(np.int64)))
+    assert np.array_equal(decoded, frame)
+
+
+def test_prefix_is_optional():
+    encoded = ImageCodec(format='webp').to_base64_url(_frame(), add_data_prefix=False)
+    assert not encoded.startswith('data:')
+    assert data_url_mime_type(encoded) == 'image/png'
+    assert _decode(encoded).shape == (48, 64, 3)
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'format': 'gif'},
+    {'png_compress_level': 10},
+    {'quality': 0},
+    {'scale': 0},
+    {'scale': 1.5},
+])
+def test_invalid_settings_are_rejected(kwargs):
+    with pytest.raises(ValueError):
+        ImageCodec(**kwargs)
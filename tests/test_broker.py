@@ -0,0 +1,111 @@
+import asyncio
+
+from qa_browser.server.broker import _SUBSCRIBE, UnixSocketBroker, _frame, _Hub
+from qa_browser.server.replay import EventHistory
+
+
+async def _wait_for(condition, timeout: float = 5) -> None:
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(poll(), timeout)
+
+
+def test_events_reach_other_processes_and_are_replayed(tmp_path):
+    async def main():
+        path = str(tmp_path / 'broker.sock')
+        hub, peer = UnixSocketBroker(path), UnixSocketBroker(path)
+        received = []
+
+        async def on_event(test_id, event):
+            received.append((test_id, event['n']))
+
+        peer.bind(on_event)
+        await hub.start()
+        await peer.start()
+        try:
+            assert hub.is_hub and not peer.is_hub
+            peer.subscribe('t1')
+            await asyncio.sleep(0.05)
+            for n in range(3):
+                await hub.publish('t1', {'n': n})
+            await hub.publish('t2', {'n': 99})
+            await _wait_for(lambda: len(received) == 3)
+            events, missing = await peer.replay('t1', since=1)
+            return received, [event['n'] for event in events], missing
+        finally:
+            await peer.close()
+            await hub.close()
+
+    received, replayed, missing = asyncio.run(main())
+    assert received == [('t1', 0), ('t1', 1), ('t1', 2)]
+    assert (replayed, missing) == ([1, 2], False)
+
+
+def test_a_peer_that_stops_reading_does_not_stall_the_others(tmp_path):
+    async def main():
+        path = str(tmp_path / 'broker.sock')
+        hub = UnixSocketBroker(path, peer_queue_size=4)
+        received = []
+
+        async def on_event(test_id, event):
+            received.append(event['n'])
+
+        hub.bind(on_event)
+        await hub.start()
+        try:
+            hub.subscribe('t1')
+            # subscribes and never reads
+            stalled_reader, stalled = await asyncio.open_unix_connection(path)
+            stalled.write(_frame(_SUBSCRIBE, {'test_id': 't1'}))
+            await stalled.drain()
+            await _wait_for(lambda: len(hub._hub.subscribers.get('t1', ())) == 2)
+
+            padding = 'x' * 64 * 1024
+            for n in range(50):
+                await asyncio.wait_for(hub.publish('t1', {'n': n, 'padding': padding}), 5)
+            await _wait_for(lambda: len(received) == 50)
+            await _wait_for(lambda: len(hub._hub.peers) == 1)
+            stalled.close()
+            return received
+        finally:
+            await hub.close()
+
+    assert asyncio.run(main()) == list(range(50))
+
+
+class _FailingWriter:
+    """A peer connection whose writes fail with an OSError that isn't a ConnectionError."""
+
+    def __init__(self):
+        self.transport = self
+        self.aborted = False
+
+    def write(self, data: bytes) -> None:
+        pass
+
+    async def drain(self) -> None:
+        raise OSError(9, 'Bad file descriptor')
+
+    def abort(self) -> None:
+        # the handler's reader is left open, so only the writer can notice
+        self.aborted = True
+
+
+def test_a_peer_whose_writes_fail_is_unregistered():
+    async def main():
+        hub = _Hub(EventHistory())
+        reader, writer = asyncio.StreamReader(), _FailingWriter()
+        reader.feed_data(_frame(_SUBSCRIBE, {'test_id': 't1'}))
+        handler = asyncio.create_task(hub.handle(reader, writer))
+        await _wait_for(lambda: 't1' in hub.subscribers)
+
+        hub._publish('t1', {'n': 1})
+        await _wait_for(lambda: writer.aborted)
+        registered = dict(hub.subscribers), dict(hub.peers)
+        reader.feed_eof()
+        await asyncio.wait_for(handler, 5)
+        return registered
+
+    assert asyncio.run(main()) == ({}, {})
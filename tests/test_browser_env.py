@@ -0,0 +1,187 @@
+from types import SimpleNamespace
+
+import numpy as np
+import tenacity
+
+from qa_browser.browser import browser_env
+from qa_browser.browser.base64 import ImageCodec
+from qa_browser.browser.browser_env import (
+    BROWSER_RESET_ACTION,
+    DEFAULT_SESSION,
+    BrowserEnv,
+    _Session,
+)
+from qa_browser.browser.frame_dedup import FrameDeduplicator
+from qa_browser.browser.sessions import OriginTracker
+from qa_browser.browser.som import SetOfMarksRenderer
+from qa_browser.exceptions import BrowserInitException
+
+
+class _Process:
+    """A browser process that never starts; check_alive() decides the outcome."""
+
+    def __init__(self, target):
+        self.target = target
+
+    def start(self) -> None:
+        pass
+
+    def is_alive(self) -> bool:
+        return False
+
+    def join(self, timeout=None) -> None:
+        pass
+
+
+def test_a_failed_start_keeps_the_shared_memory_transport(monkeypatch):
+    attempts = []
+
+    def check_alive(self, timeout=60):
+        attempts.append((self.frame_ring, self.agent_side))
+        return len(attempts) > 1
+
+    monkeypatch.setattr(browser_env.multiprocessing, 'Process', _Process)
+    monkeypatch.setattr(BrowserEnv, 'check_alive', check_alive)
+    monkeypatch.setattr(BrowserEnv.init_browser.retry, 'wait', tenacity.wait_none())
+
+    env = BrowserEnv(screenshot_transport='shm', frame_slots=2, max_frame_bytes=64)
+    try:
+        (first_ring, first_pipe), (ring, pipe) = attempts
+        assert env.frame_ring is ring is not None
+        assert ring is not first_ring and first_ring.slots == ring.slots == 2
+        # the failed attempt's pipe was closed, the retry got a new one
+        assert first_pipe.closed and not pipe.closed
+    finally:
+        env.close()
+    assert env.frame_ring is None
+
+
+class _Page:
+    def __init__(self, context, url='about:blank'):
+        self.context, self.url = context, url
+
+    def on(self, event, handler):
+        pass
+
+    def goto(self, url):
+        self.url = url
+
+    def close(self):
+        self.context._pages.remove(self)
+
+
+class _Context:
+    def __init__(self):
+        self._pages: list[_Page] = []
+        self.cookies = {'https://shop.test': 'session=1'}
+
+    @property
+    def pages(self):
+        return list(self._pages)
+
+    def on(self, event, handler):
+        pass
+
+    def new_page(self, url='about:blank'):
+        self._pages.append(_Page(self, url))
+        return self._pages[-1]
+
+    def clear_cookies(self):
+        self.cookies.clear()
+
+    def clear_permissions(self):
+        pass
+
+
+class _GymEnv:
+    """The parts of a BrowserGym env that an in-place reset uses."""
+
+    def __init__(self):
+        self.unwrapped = self
+        self.context = _Context()
+        self.page = self.context.new_page()
+        self.chat = SimpleNamespace(messages=[{'role': 'assistant', 'message': 'Hi!'}])
+        self.last_action = ''
+        self.fail = False
+
+    def _get_obs(self):
+        if self.fail:
+            raise RuntimeError('page crashed')
+        return {
+            'url': self.page.url,
+            'open_pages_urls': [page.url for page in self.context.pages],
+            'chat_messages': list(self.chat.messages),
+            'last_action': self.last_action,
+            'screenshot': np.zeros((4, 4, 3), dtype=np.uint8),
+            'axtree_object': {'nodes': [{'nodeId': '1', 'name': {'value': self.page.url}}]},
+            'extra_element_properties': {},
+            'dom_object': {},
+            'active_page_index': np.int64(0),
+            'elapsed_time': np.float64(0.0),
+        }
+
+
+def _browser_side(dedup_frames: bool = False) -> tuple[BrowserEnv, _Session]:
+    """The browser-process half of a BrowserEnv, with one used session."""
+    env = BrowserEnv.__new__(BrowserEnv)
+    env.codec = ImageCodec()
+    env.frame_ring = None
+    gym_env = _GymEnv()
+    session = _Session(
+        session_id=DEFAULT_SESSION,
+        env=gym_env,
+        som_renderer=SetOfMarksRenderer(),
+        frame_dedup=FrameDeduplicator() if dedup_frames else None,
+        origins=OriginTracker(gym_env.context),
+        initial_chat_len=1,
+        step_count=5,
+        eval_rewards=[0.0, 1.0],
+    )
+    env.sessions = {DEFAULT_SESSION: session}
+    # what the test case left behind
+    gym_env.page.goto('https://shop.test/checkout')
+    gym_env.context.new_page('https://shop.test/help')
+    gym_env.chat.messages.append({'role': 'user', 'message': 'buy it'})
+    gym_env.last_action = 'click("12")'
+    return env, session
+
+
+def _reset(env: BrowserEnv, **action_data) -> dict:
+    return env._run_action({
+        'action': BROWSER_RESET_ACTION,
+        'fields': ['axtree', 'screenshot'],
+        **action_data,
+    })
+
+
+def test_reset_returns_a_fresh_observation():
+    env, session = _browser_side()
+    obs = _reset(env, start_url='https://shop.test/')
+    gym_env = session.env
+
+    assert obs['url'] == 'https://shop.test/'
+    assert obs['open_pages_urls'] == ['https://shop.test/']
+    assert obs['chat_messages'] == [{'role': 'assistant', 'message': 'Hi!'}]
+    assert obs['last_action'] == ''
+    assert obs['axtree_object']['nodes'][0]['name']['value'] == 'https://shop.test/'
+    assert obs['screenshot'].startswith('data:image/png;base64,')
+    assert gym_env.context.cookies == {}
+    # a new step, so the agent side doesn't take it for the previous frame
+    assert session.step_count == 6 and session.eval_rewards == []
+
+
+def test_reset_always_ships_the_first_frame():
+    env, session = _browser_side(dedup_frames=True)
+    session.frame_dedup.check(np.zeros((4, 4, 3), dtype=np.uint8), step=5, base_step=None)
+    # the agent still holds frame 5, which looks the same as the blank page
+    obs = _reset(env, frame_base=5)
+    assert obs['screenshot'].startswith('data:image/png;base64,')
+    assert obs['screenshot_step'] == 6
+
+
+def test_a_failed_reset_is_reported():
+    env, session = _browser_side()
+    session.env.fail = True
+    error = _reset(env)
+    assert isinstance(error, BrowserInitException)
+    assert 'page crashed' in str(error)
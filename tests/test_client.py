@@ -0,0 +1,106 @@
+import asyncio
+
+from qa_browser.server.client import SLOW_CONSUMER_CLOSE_CODE, ClientConnection, OverflowPolicy
+from qa_browser.server.protocol import WireProtocol
+
+
+class _WebSocket:
+    """Records what is sent; sending blocks until ``unblock()``."""
+
+    def __init__(self):
+        self.sent: list[str] = []
+        self.close_codes: list[int] = []
+        self._open = asyncio.Event()
+
+    def unblock(self) -> None:
+        self._open.set()
+
+    async def send_text(self, message: str) -> None:
+        await self._open.wait()
+        self.sent.append(message)
+
+    async def close(self, code: int) -> None:
+        await asyncio.sleep(0)
+        self.close_codes.append(code)
+
+
+async def _fill(policy: OverflowPolicy, messages: list[tuple[str, bool]]):
+    """Queue ``messages`` behind a stuck send, then let the client catch up."""
+    websocket = _WebSocket()
+    client = ClientConnection(websocket, WireProtocol.TEXT, queue_size=3, overflow_policy=policy)
+    # the writer takes the first message and blocks sending it
+    client.enqueue('in flight')
+    await asyncio.sleep(0)
+    queued = [client.enqueue(message, screenshot) for message, screenshot in messages]
+    websocket.unblock()
+    while client.queue_depth and not client.closed:
+        await asyncio.sleep(0)
+    await asyncio.sleep(0)
+    await client.close()
+    return client, websocket, queued
+
+
+MESSAGES = [
+    ('event 1', False), ('frame 1', True), ('frame 2', True), ('event 2', False),
+    ('frame 3', True),
+]
+
+
+def test_drop_oldest_keeps_the_latest_messages():
+    client, websocket, queued = asyncio.run(_fill(OverflowPolicy.DROP_OLDEST, MESSAGES))
+    assert all(queued)
+    assert websocket.sent == ['in flight', 'frame 2', 'event 2', 'frame 3']
+    assert client.dropped == 2
+    # 'frame 1' was dropped, so a tile-streaming client needs a keyframe
+    assert client.resync
+
+
+def test_coalesce_replaces_queued_screenshots_with_the_newest():
+    messages = [('frame 1', True), ('frame 2', True), ('event 1', False), ('frame 3', True)]
+    client, websocket, queued = asyncio.run(_fill(OverflowPolicy.COALESCE, messages))
+    assert all(queued)
+    # not 'frame 2', which is older than 'frame 3' and would be sent first
+    assert websocket.sent == ['in flight', 'event 1', 'frame 3']
+    assert client.dropped == 2
+    assert client.resync
+
+    client, websocket, _ = asyncio.run(_fill(OverflowPolicy.COALESCE, MESSAGES))
+    assert websocket.sent == ['in flight', 'event 1', 'event 2', 'frame 3']
+
+
+def test_coalesce_keeps_other_messages_while_there_are_screenshots_to_drop():
+    messages = [('frame 1', True), ('event 1', False), ('event 2', False), ('event 3', False)]
+    client, websocket, _ = asyncio.run(_fill(OverflowPolicy.COALESCE, messages))
+    assert websocket.sent == ['in flight', 'event 1', 'event 2', 'event 3']
+    assert client.dropped == 1
+
+
+def test_coalesce_without_queued_screenshots_drops_the_oldest_message():
+    messages = [('event 1', False), ('event 2', False), ('event 3', False), ('event 4', False)]
+    client, websocket, _ = asyncio.run(_fill(OverflowPolicy.COALESCE, messages))
+    assert websocket.sent == ['in flight', 'event 2', 'event 3', 'event 4']
+    assert not client.resync
+
+
+def test_disconnect_closes_the_slow_client():
+    closed = []
+
+    async def main():
+        websocket = _WebSocket()
+        client = ClientConnection(
+            websocket, WireProtocol.TEXT, queue_size=3,
+            overflow_policy=OverflowPolicy.DISCONNECT, on_closed=closed.append,
+        )
+        client.enqueue('in flight')
+        await asyncio.sleep(0)
+        queued = [client.enqueue(message, screenshot) for message, screenshot in MESSAGES]
+        # close() waits for the WebSocket close started by enqueue()
+        await client.close()
+        return client, websocket, queued
+
+    client, websocket, queued = asyncio.run(main())
+    assert queued == [True, True, True, False, False]
+    assert client.closed and closed == [client]
+    assert websocket.close_codes == [SLOW_CONSUMER_CLOSE_CODE]
+    assert client.dropped == 4
+    assert websocket.sent == []
@@ -0,0 +1,101 @@
+import pickle
+
+import pytest
+
+from qa_browser.browser.delta import Delta, DeltaDecoder, DeltaEncoder, FullSnapshot
+from qa_browser.exceptions import BrowserObservationOutOfSyncException
+
+
+def _axtree(values: list[str]) -> dict:
+    return {
+        'nodes': [{'nodeId': str(i), 'name': {'value': value}} for i, value in enumerate(values)],
+        'version': 1,
+    }
+
+
+def _dom(strings: list[str], documents: list[dict]) -> dict:
+    return {'strings': strings, 'documents': documents}
+
+
+def _send(encoder: DeltaEncoder, decoder: DeltaDecoder, field: str, value: dict):
+    # the message crosses the pipe pickled, like BrowserEnv responses
+    message = pickle.loads(pickle.dumps(encoder.encode(field, value, decoder.bases().get(field))))
+    return message, decoder.decode(field, message)
+
+
+def test_values_survive_a_chain_of_deltas():
+    encoder, decoder = DeltaEncoder(full_snapshot_interval=100), DeltaDecoder()
+    steps = {
+        'axtree_object': [_axtree(['a', 'b']), _axtree(['a', 'c']), _axtree(['c', 'a', 'd']), _axtree([])],
+        'extra_element_properties': [{'1': {'v': 1}}, {'1': {'v': 2}, '2': {}}, {'2': {}}],
+        'dom_object': [
+            _dom(['x'], [{'n': 1}]),
+            _dom(['x', 'y'], [{'n': 1}, {'n': 2}]),
+            _dom(['z'], [{'n': 3}]),
+        ],
+    }
+    for field, values in steps.items():
+        kinds = []
+        for value in values:
+            message, decoded = _send(encoder, decoder, field, value)
+            kinds.append(type(message))
+            assert decoded == value
+        assert kinds == [FullSnapshot] + [Delta] * (len(values) - 1)
+
+
+def test_unchanged_nodes_are_not_resent():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    _send(encoder, decoder, 'axtree_object', _axtree(['a'] * 50))
+    message, _ = _send(encoder, decoder, 'axtree_object', _axtree(['a'] * 49 + ['b']))
+    assert list(message.payload['upsert']) == ['49']
+    assert message.payload['order'] is None
+
+
+def test_a_stale_base_gets_a_full_snapshot():
+    encoder = DeltaEncoder()
+    first = encoder.encode('extra_element_properties', {'a': 1}, None)
+    # the agent still reports the base before ``first``
+    assert isinstance(encoder.encode('extra_element_properties', {'a': 2}, None), FullSnapshot)
+    assert isinstance(encoder.encode('extra_element_properties', {'a': 3}, first.seq), FullSnapshot)
+
+
+def test_full_snapshot_interval():
+    encoder, decoder = DeltaEncoder(full_snapshot_interval=2), DeltaDecoder()
+    kinds = [
+        type(_send(encoder, decoder, 'extra_element_properties', {'a': i})[0]) for i in range(6)
+    ]
+    assert kinds == [FullSnapshot, Delta, Delta, FullSnapshot, Delta, Delta]
+
+
+def test_out_of_sequence_delta_resyncs():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    _send(encoder, decoder, 'extra_element_properties', {'a': 1})
+    lost = encoder.encode('extra_element_properties', {'a': 2}, decoder.bases()['extra_element_properties'])
+    assert isinstance(lost, Delta)
+    # ``lost`` never reaches the agent, so the next delta doesn't apply
+    skipped = encoder.encode('extra_element_properties', {'a': 3}, lost.seq)
+    # an empty page would be worse than an error
+    with pytest.raises(BrowserObservationOutOfSyncException):
+        decoder.decode('extra_element_properties', skipped)
+    assert 'extra_element_properties' not in decoder.bases()
+    message, decoded = _send(encoder, decoder, 'extra_element_properties', {'a': 4})
+    assert isinstance(message, FullSnapshot)
+    assert decoded == {'a': 4}
+
+
+def test_modifying_a_decoded_value_leaves_the_mirror_alone():
+    encoder, decoder = DeltaEncoder(), DeltaDecoder()
+    for names in (['a', 'b', 'c'], ['a', 'b', 'd']):
+        _, decoded = _send(encoder, decoder, 'axtree_object', _axtree(names))
+        # an agent annotating or pruning its observation
+        decoded['nodes'][0]['name']['value'] = 'changed'
+        decoded['nodes'].pop()
+        decoded['version'] = 2
+    _, decoded = _send(encoder, decoder, 'axtree_object', _axtree(['a', 'e', 'd']))
+    assert decoded == _axtree(['a', 'e', 'd'])
+
+    _, decoded = _send(encoder, decoder, 'dom_object', _dom(['x'], [{'n': 1}]))
+    decoded['strings'].append('y')
+    decoded['documents'][0]['n'] = 5
+    _, decoded = _send(encoder, decoder, 'dom_object', _dom(['x', 'z'], [{'n': 1}, {'n': 2}]))
+    assert decoded == _dom(['x', 'z'], [{'n': 1}, {'n': 2}])
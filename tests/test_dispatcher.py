@@ -0,0 +1,166 @@
+import multiprocessing
+import queue
+import threading
+import time
+
+import pytest
+
+from qa_browser.browser import browser_env
+from qa_browser.browser.browser_env import BrowserEnv
+from qa_browser.browser.dispatcher import ResponseDispatcher
+from qa_browser.exceptions import BrowserUnavailableException
+
+
+def _answer(connection, delay: float = 0.0, count: int = 1) -> threading.Thread:
+    """Echo ``count`` requests back from the browser end of a pipe."""
+
+    def run():
+        for _ in range(count):
+            request_id, payload = connection.recv()
+            time.sleep(delay)
+            connection.send((request_id, {'echo': payload}))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def pipe():
+    agent_side, browser_side = multiprocessing.Pipe()
+    yield agent_side, browser_side
+    agent_side.close()
+    browser_side.close()
+
+
+def test_responses_are_routed_by_request_id(pipe):
+    agent_side, browser_side = pipe
+    dispatcher = ResponseDispatcher(agent_side, lambda: True, check_interval=0.05)
+    first = dispatcher.submit('a', ('a', 1))
+    second = dispatcher.submit('b', ('b', 2))
+    browser_side.recv()
+    browser_side.recv()
+    # answered out of order
+    browser_side.send(('b', 'second'))
+    browser_side.send(('a', 'first'))
+    assert first.result(timeout=2) == 'first'
+    assert second.result(timeout=2) == 'second'
+    dispatcher.close()
+
+
+def test_late_reply_is_dropped(pipe):
+    agent_side, browser_side = pipe
+    dispatcher = ResponseDispatcher(agent_side, lambda: True, check_interval=0.05)
+    late = dispatcher.submit('late', ('late', None))
+    dispatcher.discard('late')
+    browser_side.recv()
+    browser_side.send(('late', 'too late'))
+    current = dispatcher.submit('now', ('now', None))
+    browser_side.recv()
+    browser_side.send(('now', 'on time'))
+    assert current.result(timeout=2) == 'on time'
+    assert not late.done()
+    dispatcher.close()
+
+
+def test_pending_requests_fail_when_the_browser_dies(pipe):
+    agent_side, _ = pipe
+    alive = threading.Event()
+    alive.set()
+    dispatcher = ResponseDispatcher(agent_side, alive.is_set, check_interval=0.05)
+    future = dispatcher.submit('x', ('x', None))
+    alive.clear()
+    with pytest.raises(BrowserUnavailableException):
+        future.result(timeout=2)
+    with pytest.raises(BrowserUnavailableException):
+        dispatcher.submit('y', ('y', None))
+
+
+def _bare_env(agent_side) -> BrowserEnv:
+    env = BrowserEnv.__new__(BrowserEnv)
+    env._dispatcher = ResponseDispatcher(agent_side, lambda: True, check_interval=0.05)
+    return env
+
+
+def test_request_waits_longer_than_the_check_interval(pipe, monkeypatch):
+    # every wait slice times out before the answer arrives; on Python 3.10
+    # that raises concurrent.futures.TimeoutError, not the builtin
+    monkeypatch.setattr(browser_env, 'SHUTDOWN_CHECK_INTERVAL', 0.02)
+    agent_side, browser_side = pipe
+    env = _bare_env(agent_side)
+    _answer(browser_side, delay=0.2)
+    assert env._request({'action': 'noop()'}, timeout=5) == {'echo': {'action': 'noop()'}}
+    env._dispatcher.close()
+
+
+def test_request_times_out(pipe, monkeypatch):
+    monkeypatch.setattr(browser_env, 'SHUTDOWN_CHECK_INTERVAL', 0.02)
+    agent_side, _ = pipe
+    env = _bare_env(agent_side)
+    with pytest.raises(TimeoutError):
+        env._request({'action': 'noop()'}, timeout=0.1)
+    env._dispatcher.close()
+
+
+def test_request_timeout_does_not_wait_for_the_check_interval(pipe):
+    agent_side, browser_side = pipe
+    env = _bare_env(agent_side)
+    assert browser_env.SHUTDOWN_CHECK_INTERVAL >= 1
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        env._request({'action': 'noop()'}, timeout=0.2)
+    assert time.monotonic() - start < 0.6
+    # the reply that was given up on is dropped, not left pending
+    assert env._dispatcher._pending == {}
+    env._dispatcher.close()
+
+
+def test_shutdown_interrupts_a_blocked_request(pipe, monkeypatch):
+    monkeypatch.setattr(browser_env, 'SHUTDOWN_CHECK_INTERVAL', 0.05)
+    agent_side, _ = pipe
+    env = _bare_env(agent_side)
+    exiting = threading.Event()
+    monkeypatch.setattr(browser_env, 'should_exit', exiting.is_set)
+    threading.Timer(0.1, exiting.set).start()
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        env._request({'action': 'noop()'}, timeout=30)
+    assert time.monotonic() - start < 1
+    env._dispatcher.close()
+
+
+def test_responses_wake_the_caller_without_polling(pipe):
+    agent_side, browser_side = pipe
+    env = _bare_env(agent_side)
+    _answer(browser_side, count=50)
+    start = time.monotonic()
+    for n in range(50):
+        assert env._request({'action': n}, timeout=5) == {'echo': {'action': n}}
+    # a 10 ms poll on either side would take at least 0.5 s
+    assert time.monotonic() - start < 0.4
+    env._dispatcher.close()
+
+
+def test_check_alive_times_out(pipe):
+    agent_side, _ = pipe
+    env = _bare_env(agent_side)
+    assert env.check_alive(timeout=0.1) is False
+    env._dispatcher.close()
+
+
+def test_liveness_probes_go_to_the_action_loop(pipe):
+    # the reader thread must not answer probes itself, or a stuck Playwright
+    # thread would still look alive
+    agent_side, browser_side = pipe
+    env = BrowserEnv.__new__(BrowserEnv)
+    env.browser_side = browser_side
+    env._send_lock = threading.Lock()
+    requests: queue.Queue = queue.Queue()
+    reader = threading.Thread(target=env._read_requests, args=(requests,), daemon=True)
+    reader.start()
+
+    agent_side.send(('IS_ALIVE', 'probe'))
+    assert requests.get(timeout=2) == ('IS_ALIVE', 'probe')
+    assert not agent_side.poll(0.1)
+    agent_side.send(('SHUTDOWN', None))
+    reader.join(2)
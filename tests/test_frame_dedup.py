@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from qa_browser.browser.frame_dedup import FrameDeduplicator, FrameRef, frame_thumbnail
+
+
+def _page() -> np.ndarray:
+    return np.full((720, 1280, 3), 255, dtype=np.uint8)
+
+
+def test_thumbnail_averages_every_pixel():
+    frame = np.zeros((64, 96, 3), dtype=np.uint8)
+    frame[0, 0] = 255
+    thumbnail = frame_thumbnail(frame, grid=32)
+    assert thumbnail.shape == (32, 32)
+    # the pixel is one of the 2 x 3 pixels of the first cell
+    assert thumbnail[0, 0] == pytest.approx(1 / 6)
+    assert thumbnail.sum() == pytest.approx(1 / 6)
+
+
+def test_unchanged_frames_are_referenced():
+    dedup = FrameDeduplicator()
+    assert dedup.check(_page(), step=1, base_step=None) is None
+    assert dedup.check(_page(), step=2, base_step=1) == FrameRef(1)
+    assert dedup.stats() == {'hits': 1, 'misses': 1}
+
+
+def test_changed_frames_are_shipped_and_become_the_base():
+    dedup = FrameDeduplicator()
+    dedup.check(_page(), step=1, base_step=None)
+    changed = _page()
+    changed[100:120, 100:300] = 0
+    assert dedup.check(changed, step=2, base_step=1) is None
+    assert dedup.check(changed, step=3, base_step=2) == FrameRef(2)
+
+
+def test_frames_the_agent_no_longer_holds_are_shipped():
+    dedup = FrameDeduplicator()
+    dedup.check(_page(), step=1, base_step=None)
+    assert dedup.check(_page(), step=2, base_step=None) is None
+
+
+def test_tiny_changes_are_within_the_threshold():
+    dedup = FrameDeduplicator(diff_threshold=0.02)
+    dedup.check(_page(), step=1, base_step=None)
+    caret = _page()
+    caret[300:310, 500] = 0
+    assert dedup.check(caret, step=2, base_step=1) == FrameRef(1)
+
+
+def test_small_changes_between_sample_points_are_shipped():
+    # a 4 x 9 pixel change that a 128 x 128 lattice of single pixels on a
+    # 1280 x 720 frame (rows 0, 5, 11, ...; columns 0, 10, 20, ...) never reads
+    dedup = FrameDeduplicator(diff_threshold=0.02)
+    dedup.check(_page(), step=1, base_step=None)
+    checkbox = _page()
+    checkbox[1:5, 11:20] = 0
+    assert dedup.check(checkbox, step=2, base_step=1) is None
+
+
+def test_reset_ships_the_next_frame():
+    dedup = FrameDeduplicator(diff_threshold=0.02)
+    dedup.check(_page(), step=1, base_step=None)
+    dedup.reset()
+    assert dedup.check(_page(), step=2, base_step=1) is None
+    assert dedup.check(_page(), step=3, base_step=2) == FrameRef(2)
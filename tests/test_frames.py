@@ -0,0 +1,74 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from qa_browser.browser.base64 import ImageCodec
+from qa_browser.browser.frames import FrameRing, LazyImage
+
+
+def _frame(value: int) -> np.ndarray:
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=3, max_frame_bytes=4 * 6 * 3)
+    yield ring
+    ring.close()
+
+
+def test_round_trip_through_an_attached_ring(ring):
+    browser_side = pickle.loads(pickle.dumps(ring))
+    descriptor = browser_side.write(_frame(7))
+    np.testing.assert_array_equal(ring.read(descriptor), _frame(7))
+    browser_side.close()
+
+
+def test_unread_frames_are_not_overwritten(ring):
+    # a batch observing each of 5 steps, read only once the reply arrives
+    descriptors = [ring.write(_frame(i)) for i in range(5)]
+    assert all(d is not None for d in descriptors[:3])
+    # the ring is full: the caller ships these frames inline instead
+    assert descriptors[3:] == [None, None]
+    for i, descriptor in enumerate(descriptors[:3]):
+        np.testing.assert_array_equal(ring.read(descriptor), _frame(i))
+
+
+def test_reading_frees_the_slot(ring):
+    for i in range(10):
+        descriptor = ring.write(_frame(i))
+        assert descriptor is not None
+        np.testing.assert_array_equal(ring.read(descriptor), _frame(i))
+
+
+def test_a_frame_is_read_once(ring):
+    descriptor = ring.write(_frame(1))
+    assert ring.read(descriptor) is not None
+    assert ring.read(descriptor) is None
+
+
+def test_abandoned_frames_are_reclaimed_after_the_lease_timeout(ring):
+    ring.lease_timeout = 0
+    stale = [ring.write(_frame(i)) for i in range(3)]
+    fresh = ring.write(_frame(9))
+    assert fresh is not None
+    assert sum(ring.read(d) is None for d in stale) == 1
+    np.testing.assert_array_equal(ring.read(fresh), _frame(9))
+
+
+def test_oversized_frames_are_rejected(ring):
+    assert ring.write(np.zeros((10, 10, 3), dtype=np.uint8)) is None
+
+
+def test_lazy_image_encodes_once():
+    calls = []
+
+    def source():
+        calls.append(1)
+        return _frame(3)
+
+    image = LazyImage(source, ImageCodec())
+    assert image.to_base64_url().startswith('data:image/png;base64,')
+    assert image.to_base64_url() is image.to_base64_url()
+    assert len(calls) == 1
@@ -0,0 +1,53 @@
+import importlib
+import subprocess
+import sys
+
+import pytest
+
+import qa_browser
+import qa_browser.browser
+
+HEAVY_MODULES = ('browsergym', 'fastapi', 'gymnasium', 'html2text', 'numpy', 'PIL')
+
+
+@pytest.mark.parametrize('package', [qa_browser, qa_browser.browser], ids=lambda p: p.__name__)
+def test_every_public_name_resolves(package):
+    for name in package.__all__:
+        value = getattr(package, name)
+        module = package._LAZY_IMPORTS.get(name)
+        if module is not None:
+            # the very object of the defining module, cached after the first access
+            assert value is getattr(importlib.import_module(module), name)
+            assert vars(package)[name] is value
+        assert name in dir(package)
+
+
+@pytest.mark.parametrize('package', [qa_browser, qa_browser.browser], ids=lambda p: p.__name__)
+def test_unknown_names_raise_attribute_error(package):
+    with pytest.raises(AttributeError, match='no_such_name'):
+        package.no_such_name
+    with pytest.raises(ImportError):
+        exec(f'from {package.__name__} import no_such_name', {})
+
+
+def _imported_after(statement: str) -> set[str]:
+    code = (
+        f'import sys; {statement}; '
+        f'print(" ".join(sorted({{m.split(".")[0] for m in sys.modules}})))'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True
+    ).stdout
+    return set(output.split())
+
+
+def test_importing_the_package_loads_no_heavy_dependency():
+    assert _imported_after('import qa_browser').isdisjoint(HEAVY_MODULES)
+    assert _imported_after('from qa_browser import BrowseInteractiveAction, BrowserError') \
+        .isdisjoint(HEAVY_MODULES)
+
+
+def test_the_browser_stack_does_not_load_the_server():
+    imported = _imported_after('from qa_browser import BrowserEnv')
+    assert 'numpy' in imported
+    assert 'fastapi' not in imported
@@ -0,0 +1,132 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from qa_browser import metrics
+from qa_browser.browser.browser_env import BROWSER_GET_METRICS_ACTION, BrowserEnv
+from qa_browser.browser.dispatcher import ResponseDispatcher
+from qa_browser.metrics import Histogram, HistogramSnapshot, MetricsRegistry
+
+
+@pytest.fixture
+def env(monkeypatch):
+    """A BrowserEnv whose browser end of the pipe is answered by ``answer``."""
+    monkeypatch.setattr(metrics, 'METRICS', MetricsRegistry())
+    agent_side, browser_side = multiprocessing.Pipe()
+    env = BrowserEnv.__new__(BrowserEnv)
+    env._dispatcher = ResponseDispatcher(agent_side, lambda: True, check_interval=0.05)
+    env.browser_side = browser_side
+    yield env
+    env._dispatcher.close()
+    agent_side.close()
+    browser_side.close()
+
+
+def answer(connection, count: int) -> None:
+    """Answer ``count`` requests the way the browser process does."""
+
+    def run():
+        for _ in range(count):
+            request_id, payload = connection.recv()
+            if request_id == 'IS_ALIVE':
+                connection.send(('ALIVE', payload))
+            else:
+                connection.send((request_id, {'echo': payload}))
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def test_values_land_in_the_first_bucket_that_holds_them():
+    histogram = Histogram((1, 2, 4))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value)
+    snapshot = histogram.snapshot()
+    # bounds are inclusive upper bounds, the last count is the overflow bucket
+    assert snapshot.counts == [2, 0, 1, 1]
+    assert (snapshot.count, snapshot.total) == (4, 14.5)
+
+
+def test_quantiles_interpolate_within_their_bucket():
+    snapshot = HistogramSnapshot((1, 2, 4), [2, 0, 1, 1], 14.5, 4)
+    assert snapshot.quantile(0.5) == 1.0
+    assert snapshot.quantile(0.25) == 0.5
+    assert snapshot.quantile(0.75) == 4.0
+    # the overflow bucket has no upper bound
+    assert snapshot.quantile(0.99) == 4
+    assert HistogramSnapshot((1, 2), [0, 0, 0], 0.0, 0).quantile(0.5) == 0.0
+
+
+def test_merge_adds_counts_and_rejects_other_buckets():
+    a = HistogramSnapshot((1, 2), [1, 0, 2], 7.0, 3)
+    b = HistogramSnapshot((1, 2), [0, 4, 0], 6.0, 4)
+    assert a.merge(b) == HistogramSnapshot((1, 2), [1, 4, 2], 13.0, 7)
+    with pytest.raises(ValueError):
+        a.merge(HistogramSnapshot((1, 3), [0, 0, 0], 0.0, 0))
+
+    merged = metrics.merge([
+        {'stage_seconds': {'env_step': a}},
+        {'stage_seconds': {'env_step': b, 'pickle': a}},
+    ])
+    assert merged['stage_seconds'] == {'env_step': a.merge(b), 'pickle': a}
+    assert merged['payload_bytes'] == {}
+
+
+def test_summarize():
+    registry = MetricsRegistry()
+    for seconds in (0.002, 0.004):
+        registry.observe_stage('env_step', seconds)
+    registry.observe_bytes('screenshot', 1000)
+    summary = metrics.summarize(registry.snapshot())
+    assert set(summary) == {'stages', 'payloads'}
+    env_step = summary['stages']['env_step']
+    assert env_step['count'] == 2 and env_step['sum'] == pytest.approx(0.006)
+    # one value per bucket: the median is the first bucket's upper bound
+    assert env_step['p50'] == 0.0025
+    assert 0.0025 < env_step['p95'] < env_step['p99'] < 0.005
+    assert summary['payloads']['screenshot']['count'] == 1
+
+
+def test_a_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    with registry.stage('env_step'):
+        pass
+    registry.observe_bytes('screenshot', 10)
+    assert registry.snapshot() == {'stage_seconds': {}, 'payload_bytes': {}}
+
+
+def test_render_prometheus():
+    snapshot = {
+        'stage_seconds': {'a "b"': HistogramSnapshot((0.5, 1), [1, 2, 1], 3.25, 4)},
+        'payload_bytes': {},
+    }
+    assert metrics.render_prometheus(snapshot).splitlines() == [
+        '# HELP qa_browser_stage_seconds Time spent in each stage of a browser step',
+        '# TYPE qa_browser_stage_seconds histogram',
+        # buckets are cumulative
+        'qa_browser_stage_seconds_bucket{stage="a \\"b\\"",le="0.5"} 1',
+        'qa_browser_stage_seconds_bucket{stage="a \\"b\\"",le="1"} 3',
+        'qa_browser_stage_seconds_bucket{stage="a \\"b\\"",le="+Inf"} 4',
+        'qa_browser_stage_seconds_sum{stage="a \\"b\\""} 3.25',
+        'qa_browser_stage_seconds_count{stage="a \\"b\\""} 4',
+        '# HELP qa_browser_payload_bytes Size of the payloads produced by a browser step',
+        '# TYPE qa_browser_payload_bytes histogram',
+    ]
+
+
+def test_metrics_requests_are_not_recorded(env):
+    answer(env.browser_side, count=2)
+    env._request({'action': 'noop()'}, timeout=5)
+    recorded = metrics.METRICS.snapshot()
+    assert recorded['stage_seconds']['round_trip'].count == 1
+    assert recorded['payload_bytes']['response'].count == 1
+
+    # polling the metrics leaves them as they were
+    env._request({'action': BROWSER_GET_METRICS_ACTION}, timeout=5)
+    assert metrics.METRICS.snapshot() == recorded
+
+
+def test_liveness_probes_are_not_recorded(env):
+    answer(env.browser_side, count=1)
+    assert env.check_alive(timeout=5)
+    assert metrics.METRICS.snapshot() == {'stage_seconds': {}, 'payload_bytes': {}}
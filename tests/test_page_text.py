@@ -0,0 +1,60 @@
+import html2text
+
+from qa_browser.browser.page_text import PageTextCache, text_fingerprint
+
+
+class _Converter:
+    """Counts conversions; the text is that of a real html2text converter."""
+
+    def __init__(self):
+        self.converter = html2text.HTML2Text()
+        self.converted: list[str] = []
+
+    def handle(self, html_str: str) -> str:
+        self.converted.append(html_str)
+        return self.converter.handle(html_str)
+
+
+PAGE = '<html><body><h1>Cart</h1><p>2 items</p></body></html>'
+
+
+def test_the_same_dom_is_converted_once():
+    converter = _Converter()
+    cache = PageTextCache(converter)
+    first = cache.get_text(PAGE)
+    # e.g. a hover that left the DOM as it was
+    assert cache.get_text(PAGE) == first
+    assert '# Cart' in first and '2 items' in first
+    assert converter.converted == [PAGE]
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'size': 1, 'maxsize': 32}
+
+
+def test_a_changed_dom_is_converted_again():
+    converter = _Converter()
+    cache = PageTextCache(converter)
+    cache.get_text(PAGE)
+    changed = PAGE.replace('2 items', '3 items')
+    assert '3 items' in cache.get_text(changed)
+    assert converter.converted == [PAGE, changed]
+    assert cache.stats()['misses'] == 2
+
+
+def test_recent_pages_are_hits_on_back_navigation():
+    converter = _Converter()
+    cache = PageTextCache(converter, max_entries=2)
+    pages = [PAGE.replace('Cart', name) for name in ('Home', 'Cart', 'Checkout')]
+    for page in pages:
+        cache.get_text(page)
+    # back to the cart: still held
+    assert 'Cart' in cache.get_text(pages[1])
+    # the home page was evicted
+    cache.get_text(pages[0])
+    assert converter.converted == pages + [pages[0]]
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'size': 2, 'maxsize': 2}
+
+
+def test_fingerprints_tell_pages_apart():
+    assert text_fingerprint(PAGE) == text_fingerprint(str(PAGE))
+    assert text_fingerprint(PAGE) != text_fingerprint(PAGE + ' ')
+    # lone surrogates can come out of the DOM and must not break hashing
+    assert text_fingerprint('\ud800') != text_fingerprint('\ud801')
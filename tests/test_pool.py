@@ -0,0 +1,204 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from qa_browser.browser.pool import BrowserPool, EvalTaskQueue
+from qa_browser.exceptions import BrowserError
+
+
+class _Process:
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+
+class FakeEnv:
+    """Stands in for a BrowserEnv; no browser process is started."""
+
+    check_delay = 0.0
+
+    def __init__(self):
+        self.process = _Process()
+        self.closed_on: threading.Thread | None = None
+
+    def check_alive(self, timeout: float = 60) -> bool:
+        time.sleep(self.check_delay)
+        return self.process.alive
+
+    def reset(self, timeout: float = 60) -> dict:
+        return {}
+
+    def close(self) -> None:
+        self.closed_on = threading.current_thread()
+        self.process.alive = False
+
+
+def _wait_for(condition, timeout: float = 5) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not met in time'
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def make_pool():
+    pools = []
+
+    def make(**kwargs) -> BrowserPool:
+        kwargs.setdefault('env_factory', FakeEnv)
+        pool = BrowserPool(**kwargs)
+        pools.append(pool)
+        _wait_for(lambda: pool.stats()['idle'] == pool.size)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_cancelled_async_acquire_returns_the_browser(make_pool):
+    pool = make_pool(size=1)
+    held = pool.acquire()
+
+    async def main():
+        returned = asyncio.Event()
+        return_abandoned = pool._return_abandoned
+
+        def record_return(future):
+            return_abandoned(future)
+            returned.set()
+
+        pool._return_abandoned = record_return
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pool.acquire_async(timeout=5), 0.1)
+        # the abandoned acquire() gets the browser once it is released, and
+        # hands it back from a callback on this loop
+        pool.release(held)
+        await asyncio.wait_for(returned.wait(), 5)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert pool.stats() == {'size': 1, 'idle': 1, 'leased': 0, 'starting': 0}
+    assert pool.acquire(timeout=1) is held
+
+
+def test_retiring_on_async_release_happens_off_the_loop(make_pool):
+    pool = make_pool(size=1, max_uses=1)
+
+    async def main():
+        async with pool.lease() as browser:
+            pass
+        return browser
+
+    browser = asyncio.run(main())
+    assert browser.closed_on is not None
+    assert browser.closed_on is not threading.main_thread()
+
+
+def test_health_check_leaves_other_members_available(make_pool, monkeypatch):
+    pool = make_pool(size=3, health_check_interval=3600)
+    monkeypatch.setattr(FakeEnv, 'check_delay', 0.3)
+    checker = threading.Thread(target=pool._health_check)
+    checker.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    browser = pool.acquire(timeout=5)
+    assert time.monotonic() - start < 0.2
+    checker.join()
+    pool.release(browser)
+    assert pool.stats()['idle'] == 3
+
+
+def test_unhealthy_members_are_replaced(make_pool):
+    pool = make_pool(size=2, health_check_interval=3600)
+    dead = pool.acquire()
+    pool.release(dead)
+    dead.process.alive = False
+    pool._health_check()
+    assert dead.closed_on is not None
+    _wait_for(lambda: pool.stats()['idle'] == 2)
+
+
+class EvalEnv(FakeEnv):
+    """A FakeEnv that switches benchmark tasks; ``failures`` maps task ids to errors."""
+
+    created: list['EvalEnv'] = []
+    failures: dict[str, list[Exception]] = {}
+
+    def __init__(self):
+        super().__init__()
+        self.loaded: list[str] = []
+        EvalEnv.created.append(self)
+
+    def load_eval_task(self, task_id: str, seed=None, timeout: float = 300) -> dict:
+        errors = EvalEnv.failures.get(task_id)
+        if errors:
+            raise errors.pop(0)
+        self.loaded.append(task_id)
+        return {'goal': f'goal of {task_id}'}
+
+
+@pytest.fixture
+def eval_pool(make_pool, monkeypatch):
+    monkeypatch.setattr(EvalEnv, 'created', [])
+    monkeypatch.setattr(EvalEnv, 'failures', {})
+
+    def make(size: int) -> BrowserPool:
+        return make_pool(size=size, env_factory=EvalEnv)
+
+    return make
+
+
+def _run_task(browser, task_id, obs):
+    return (id(browser), obs['goal'])
+
+
+def test_eval_workers_are_reused_across_tasks(eval_pool):
+    pool = eval_pool(size=2)
+    task_ids = [f'miniwob.task-{n}' for n in range(8)]
+    results = EvalTaskQueue(pool, _run_task).run(task_ids)
+
+    assert [result.task_id for result in results] == task_ids
+    assert [result.result[1] for result in results] == [f'goal of {t}' for t in task_ids]
+    assert all(result.error is None and result.attempts == 1 for result in results)
+    # no worker was started beyond the pool's own
+    assert len(EvalEnv.created) == 2
+    assert sorted(t for env in EvalEnv.created for t in env.loaded) == sorted(task_ids)
+    assert {result.result[0] for result in results} <= {id(env) for env in EvalEnv.created}
+    assert pool.stats()['idle'] == 2
+
+
+def test_a_task_that_fails_to_load_keeps_its_worker(eval_pool):
+    pool = eval_pool(size=1)
+    EvalEnv.failures['webarena.bad'] = [BrowserError('no such task')] * 2
+    bad, good = EvalTaskQueue(pool, _run_task, retries=1).run(['webarena.bad', 'webarena.1'])
+
+    assert (bad.error, bad.attempts, bad.result) == ('no such task', 2, None)
+    assert good.error is None and good.result[1] == 'goal of webarena.1'
+    assert len(EvalEnv.created) == 1 and EvalEnv.created[0].closed_on is None
+
+
+def test_a_worker_that_hangs_while_loading_is_replaced(eval_pool):
+    pool = eval_pool(size=1)
+    EvalEnv.failures['webarena.1'] = [TimeoutError('took too long')]
+    (result,) = EvalTaskQueue(pool, _run_task, retries=1).run(['webarena.1'])
+
+    assert result.error is None and result.attempts == 2
+    hung, replacement = EvalEnv.created
+    assert hung.closed_on is not None
+    assert replacement.loaded == ['webarena.1']
+
+
+def test_errors_of_the_task_itself_are_not_retried(eval_pool):
+    pool = eval_pool(size=1)
+
+    def run_task(browser, task_id, obs):
+        raise ValueError('assertion in the task')
+
+    (result,) = EvalTaskQueue(pool, run_task, retries=3).run(['webarena.1'])
+    assert (result.error, result.attempts) == ('assertion in the task', 1)
+    assert pool.stats()['idle'] == 1
@@ -0,0 +1,88 @@
+import base64
+import json
+
+from qa_browser.server.protocol import (
+    WireProtocol,
+    decode_binary,
+    encode_binary,
+    encode_text,
+    negotiate,
+    split_data_url,
+    tile_images,
+)
+
+
+def _data_url(payload: bytes, mime_type: str = 'image/png') -> str:
+    return f'data:{mime_type};base64,' + base64.b64encode(payload).decode()
+
+
+def test_negotiate():
+    assert negotiate(['other', 'qa-browser.binary.v1']) == (
+        WireProtocol.BINARY,
+        'qa-browser.binary.v1',
+    )
+    # an offered subprotocol wins over the query parameter
+    assert negotiate(['qa-browser.text.v1'], 'binary') == (WireProtocol.TEXT, 'qa-browser.text.v1')
+    assert negotiate([], 'binary') == (WireProtocol.BINARY, None)
+    assert negotiate([], 'nonsense') == (WireProtocol.TEXT, None)
+
+
+def test_split_data_url():
+    assert split_data_url(_data_url(b'abc', 'image/webp')) == ('image/webp', b'abc')
+    assert split_data_url('https://example.com/a.png') is None
+    assert split_data_url('data:image/png;base64,not base64!') is None
+
+
+def test_screenshot_round_trip():
+    event = {'type': 'browser_observation', 'seq': 3, 'screenshot': _data_url(b'\x89PNG pixels')}
+    header, images = decode_binary(encode_binary(event))
+    assert images == b'\x89PNG pixels'
+    assert header == {
+        'type': 'browser_observation',
+        'seq': 3,
+        'screenshot': None,
+        'screenshot_mime_type': 'image/png',
+        'screenshot_size': len(images),
+    }
+    assert json.loads(encode_text(event)) == event
+
+
+def test_tile_delta_round_trip():
+    payloads = [b'first tile', b'second', b'third tile bytes']
+    tiles = [
+        {'x': 64 * i, 'y': 0, 'width': 64, 'height': 64, 'image': _data_url(payload)}
+        for i, payload in enumerate(payloads)
+    ]
+    frame = {'seq': 8, 'base_seq': 7, 'keyframe': False, 'tile_size': 64, 'tiles': tiles}
+    event = {'type': 'browser_observation', 'screenshot': None, 'frame': frame}
+    message = encode_binary(event)
+    # the tiles are no longer base64 text
+    assert base64.b64encode(payloads[0]) not in message
+
+    header, images = decode_binary(message)
+    assert images == b''.join(payloads)
+    assert header['frame']['seq'] == 8
+    decoded = tile_images(header, images)
+    assert [image for _, image in decoded] == payloads
+    assert [(tile['x'], tile['image'], tile['image_mime_type']) for tile, _ in decoded] == [
+        (0, None, 'image/png'),
+        (64, None, 'image/png'),
+        (128, None, 'image/png'),
+    ]
+    # the event itself is left alone
+    assert tiles[0]['image'].startswith('data:')
+
+
+def test_screenshot_and_tiles_share_a_frame():
+    event = {
+        'screenshot': _data_url(b'full'),
+        'frame': {'tiles': [{'x': 0, 'y': 0, 'image': _data_url(b'tile')}]},
+    }
+    header, images = decode_binary(encode_binary(event))
+    assert images[: header['screenshot_size']] == b'full'
+    assert [image for _, image in tile_images(header, images)] == [b'tile']
+
+
+def test_events_without_images_stay_text():
+    assert encode_binary({'type': 'test_status', 'status': 'running'}) is None
+    assert encode_binary({'screenshot': None, 'frame': {'seq': 2, 'keyframe': True}}) is None
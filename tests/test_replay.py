@@ -0,0 +1,82 @@
+import time
+
+from qa_browser.server.replay import EventHistory, ReplayBuffer
+
+SCREENSHOT_A = 'data:image/png;base64,' + 'A' * 1000
+SCREENSHOT_B = 'data:image/png;base64,' + 'B' * 1000
+
+
+def _seqs(events: list[dict]) -> list[int]:
+    return [event['seq'] for event in events]
+
+
+def test_events_are_numbered_and_replayed_since_a_seq():
+    buffer = ReplayBuffer(max_events=10, max_bytes=10**6)
+    for n in range(5):
+        assert buffer.record({'n': n}) == n + 1
+    assert _seqs(buffer.since()[0]) == [1, 2, 3, 4, 5]
+    assert buffer.since(3) == ([{'n': 3, 'seq': 4}, {'n': 4, 'seq': 5}], False)
+    assert buffer.since(5) == ([], False)
+
+
+def test_evicted_and_limited_events_are_reported_missing():
+    buffer = ReplayBuffer(max_events=3, max_bytes=10**6)
+    for n in range(6):
+        buffer.record({'n': n})
+    events, missing = buffer.since(1)
+    assert (_seqs(events), missing) == ([4, 5, 6], True)
+    assert buffer.since(3)[1] is False
+    events, missing = buffer.since(3, limit=2)
+    assert (_seqs(events), missing) == ([5, 6], True)
+
+
+def test_repeated_screenshots_are_stored_once():
+    buffer = ReplayBuffer(max_events=10, max_bytes=10**6)
+    buffer.record({'screenshot': SCREENSHOT_A})
+    size = buffer.nbytes
+    buffer.record({'screenshot': SCREENSHOT_A})
+    assert buffer.nbytes - size < len(SCREENSHOT_A)
+    assert [event['screenshot'] for event in buffer.since()[0]] == [SCREENSHOT_A] * 2
+
+
+def test_a_fresh_client_gets_the_frame_unchanged_events_refer_to():
+    buffer = ReplayBuffer(max_events=2, max_bytes=10**6)
+    buffer.record({'screenshot': SCREENSHOT_A})
+    buffer.record({'screenshot': None, 'screenshot_unchanged': True})
+    buffer.record({'screenshot': None, 'screenshot_unchanged': True})
+    # the event carrying the screenshot was evicted
+    first, second = buffer.since()[0]
+    assert (first['screenshot'], first['screenshot_unchanged']) == (SCREENSHOT_A, False)
+    assert second.get('screenshot') is None and second['screenshot_unchanged']
+    # a reconnecting client already has it
+    assert buffer.since(2)[0][0].get('screenshot') is None
+
+
+def test_byte_limit_frees_screenshots_no_event_refers_to():
+    buffer = ReplayBuffer(max_events=100, max_bytes=1500)
+    buffer.record({'screenshot': SCREENSHOT_A})
+    buffer.record({'screenshot': SCREENSHOT_B})
+    assert _seqs(buffer.since()[0]) == [2]
+    assert len(buffer._screenshots) == 1
+    assert buffer.nbytes < 1500
+
+
+def test_history_evicts_stale_and_finished_tests():
+    history = EventHistory(ttl=60, finished_ttl=5)
+    for test_id in ('running', 'finished', 'idle'):
+        history.record(test_id, {'type': 'browser_observation'})
+    history.finish('finished')
+    now = time.monotonic()
+    history.buffers['finished'].finished_at = now - 10
+    history.buffers['idle'].updated_at = now - 100
+    history.buffers['running'].updated_at = now - 10
+    history.evict_expired()
+    assert set(history.buffers) == {'running'}
+    assert history.stats()['tests'] == 1
+    assert history.replay('idle') == ([], False)
+
+
+def test_disabled_history_records_nothing():
+    history = EventHistory(max_events=0)
+    assert history.record('t1', {'n': 1}) is None
+    assert history.stats() == {'tests': 0, 'events': 0, 'bytes': 0}
@@ -0,0 +1,57 @@
+import asyncio
+import base64
+import os
+
+from qa_browser.browser.screenshots import SCREENSHOTS_DIR, ScreenshotWriter
+from qa_browser.browser.utils import browse
+from qa_browser.events import BrowseInteractiveAction
+
+
+def _data_url(payload: bytes) -> str:
+    return 'data:image/png;base64,' + base64.b64encode(payload).decode()
+
+
+def test_identical_screenshots_are_written_once(tmp_path):
+    writer = ScreenshotWriter(num_workers=1)
+    first = writer.submit(tmp_path, _data_url(b'frame'))
+    second = writer.submit(tmp_path, _data_url(b'frame'))
+    writer.close()
+    assert first == second
+    with open(first, 'rb') as f:
+        assert f.read() == b'frame'
+    assert writer.stats()['written'] == 1
+    assert writer.stats()['deduplicated'] == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+
+class _FakeBrowser:
+    def step(self, action_str, fields=None):
+        return {'screenshot': _data_url(b'page'), 'url': 'http://localhost/'}
+
+
+def test_browse_does_not_block_the_loop_on_a_full_writer(tmp_path):
+    # no workers: the queue stays full until the test drains it
+    writer = ScreenshotWriter(max_pending=1, num_workers=0)
+    writer.submit(tmp_path, _data_url(b'earlier'))
+
+    async def main():
+        ticks = 0
+        task = asyncio.create_task(
+            browse(
+                BrowseInteractiveAction(browser_actions='noop()'),
+                _FakeBrowser(),
+                workspace_dir=str(tmp_path),
+                screenshot_writer=writer,
+            )
+        )
+        for _ in range(20):
+            await asyncio.sleep(0.01)
+            ticks += 1
+        assert not task.done()
+        writer._queue.get_nowait()
+        observation = await asyncio.wait_for(task, 5)
+        return ticks, observation
+
+    ticks, observation = asyncio.run(main())
+    assert ticks == 20
+    assert observation.screenshot_path.startswith(str(tmp_path / SCREENSHOTS_DIR))
@@ -0,0 +1,49 @@
+import asyncio
+
+from qa_browser.server import EventHistory, InMemoryBroker, QABrowserServer
+
+SCREENSHOT = 'data:image/png;base64,cGl4ZWxz'
+
+
+def _age(server: QABrowserServer, test_id: str, seconds: float) -> None:
+    updated_at, finished_at = server._test_activity[test_id]
+    server._test_activity[test_id] = (
+        updated_at - seconds,
+        None if finished_at is None else finished_at - seconds,
+    )
+
+
+def test_state_of_tests_without_clients_is_evicted_with_the_history():
+    server = QABrowserServer(broker=InMemoryBroker(EventHistory(ttl=60, finished_ttl=5)))
+
+    async def main():
+        for test_id in ('running', 'finished', 'idle'):
+            await server.broadcast_browser_observation(test_id, 'http://localhost/', SCREENSHOT)
+        await server.broadcast_test_status('finished', 'passed')
+
+    asyncio.run(main())
+    assert set(server.last_screenshots) == {'running', 'finished', 'idle'}
+
+    _age(server, 'running', 10)
+    _age(server, 'finished', 10)
+    _age(server, 'idle', 100)
+    server.tile_streamers['idle'] = object()
+    server._evict_expired()
+    assert set(server.last_screenshots) == {'running'}
+    assert server.tile_streamers == {}
+    assert set(server._test_activity) == {'running'}
+
+
+def test_a_new_event_restarts_the_countdown():
+    server = QABrowserServer(broker=InMemoryBroker(EventHistory(ttl=60, finished_ttl=5)))
+
+    async def main():
+        await server.broadcast_test_status('t1', 'passed')
+        _age(server, 't1', 10)
+        # a test that is run again is no longer finished
+        await server.broadcast_browser_observation('t1', 'http://localhost/', SCREENSHOT)
+
+    asyncio.run(main())
+    server._evict_expired()
+    assert 't1' in server.last_screenshots
+    assert server._test_activity['t1'][1] is None
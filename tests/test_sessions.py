@@ -0,0 +1,227 @@
+import importlib.metadata
+import re
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from qa_browser.browser.sessions import (
+    OriginTracker,
+    RoundRobinScheduler,
+    SharedChromium,
+    clear_browser_context,
+)
+
+
+class _Emitter:
+    def __init__(self):
+        self.handlers: dict[str, list] = {}
+
+    def on(self, event: str, handler) -> None:
+        self.handlers.setdefault(event, []).append(handler)
+
+    def emit(self, event: str, *args) -> None:
+        for handler in self.handlers.get(event, []):
+            handler(*args)
+
+
+class _Page(_Emitter):
+    """A page that is also its own main frame."""
+
+    def __init__(self, context: '_Context'):
+        super().__init__()
+        self.context = context
+        self.url = 'about:blank'
+        self.closed = False
+
+    def goto(self, url: str) -> None:
+        self.url = url
+        self.emit('framenavigated', self)
+
+    def close(self) -> None:
+        self.closed = True
+        self.context._pages.remove(self)
+
+
+class _CDPSession:
+    def __init__(self, context: '_Context'):
+        self.context = context
+        self.detached = False
+
+    def send(self, method: str, params: dict) -> None:
+        assert method == 'Storage.clearDataForOrigin' and params['storageTypes'] == 'all'
+        self.context.storage.pop(params['origin'], None)
+
+    def detach(self) -> None:
+        self.detached = True
+
+
+class _Context(_Emitter):
+    """A Playwright browser context; cookies and storage are keyed by origin."""
+
+    def __init__(self):
+        super().__init__()
+        self._pages: list[_Page] = []
+        self.cookies: dict[str, str] = {}
+        self.storage: dict[str, dict] = {}
+        self.permissions: list[str] = []
+        self.cdp_sessions: list[_CDPSession] = []
+
+    @property
+    def pages(self) -> list[_Page]:
+        # a copy, like Playwright's
+        return list(self._pages)
+
+    def new_page(self) -> _Page:
+        page = _Page(self)
+        self._pages.append(page)
+        self.emit('page', page)
+        return page
+
+    def clear_cookies(self) -> None:
+        self.cookies.clear()
+
+    def clear_permissions(self) -> None:
+        self.permissions.clear()
+
+    def new_cdp_session(self, page: _Page) -> _CDPSession:
+        self.cdp_sessions.append(_CDPSession(self))
+        return self.cdp_sessions[-1]
+
+
+class _Browser:
+    def __init__(self):
+        self.contexts: list[_Context] = []
+        self.connected = True
+
+    def new_context(self) -> _Context:
+        self.contexts.append(_Context())
+        return self.contexts[-1]
+
+    def is_connected(self) -> bool:
+        return self.connected
+
+    def close(self) -> None:
+        self.connected = False
+
+
+class _BrowserType:
+    def __init__(self):
+        self.launched: list[_Browser] = []
+
+    def launch(self, **kwargs) -> _Browser:
+        self.launched.append(_Browser())
+        return self.launched[-1]
+
+
+def _session(browser) -> SimpleNamespace:
+    """The parts of a BrowserGym env that clear_browser_context() touches."""
+    context = browser.new_context()
+    page = context.new_page()
+    env = SimpleNamespace(
+        context=context, page=page, page_history={page: None}, last_action='click("1")',
+        last_action_error='', infeasible_message_received=False, start_time=0.0,
+    )
+    return env, OriginTracker(context)
+
+
+def _visit(env, url: str, origin: str) -> None:
+    env.page.goto(url)
+    env.context.cookies[origin] = 'session=1'
+    env.context.storage[origin] = {'localStorage': {'cart': '2'}}
+
+
+def test_sessions_share_one_chromium():
+    browser_type = _BrowserType()
+    shared = SharedChromium(browser_type)
+    first, second = shared.launch(headless=True), shared.launch(headless=True)
+    assert len(browser_type.launched) == 1
+    # BrowserGym closes its browser with its env; the other sessions keep it
+    first.close()
+    assert second.is_connected()
+    # another launch config gets its own browser
+    shared.launch(headless=False)
+    assert len(browser_type.launched) == 2
+
+
+def test_a_crashed_shared_browser_is_relaunched():
+    browser_type = _BrowserType()
+    shared = SharedChromium(browser_type)
+    shared.launch(headless=True)
+    browser_type.launched[0].connected = False
+    assert shared.launch(headless=True).is_connected()
+    assert len(browser_type.launched) == 2
+
+
+def test_closing_restores_launch_and_closes_the_browsers():
+    browser_type = _BrowserType()
+    original_launch = browser_type.launch
+    shared = SharedChromium(browser_type)
+    browser_type.launch = shared.launch
+    browser_type.launch(headless=True)
+    shared.close()
+    assert browser_type.launch == original_launch
+    assert not browser_type.launched[0].connected
+
+
+def test_origins_are_recorded_on_every_page_of_the_context():
+    env, origins = _session(_Browser())
+    env.page.goto('https://shop.test/cart?id=1')
+    env.context.new_page().goto('http://localhost:3000/')
+    env.page.goto('about:blank')
+    env.page.goto('data:text/html,hi')
+    assert origins.origins == {'https://shop.test', 'http://localhost:3000'}
+
+
+def test_clearing_one_session_leaves_the_others_alone():
+    browser = _Browser()
+    (env, origins), (other, _) = _session(browser), _session(browser)
+    _visit(env, 'https://shop.test/cart', 'https://shop.test')
+    _visit(other, 'https://shop.test/cart', 'https://shop.test')
+    env.context.permissions.append('geolocation')
+    old_pages = list(env.context.pages) + [env.context.new_page()]
+
+    clear_browser_context(env, origins)
+
+    context = env.context
+    assert (context.cookies, context.storage, context.permissions) == ({}, {}, [])
+    assert all(page.closed for page in old_pages)
+    assert context.pages == [env.page] and env.page.url == 'about:blank'
+    assert env.page_history == {env.page: None}
+    assert env.last_action == '' and env.start_time > 0
+    assert origins.origins == set() and context.cdp_sessions[0].detached
+    # same Chromium, different context
+    assert other.context.cookies == {'https://shop.test': 'session=1'}
+    assert other.context.storage == {'https://shop.test': {'localStorage': {'cart': '2'}}}
+    assert not other.page.closed
+
+
+def test_clearing_navigates_to_the_start_url_and_keeps_tracking():
+    env, origins = _session(_Browser())
+    clear_browser_context(env, origins, start_url='https://shop.test/')
+    assert env.page.url == 'https://shop.test/'
+    # the new page is watched like the old ones, for the next reset
+    assert origins.origins == {'https://shop.test'}
+    assert env.context.cdp_sessions == []
+
+
+def test_sessions_take_turns():
+    scheduler = RoundRobinScheduler()
+    for item in ('a1', 'a2', 'a3'):
+        scheduler.put('a', item)
+    scheduler.put('b', 'b1')
+    scheduler.put('c', 'c1')
+    order = [scheduler.pop() for _ in range(len(scheduler))]
+    assert order == ['a1', 'b1', 'c1', 'a2', 'a3']
+    assert len(scheduler) == 0
+
+
+def test_the_pinned_browsergym_observes_without_acting():
+    # observe() relies on a BrowserGym internal, so the pin and the method
+    # must move together
+    env = pytest.importorskip('browsergym.core.env')
+    requirements = (Path(__file__).parents[1] / 'requirements.txt').read_text()
+    pinned = re.search(r'^browsergym-core==(\S+)$', requirements, re.MULTILINE)
+    assert pinned, 'browsergym-core must be pinned to an exact version'
+    assert importlib.metadata.version('browsergym-core') == pinned.group(1)
+    assert callable(getattr(env.BrowserEnv, '_get_obs', None))
@@ -0,0 +1,200 @@
+import asyncio
+import copy
+import gc
+import pickle
+import weakref
+
+import numpy as np
+import pytest
+
+from qa_browser.browser import browser_env, som
+from qa_browser.browser.base64 import ImageCodec
+from qa_browser.browser.browser_env import DEFAULT_SESSION, BrowserEnv
+from qa_browser.browser.frames import FrameRing
+from qa_browser.browser.som import RemoteSetOfMarks, SetOfMarksRef, SetOfMarksRenderer
+from qa_browser.browser.utils import browse
+from qa_browser.events import BrowseInteractiveAction, ObservationField
+
+
+class _Browser:
+    def __init__(self):
+        self.fetched: list[int | None] = []
+
+    def get_set_of_marks(self, step=None, timeout=60):
+        self.fetched.append(step)
+        return 'data:image/png;base64,c29t'
+
+    def step(self, action_str, fields=None):
+        return {'url': 'http://localhost/', 'set_of_marks': RemoteSetOfMarks(self, step=3)}
+
+
+def test_copies_do_not_reference_the_browser():
+    browser = _Browser()
+    remote = RemoteSetOfMarks(browser, step=1)
+    for clone in (pickle.loads(pickle.dumps(remote)), copy.deepcopy(remote)):
+        assert clone.browser is None
+        assert clone.to_base64_url() == ''
+    assert browser.fetched == []
+
+
+def test_fetching_drops_the_browser():
+    browser = _Browser()
+    remote = RemoteSetOfMarks(browser, step=1)
+    assert remote.to_base64_url() == 'data:image/png;base64,c29t'
+    assert remote.browser is None
+    assert pickle.loads(pickle.dumps(remote)).to_base64_url() == 'data:image/png;base64,c29t'
+
+
+def _browse(browser, **action_kwargs):
+    action = BrowseInteractiveAction(browser_actions='noop()', **action_kwargs)
+    return asyncio.run(browse(action, browser))
+
+
+def test_browse_leaves_set_of_marks_out_by_default():
+    browser = _Browser()
+    observation = _browse(browser)
+    assert observation.set_of_marks == ''
+    assert browser.fetched == []
+
+
+def test_browse_fetches_set_of_marks_when_asked():
+    browser = _Browser()
+    observation = _browse(browser, observation_fields={ObservationField.SOM.value})
+    # fetched by browse(), not on first access
+    assert browser.fetched == [3]
+    assert observation.set_of_marks == 'data:image/png;base64,c29t'
+    assert browser.fetched == [3]
+
+
+@pytest.mark.parametrize('observation_fields', [None, {ObservationField.SOM.value}])
+def test_observations_do_not_keep_the_browser_alive(observation_fields):
+    browser = _Browser()
+    alive = weakref.ref(browser)
+    observation = _browse(browser, observation_fields=observation_fields)
+    del browser
+    gc.collect()
+    assert alive() is None
+    assert observation.set_of_marks in ('', 'data:image/png;base64,c29t')
+
+
+@pytest.fixture
+def overlaid(monkeypatch):
+    """Frames the renderer overlaid; browsergym isn't needed."""
+    frames = []
+
+    def overlay_som(frame, extra_element_properties):
+        frames.append(frame)
+        return frame + 1
+
+    monkeypatch.setattr(som, '_overlay_som', overlay_som)
+    return frames
+
+
+def test_renderer_reuses_overlays_of_unchanged_pages(overlaid):
+    renderer = SetOfMarksRenderer(max_entries=2)
+    codec = ImageCodec()
+    frame = np.zeros((8, 8, 3), dtype=np.uint8)
+    assert renderer.render(codec) == ''
+
+    renderer.update(frame, {'a': {'bbox': [0, 0, 1, 1]}}, step=1)
+    image = renderer.render(codec)
+    assert image == codec.to_base64_url(frame + 1)
+    # same frame and properties on a later step: served from the cache
+    renderer.update(frame.copy(), {'a': {'bbox': [0, 0, 1, 1]}}, step=2)
+    assert renderer.render(codec, step=2) == image
+    assert len(overlaid) == 1
+    assert renderer.cache.stats()['hits'] == 1
+
+    # a change in the properties, the frame or the codec is a miss
+    renderer.update(frame, {'a': {'bbox': [0, 0, 2, 2]}}, step=3)
+    renderer.render(codec)
+    renderer.update(frame + 5, {'a': {'bbox': [0, 0, 2, 2]}}, step=4)
+    renderer.render(codec)
+    renderer.render(ImageCodec(format='jpeg'))
+    assert len(overlaid) == 4
+    assert renderer.cache.stats()['misses'] == 4
+
+
+def test_renderer_answers_stale_steps_with_nothing(overlaid):
+    renderer = SetOfMarksRenderer()
+    renderer.update(np.zeros((8, 8, 3), dtype=np.uint8), {}, step=2)
+    assert renderer.render(ImageCodec(), step=1) == ''
+    assert overlaid == []
+
+
+class _TransportEnv(BrowserEnv):
+    """BrowserEnv without a browser process: step() answers like the browser side.
+
+    ``transport`` is how the screenshot crosses the pipe: encoded inline, as a
+    raw array (raw codec) or through the shared-memory FrameRing.
+    """
+
+    def __init__(self, transport: str):
+        self.transport = transport
+        self.codec = ImageCodec(format='raw') if transport == 'raw' else ImageCodec()
+        self.frame_ring = None
+        if transport == 'shm':
+            self.frame_ring = FrameRing(slots=2, max_frame_bytes=8 * 8 * 3)
+        self.delta_observations = False
+        self.dedup_frames = False
+        self.fetched: list[int | None] = []
+
+    def step(self, action_str, timeout=120, fields=None, session_id=DEFAULT_SESSION):
+        frame = np.zeros((8, 8, 3), dtype=np.uint8)
+        if self.transport == 'inline':
+            screenshot = ImageCodec().to_base64_url(frame)
+            set_of_marks = SetOfMarksRef(step=1)
+        elif self.transport == 'raw':
+            screenshot = set_of_marks = frame
+        else:
+            screenshot = set_of_marks = self.frame_ring.write(frame)
+        obs = {
+            'url': 'http://localhost/',
+            'screenshot': screenshot,
+            # _process_obs leaves out what wasn't asked for
+            'set_of_marks': set_of_marks if ObservationField.SOM.value in fields else '',
+            'extra_element_properties': {},
+        }
+        return self._finalize_obs(obs, session_id)
+
+    def get_set_of_marks(self, step=None, timeout=60, session_id=DEFAULT_SESSION):
+        self.fetched.append(step)
+        return 'data:image/png;base64,c29t'
+
+
+TRANSPORTS = ('inline', 'raw', 'shm')
+
+
+@pytest.fixture
+def overlays(monkeypatch):
+    """Frames the agent process overlaid; browsergym isn't needed."""
+    rendered = []
+
+    def overlay_som(frame, extra_element_properties):
+        rendered.append(frame)
+        return frame + 1
+
+    monkeypatch.setattr(browser_env, '_overlay_som', overlay_som)
+    return rendered
+
+
+@pytest.fixture(params=TRANSPORTS)
+def env(request):
+    env = _TransportEnv(request.param)
+    yield env
+    if env.frame_ring is not None:
+        env.frame_ring.close()
+
+
+def test_set_of_marks_is_opt_in_on_every_transport(env, overlays):
+    observation = _browse(env)
+    assert observation.set_of_marks == ''
+    assert observation.screenshot.startswith('data:image/')
+    assert (overlays, env.fetched) == ([], [])
+
+
+def test_set_of_marks_is_returned_when_asked_on_every_transport(env, overlays):
+    observation = _browse(env, observation_fields={ObservationField.SOM.value})
+    assert observation.set_of_marks.startswith('data:image/')
+    # inline: rendered by the browser process; raw frames: overlaid here
+    assert len(env.fetched) + len(overlays) == 1
@@ -0,0 +1,91 @@
+import base64
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from qa_browser.server.protocol import decode_binary, encode_binary, tile_images
+from qa_browser.server.tiles import TileStreamer, changed_tiles, decode_frame
+
+
+def _data_url(pixels: np.ndarray) -> str:
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _frame(height: int = 128, width: int = 256) -> np.ndarray:
+    return np.full((height, width, 3), 200, dtype=np.uint8)
+
+
+def test_changed_tiles_covers_partial_edge_tiles():
+    previous = _frame(100, 150)
+    frame = previous.copy()
+    frame[99, 149] = 0
+    frame[0, 0] = 0
+    changed = changed_tiles(previous, frame, 64)
+    assert changed.shape == (2, 3)
+    assert changed.tolist() == [[True, False, False], [False, False, True]]
+
+
+def test_first_frame_is_a_keyframe_then_deltas():
+    streamer = TileStreamer(tile_size=64)
+    first = streamer.push(_data_url(_frame()))
+    assert (first.seq, first.keyframe) == (1, True)
+    assert first.frame_info(64) == {'seq': 1, 'keyframe': True}
+
+    frame = _frame()
+    frame[10:20, 70:190] = 0  # tiles 1 and 2 of the first row
+    update = streamer.push(_data_url(frame))
+    assert (update.seq, update.base_seq, update.keyframe) == (2, 1, False)
+    # neighbouring changed tiles are merged into one rectangle
+    [tile] = update.tiles
+    assert (tile['x'], tile['y'], tile['width'], tile['height']) == (64, 0, 128, 64)
+    assert (decode_frame(tile['image']) == frame[0:64, 64:192]).all()
+    assert streamer.keyframe() == (2, _data_url(frame))
+
+
+def test_keyframes_on_interval_size_change_and_large_changes():
+    streamer = TileStreamer(tile_size=64, keyframe_interval=3, max_changed_fraction=0.5)
+    kinds = []
+    for i in range(5):
+        frame = _frame()
+        frame[0, 0] = i
+        kinds.append(streamer.push(_data_url(frame)).keyframe)
+    assert kinds == [True, False, False, True, False]
+
+    assert streamer.push(_data_url(_frame(64, 64))).keyframe
+    assert streamer.push(_data_url(np.zeros((64, 64, 3), dtype=np.uint8))).keyframe
+
+
+def test_skipped_frames_are_not_diffed():
+    streamer = TileStreamer(tile_size=64)
+    streamer.push(_data_url(_frame()))
+    streamer.skip(_data_url(_frame()))
+    assert streamer.seq == 2
+    assert streamer.push(_data_url(_frame())).keyframe
+
+
+def test_invalid_settings():
+    with pytest.raises(ValueError):
+        TileStreamer(tile_size=4)
+
+
+def test_binary_clients_get_raw_tile_bytes():
+    streamer = TileStreamer(tile_size=64)
+    streamer.push(_data_url(_frame()))
+    frame = _frame()
+    frame[0:10, 0:10] = 0
+    frame[100:110, 200:210] = 0
+    update = streamer.push(_data_url(frame))
+    event = {'type': 'browser_observation', 'screenshot': None, 'frame': update.frame_info(64)}
+
+    header, images = decode_binary(encode_binary(event))
+    decoded = tile_images(header, images)
+    assert len(decoded) == 2
+    for tile, image in decoded:
+        with Image.open(io.BytesIO(image)) as tile_image:
+            pixels = np.asarray(tile_image.convert('RGB'))
+        y, x = tile['y'], tile['x']
+        assert (pixels == frame[y : y + tile['height'], x : x + tile['width']]).all()